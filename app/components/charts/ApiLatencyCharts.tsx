@@ -48,7 +48,7 @@ export default function ApiLatencyCharts({ data }: Props) {
                         <InfoTooltip text="Weekly average and P95 (worst 5%) API latency. Shows if Spotify is getting faster or slower for you." />
                     </h4>
                     <ResponsiveContainer width="100%" height={220}>
-                        <LineChart data={data.latencyOverTime}>
+                        <LineChart data={data.latencyOverTimeDownsampled?.["200"] ?? data.latencyOverTime}>
                             <CartesianGrid
                                 strokeDasharray="3 3"
                                 stroke="#2a2a2a"
@@ -202,7 +202,7 @@ export default function ApiLatencyCharts({ data }: Props) {
                         <InfoTooltip text="Percentage of HTTP requests that returned error status codes (4xx/5xx) each week." />
                     </h4>
                     <ResponsiveContainer width="100%" height={180}>
-                        <LineChart data={data.errorOverTime}>
+                        <LineChart data={data.errorOverTimeDownsampled?.["200"] ?? data.errorOverTime}>
                             <CartesianGrid
                                 strokeDasharray="3 3"
                                 stroke="#2a2a2a"
@@ -12,10 +12,11 @@ import {
     CartesianGrid,
     Legend,
 } from "recharts";
-import { DailyListening } from "../../types";
+import { DailyListening, Downsampled } from "../../types";
 
 interface Props {
     data: DailyListening[];
+    downsampled?: Downsampled<DailyListening>;
 }
 
 /** Compute a simple moving average over `window` points. */
@@ -28,18 +29,17 @@ function movingAverage(values: number[], window: number): (number | null)[] {
     });
 }
 
-export default function DailyListeningChart({ data }: Props) {
-    // Downsample for performance: show every Nth point if > 500
-    const step = data.length > 500 ? Math.ceil(data.length / 500) : 1;
-    const sampled = data.filter((_, i) => i % step === 0);
+export default function DailyListeningChart({ data, downsampled }: Props) {
+    // Plot the LTTB-downsampled series (at most 500 points, from preprocess.py)
+    // when the history is long enough to have one
+    const sampled = downsampled?.["500"] ?? data;
 
-    // 30-day moving-average trendline (adjusted for downsample step)
+    // 30-day moving-average trendline, computed on the full series
     const trendData = useMemo(() => {
-        const window = Math.max(Math.round(30 / step), 3);
-        const hours = sampled.map((d) => d.hours);
-        const trend = movingAverage(hours, window);
-        return sampled.map((d, i) => ({ ...d, trend: trend[i] }));
-    }, [sampled, step]);
+        const trend = movingAverage(data.map((d) => d.hours), 30);
+        const trendByDate = new Map(data.map((d, i) => [d.date, trend[i]]));
+        return sampled.map((d) => ({ ...d, trend: trendByDate.get(d.date) ?? null }));
+    }, [data, sampled]);
 
     return (
         <ResponsiveContainer width="100%" height={300}>
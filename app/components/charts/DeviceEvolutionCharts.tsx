@@ -349,7 +349,7 @@ export default function DeviceEvolutionCharts({ data }: Props) {
                         </div>
                     </div>
                     <ResponsiveContainer width="100%" height={180}>
-                        <LineChart data={data.multiDeviceWeekly}>
+                        <LineChart data={data.multiDeviceWeeklyDownsampled?.["200"] ?? data.multiDeviceWeekly}>
                             <CartesianGrid
                                 strokeDasharray="3 3"
                                 stroke="#2a2a2a"
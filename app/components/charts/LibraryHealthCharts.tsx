@@ -168,7 +168,7 @@ export default function LibraryHealthCharts({ data }: Props) {
                         </h4>
                         <ResponsiveContainer width="100%" height={220}>
                             <LineChart
-                                data={activeInteractions.weeklyTrend}
+                                data={activeInteractions.weeklyTrendDownsampled?.["200"] ?? activeInteractions.weeklyTrend}
                                 margin={{
                                     top: 5,
                                     right: 20,
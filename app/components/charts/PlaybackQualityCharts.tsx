@@ -169,7 +169,7 @@ export default function PlaybackQualityCharts({ data }: Props) {
                         <InfoTooltip text="Weekly playback errors, split by severity. Fatal errors stop playback entirely." />
                     </h4>
                     <ResponsiveContainer width="100%" height={220}>
-                        <LineChart data={data.errorOverTime}>
+                        <LineChart data={data.errorOverTimeDownsampled?.["200"] ?? data.errorOverTime}>
                             <CartesianGrid
                                 strokeDasharray="3 3"
                                 stroke="#2a2a2a"
@@ -221,7 +221,7 @@ export default function PlaybackQualityCharts({ data }: Props) {
                         <InfoTooltip text="Audio stutter events detected per week. Stutters can indicate network issues or device performance problems." />
                     </h4>
                     <ResponsiveContainer width="100%" height={180}>
-                        <BarChart data={data.stutterTimeline}>
+                        <BarChart data={data.stutterTimelineDownsampled?.["200"] ?? data.stutterTimeline}>
                             <CartesianGrid
                                 strokeDasharray="3 3"
                                 stroke="#2a2a2a"
@@ -262,7 +262,7 @@ export default function PlaybackQualityCharts({ data }: Props) {
                         <InfoTooltip text="Weekly track downloads. Bursts may indicate preparing for offline listening (flights, trips)." />
                     </h4>
                     <ResponsiveContainer width="100%" height={180}>
-                        <BarChart data={data.downloadOverTime}>
+                        <BarChart data={data.downloadOverTimeDownsampled?.["200"] ?? data.downloadOverTime}>
                             <CartesianGrid
                                 strokeDasharray="3 3"
                                 stroke="#2a2a2a"
@@ -190,7 +190,7 @@ export default function PlaylistCurationCharts({ data: rawData }: Props) {
                         <InfoTooltip text="Weekly adds vs removes. Shows how actively you curate your playlists over time." />
                     </h4>
                     <ResponsiveContainer width="100%" height={250}>
-                        <AreaChart data={data.churnOverTime}>
+                        <AreaChart data={data.churnOverTimeDownsampled?.["200"] ?? data.churnOverTime}>
                             <CartesianGrid
                                 strokeDasharray="3 3"
                                 stroke="#2a2a2a"
@@ -256,7 +256,7 @@ export default function SearchBehaviorCharts({ data }: Props) {
                     <InfoTooltip text="Weekly count of searches that led to a result click." />
                 </h4>
                 <ResponsiveContainer width="100%" height={200}>
-                    <LineChart data={data.overTime}>
+                    <LineChart data={data.overTimeDownsampled?.["200"] ?? data.overTime}>
                         <CartesianGrid strokeDasharray="3 3" stroke="#2a2a2a" />
                         <XAxis
                             dataKey="week"
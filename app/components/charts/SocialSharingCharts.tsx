@@ -177,6 +177,66 @@ export default function SocialSharingCharts({ data }: Props) {
                     );
                 })()}
 
+            {/* Social vs Solo listening */}
+            {data.listeningOverlap.social.plays > 0 && (
+                <div>
+                    <h4 className="text-xs text-muted mb-2">
+                        Social vs Solo Listening
+                        <InfoTooltip text="Streams played while a social session was open versus on your own. Hours count the part of each stream inside a session; plays and skips go by the middle of each stream." />
+                    </h4>
+                    <div className="grid grid-cols-1 sm:grid-cols-2 gap-4">
+                        {(
+                            [
+                                ["Social", data.listeningOverlap.social],
+                                ["Solo", data.listeningOverlap.solo],
+                            ] as const
+                        ).map(([label, side]) => (
+                            <div
+                                key={label}
+                                className="bg-[#1a1a1a] rounded-lg p-3 border border-[#2a2a2a]"
+                            >
+                                <p className="text-sm font-semibold text-[#e0e0e0] mb-2">
+                                    {label}
+                                </p>
+                                <div className="grid grid-cols-3 gap-2 text-center mb-3">
+                                    <div>
+                                        <p className="text-xs text-muted">Hours</p>
+                                        <p className="text-lg font-bold text-accent">
+                                            {side.hours.toLocaleString()}
+                                        </p>
+                                    </div>
+                                    <div>
+                                        <p className="text-xs text-muted">Plays</p>
+                                        <p className="text-lg font-bold text-accent">
+                                            {side.plays.toLocaleString()}
+                                        </p>
+                                    </div>
+                                    <div>
+                                        <p className="text-xs text-muted">Skip Rate</p>
+                                        <p className="text-lg font-bold text-accent">
+                                            {side.skipRate}%
+                                        </p>
+                                    </div>
+                                </div>
+                                {side.topArtists.slice(0, 5).map((a, i) => (
+                                    <p
+                                        key={i}
+                                        className="text-xs text-[#aaa] flex justify-between"
+                                    >
+                                        <span>{truncate(a.name, 28)}</span>
+                                        <span>{a.hours} h</span>
+                                    </p>
+                                ))}
+                            </div>
+                        ))}
+                    </div>
+                    <p className="text-xs text-muted mt-2">
+                        {data.listeningOverlap.socialPct}% of your listening
+                        time was during social sessions
+                    </p>
+                </div>
+            )}
+
             {/* Share Destinations + Share Over Time side by side */}
             <div className="grid grid-cols-1 sm:grid-cols-2 gap-4">
                 {/* Share Destinations */}
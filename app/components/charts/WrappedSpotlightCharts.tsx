@@ -1,6 +1,7 @@
 "use client";
 
-import { WrappedSpotlight, WrappedSection } from "../../types";
+import { useState } from "react";
+import { WrappedSpotlight, WrappedSection, WrappedDelta } from "../../types";
 
 interface Props {
     data: WrappedSpotlight;
@@ -153,7 +154,33 @@ function ArchiveSection({ section }: { section: WrappedSection }) {
 
 /* ---------- Main component ---------- */
 
+/* Lower is better for the global ranking ("Top x%") */
+function DeltaBadge({ delta }: { delta: WrappedDelta }) {
+    const better =
+        delta.metric === "topPercent" ? delta.change < 0 : delta.change > 0;
+    const sign = delta.change > 0 ? "+" : "";
+    const text =
+        delta.pctChange !== null
+            ? `${sign}${delta.pctChange}%`
+            : `${sign}${delta.change.toLocaleString()}`;
+    return (
+        <p
+            className={`text-xs ${
+                delta.change === 0
+                    ? "text-muted"
+                    : better
+                      ? "text-accent"
+                      : "text-[#ff6b6b]"
+            }`}
+        >
+            {text}
+        </p>
+    );
+}
+
 export default function WrappedSpotlightCharts({ data }: Props) {
+    const [selectedYear, setSelectedYear] = useState(data.year);
+
     if (!data.year) {
         return (
             <p className="text-sm text-muted">
@@ -164,8 +191,14 @@ export default function WrappedSpotlightCharts({ data }: Props) {
         );
     }
 
+    const years = data.years ?? [];
+    const current = years.find((y) => y.year === selectedYear) ?? data;
+    const change = data.yearOverYear?.find((c) => c.year === current.year);
+    const deltaFor = (label: string) =>
+        change?.deltas.find((d) => d.label === label);
+
     /* Determine hero grid columns based on highlight count */
-    const highlightCount = data.highlights.length;
+    const highlightCount = current.highlights.length;
     const gridCols =
         highlightCount <= 3
             ? "grid-cols-3"
@@ -175,22 +208,50 @@ export default function WrappedSpotlightCharts({ data }: Props) {
 
     return (
         <div className="flex flex-col gap-6">
+            {/* Year toggle */}
+            {years.length > 1 && (
+                <div className="flex items-center gap-2">
+                    {years.map((y) => (
+                        <button
+                            key={y.year}
+                            onClick={() => setSelectedYear(y.year)}
+                            className={`px-3 py-1 rounded-full text-xs font-medium transition-colors ${
+                                current.year === y.year
+                                    ? "bg-accent text-black"
+                                    : "bg-card-border text-muted hover:text-foreground"
+                            }`}
+                        >
+                            {y.year}
+                        </button>
+                    ))}
+                    {change && (
+                        <span className="text-xs text-muted ml-2">
+                            vs {change.previousYear}
+                        </span>
+                    )}
+                </div>
+            )}
+
             {/* Hero highlights */}
             {highlightCount > 0 && (
                 <div className={`grid ${gridCols} gap-4`}>
-                    {data.highlights.map((h, i) => (
-                        <div key={i} className="text-center">
-                            <p className="text-xs text-muted">{h.label}</p>
-                            <p className="text-2xl font-bold text-accent">
-                                {h.value}
-                            </p>
-                        </div>
-                    ))}
+                    {current.highlights.map((h, i) => {
+                        const delta = deltaFor(h.label);
+                        return (
+                            <div key={i} className="text-center">
+                                <p className="text-xs text-muted">{h.label}</p>
+                                <p className="text-2xl font-bold text-accent">
+                                    {h.value}
+                                </p>
+                                {delta && <DeltaBadge delta={delta} />}
+                            </div>
+                        );
+                    })}
                 </div>
             )}
 
             {/* Dynamic sections */}
-            {data.sections.map((section, i) => {
+            {current.sections.map((section, i) => {
                 switch (section.type) {
                     case "callout":
                         return <CalloutSection key={i} section={section} />;
@@ -201,7 +262,7 @@ export default function WrappedSpotlightCharts({ data }: Props) {
                             <EraCardsSection
                                 key={i}
                                 section={section}
-                                year={data.year}
+                                year={current.year}
                             />
                         );
                     case "archive":
@@ -93,7 +93,10 @@ export default function Home() {
                     info="Total hours listened each day. Useful for spotting seasonal patterns and periods of heavy or light listening."
                     className="lg:col-span-2"
                 >
-                    <DailyListeningChart data={stats.dailyListening} />
+                    <DailyListeningChart
+                        data={stats.dailyListening}
+                        downsampled={stats.dailyListeningDownsampled}
+                    />
                 </Card>
 
                 {/* Monthly & Yearly */}
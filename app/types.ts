@@ -6,8 +6,23 @@ export interface Overview {
   uniqueAlbums: number;
   dateRange: { start: string; end: string };
   longestStreak: number;
+  currentStreak: number;
+  longestWeeklyStreak: number;
+  currentWeeklyStreak: number;
 }
 
+export interface ArtistStreak {
+  name: string;
+  longestDays: number;
+  longestDaysStart: string;
+  currentDays: number;
+  longestWeeks: number;
+}
+
+// LTTB-downsampled copies of a long series, keyed by point budget ("500", "200");
+// a budget is only present when the full series is longer than it
+export type Downsampled<T> = Record<string, T[]>;
+
 export interface DailyListening {
   date: string;
   hours: number;
@@ -171,6 +186,7 @@ export interface SearchBehavior {
   uniqueQueries: number;
   avgSearchesPerDay: number;
   overTime: SearchOverTime[];
+  overTimeDownsampled?: Downsampled<SearchOverTime>;
   topQueries: TopQuery[];
   hourOfDay: SearchHourOfDay[];
 }
@@ -195,10 +211,36 @@ export interface WrappedSection {
   items: WrappedSectionItem[];
 }
 
+export interface WrappedYear {
+  year: number;
+  file: string;
+  highlights: WrappedHighlight[];
+  sections: WrappedSection[];
+  metrics: Record<string, number>; // raw values behind the highlights
+}
+
+export interface WrappedDelta {
+  metric: string;
+  label: string; // matches the highlight label
+  previous: number;
+  current: number;
+  change: number;
+  pctChange: number | null;
+}
+
+export interface WrappedYearOverYear {
+  year: number;
+  previousYear: number;
+  deltas: WrappedDelta[];
+}
+
+// Latest year up top; every year and the changes between consecutive ones below
 export interface WrappedSpotlight {
   year: number;
   highlights: WrappedHighlight[];
   sections: WrappedSection[];
+  years?: WrappedYear[];
+  yearOverYear?: WrappedYearOverYear[];
 }
 
 // Section 4: Library Health (cross-dataset)
@@ -251,6 +293,7 @@ export interface LibraryCollectionInteractionsMetrics {
   activeMonths: number;
   interactionWindow: LibraryInteractionWindow;
   weeklyTrend: LibraryInteractionWeek[];
+  weeklyTrendDownsampled?: Downsampled<LibraryInteractionWeek>;
   kindBreakdown: LibraryInteractionKind[];
 }
 
@@ -356,6 +399,7 @@ export interface PlaylistCurationMetrics {
   addsPerWeek: number;
   removesPerWeek: number;
   churnOverTime: ChurnWeek[];
+  churnOverTimeDownsampled?: Downsampled<ChurnWeek>;
   curationHeatmap: CurationHeatmapCell[];
   regretCount: number;
   regretPct: number;
@@ -397,12 +441,15 @@ export interface PlaybackQuality {
   totalErrors: number;
   fatalErrors: number;
   errorOverTime: ErrorWeek[];
+  errorOverTimeDownsampled?: Downsampled<ErrorWeek>;
   totalStutters: number;
   stutterTimeline: StutterWeek[];
+  stutterTimelineDownsampled?: Downsampled<StutterWeek>;
   errorToleranceRetryPct: number;
   errorToleranceRetries: number;
   errorToleranceSkips: number;
   downloadOverTime: DownloadWeek[];
+  downloadOverTimeDownsampled?: Downsampled<DownloadWeek>;
 }
 
 // Section 3: Social Listening & Sharing
@@ -428,16 +475,41 @@ export interface ShareWorthyEntry {
   priorPlays: number;
 }
 
+export interface ShareKind {
+  kind: string;
+  count: number;
+}
+
+export interface OverlapArtist {
+  name: string;
+  hours: number;
+}
+
+export interface ListeningSide {
+  hours: number; // part of each stream inside (or outside) social sessions
+  plays: number; // by stream midpoint
+  skipRate: number;
+  topArtists: OverlapArtist[];
+}
+
+export interface SocialListeningOverlap {
+  socialPct: number;
+  social: ListeningSide;
+  solo: ListeningSide;
+}
+
 export interface SocialSharing {
   totalSocialSessions: number;
   avgSessionMinutes: number;
   longestSessionMinutes: number;
   totalSocialHours: number;
   sessions: SocialSession[];
+  listeningOverlap: SocialListeningOverlap;
   totalShares: number;
   shareDestinations: ShareDestination[];
   shareOverTime: ShareMonth[];
   shareWorthyThreshold: ShareWorthyEntry[];
+  shareKindBreakdown: ShareKind[];
 }
 
 // Section 4: Device & App Evolution
@@ -473,6 +545,7 @@ export interface DeviceEvolution {
   osVersionTimeline: OsVersionEvent[];
   deviceFingerprint: DeviceInfo[];
   multiDeviceWeekly: MultiDeviceWeek[];
+  multiDeviceWeeklyDownsampled?: Downsampled<MultiDeviceWeek>;
   avgDevicesPerWeek: number;
   sessionHourOfDay: SessionHour[];
 }
@@ -503,9 +576,11 @@ export interface ApiErrorWeek {
 export interface ApiLatency {
   medianLatency: number;
   latencyOverTime: LatencyWeek[];
+  latencyOverTimeDownsampled?: Downsampled<LatencyWeek>;
   featureFingerprint: FeatureUsage[];
   endpointBreakdown: EndpointEntry[];
   errorOverTime: ApiErrorWeek[];
+  errorOverTimeDownsampled?: Downsampled<ApiErrorWeek>;
 }
 
 // Section 6: Push Notification Engagement
@@ -551,12 +626,158 @@ export interface ExplicitContent {
   topExplicitArtists: ExplicitArtist[];
 }
 
+// ---------------------------------------------------------------------------
+// Listening Sessions
+// ---------------------------------------------------------------------------
+export interface LongestSession {
+  start: string;
+  end: string;
+  minutes: number;
+  tracks: number;
+  platform: string | null;
+}
+
+export interface SessionLengthBucket {
+  bucket: string;
+  sessions: number;
+}
+
+export interface SessionStartHour {
+  hour: number;
+  sessions: number;
+}
+
+export interface SessionPlatform {
+  platform: string;
+  sessions: number;
+  avgMinutes: number;
+}
+
+export interface SessionMonth {
+  month: string;
+  sessions: number;
+  avgMinutes: number;
+  avgTracks: number;
+}
+
+export interface ListeningSessions {
+  idleMinutes: number;
+  totalSessions: number;
+  avgMinutes: number;
+  medianMinutes: number;
+  avgTracks: number;
+  avgSkips: number;
+  longest: LongestSession | null;
+  lengthDistribution: SessionLengthBucket[];
+  startHour: SessionStartHour[];
+  byPlatform: SessionPlatform[];
+  monthly: SessionMonth[];
+}
+
+// ---------------------------------------------------------------------------
+// Artist Transitions
+// ---------------------------------------------------------------------------
+export interface ArtistPair {
+  from: string;
+  to: string;
+  count: number;
+}
+
+export interface TransitionTrack {
+  name: string;
+  artist: string | null;
+}
+
+export interface TrackPair {
+  from: TransitionTrack;
+  to: TransitionTrack;
+  count: number;
+}
+
+export interface Successor {
+  name: string;
+  count: number;
+  share: number;
+}
+
+export interface ArtistSuccessors {
+  name: string;
+  transitions: number;
+  successors: Successor[];
+}
+
+export interface TransitionDrift {
+  month: string;
+  transitions: number;
+  sharedArtists: number;
+  drift: number | null;
+}
+
+export interface ArtistTransitions {
+  totalTransitions: number;
+  distinctArtistPairs: number;
+  distinctTrackPairs: number;
+  sameArtistPct: number;
+  topPairs: ArtistPair[];
+  topTrackPairs: TrackPair[];
+  topSuccessors: ArtistSuccessors[];
+  monthlyDrift: TransitionDrift[];
+}
+
+// ---------------------------------------------------------------------------
+// Obsessions
+// ---------------------------------------------------------------------------
+export interface PlayRun {
+  name: string;
+  artist?: string;
+  plays: number;
+  hours: number;
+  start: string;
+  end: string;
+}
+
+export interface TrackDayStreak {
+  name: string;
+  artist: string;
+  days: number;
+  start: string;
+  currentDays: number;
+}
+
+export interface Obsessions {
+  trackRuns: PlayRun[];
+  artistRuns: PlayRun[];
+  trackDayStreaks: TrackDayStreak[];
+}
+
+// ---------------------------------------------------------------------------
+// Rolling favorites
+// ---------------------------------------------------------------------------
+export interface RollingEntry {
+  name: string;
+  artist?: string; // tracks only
+  hours: number;
+}
+
+export interface RollingSnapshot {
+  month: string; // window ends with this month
+  top: RollingEntry[];
+}
+
+export interface RollingTop {
+  windows: number[]; // window lengths in days
+  artists: Record<string, RollingSnapshot[]>; // keyed by window length
+  tracks: Record<string, RollingSnapshot[]>;
+}
+
 // ---------------------------------------------------------------------------
 // Main Stats interface
 // ---------------------------------------------------------------------------
 export interface Stats {
   overview: Overview;
+  artistStreaks: ArtistStreak[];
   dailyListening: DailyListening[];
+  dailyListeningDownsampled?: Downsampled<DailyListening>;
   monthlyListening: MonthlyListening[];
   yearlyListening: YearlyListening[];
   hourOfDay: HourOfDay[];
@@ -577,6 +798,10 @@ export interface Stats {
   contentTypeSplit: ContentTypeSplit[];
   topPodcasts: TopPodcast[];
   newArtistDiscovery: NewArtistDiscovery[];
+  listeningSessions: ListeningSessions;
+  artistTransitions: ArtistTransitions;
+  obsessions: Obsessions;
+  rollingTop: RollingTop;
   // Account Data sections
   playlistInsights: PlaylistInsights;
   searchBehavior: SearchBehavior;
@@ -0,0 +1,180 @@
+"""
+Run preprocess.py for many accounts concurrently.
+
+The manifest is a JSON list of accounts, each with a name and the root folder
+of that account's export, i.e. the folder holding "Spotify Extended Streaming
+History/", "Spotify Account Data/", "Spotify Technical Log Information/" and
+(optionally) saved_tracks.json. Relative roots are resolved against the
+manifest's folder:
+
+    [
+        {"name": "alice", "root": "exports/alice"},
+        {"name": "bob", "root": "/data/spotify/bob"}
+    ]
+
+Every account runs in a fresh worker process and writes
+<output-dir>/<name>/stats.json plus its log to <name>/preprocess.log. A
+throughput summary is written to <output-dir>/summary.json.
+
+Run from the history_analysis_web/ directory:
+    python batch_preprocess.py accounts.json
+    python batch_preprocess.py accounts.json --workers 8 --max-memory-mb 4096
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+import pandas as pd
+
+import preprocess
+
+try:
+    import resource
+except ImportError:  # Windows: no per-process memory limits
+    resource = None
+
+DEFAULT_OUTPUT_DIR = "batch_output"
+
+
+def load_manifest(path: str) -> list[dict]:
+    """Accounts listed in the manifest, with roots made absolute."""
+    with open(path, "r") as fh:
+        accounts = json.load(fh)
+    if not isinstance(accounts, list):
+        raise ValueError(f"{path}: expected a JSON list of accounts")
+
+    base = os.path.dirname(os.path.abspath(path))
+    jobs, seen = [], set()
+    for i, account in enumerate(accounts):
+        name, root = account.get("name"), account.get("root")
+        if not name or not root:
+            raise ValueError(f"{path}: account {i} needs a name and a root")
+        if os.sep in name or name in (".", ".."):
+            raise ValueError(f"{path}: account name {name!r} must be a plain folder name")
+        if name in seen:
+            raise ValueError(f"{path}: duplicate account name {name!r}")
+        seen.add(name)
+        jobs.append({"name": name, "root": os.path.join(base, root)})
+    return jobs
+
+
+def warm_shared_tables() -> None:
+    """Build the process-wide, read-only tables every account needs, once.
+
+    Converting a few timestamps loads the zone's transition data into the
+    time zone caches used by tz_convert and the .dt accessors. With the fork
+    start method, workers inherit these (and the imported modules) from the
+    parent instead of rebuilding them per account.
+    """
+    ts = pd.Series(pd.to_datetime(["2000-01-01", "2040-01-01"], utc=True)).dt.tz_convert(preprocess.LOCAL_TZ)
+    ts.dt.hour
+    ts.dt.tz_localize(None)
+
+
+def init_worker(max_memory_mb: float | None) -> None:
+    if max_memory_mb is not None and resource is not None:
+        limit = int(max_memory_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return (peak if sys.platform == "darwin" else peak * 1024) / (1024 * 1024)
+
+
+def run_account(job: dict, output_dir: str) -> dict:
+    """Preprocess one account into <output_dir>/<name>/; never raises."""
+    account_dir = os.path.join(output_dir, job["name"])
+    os.makedirs(account_dir, exist_ok=True)
+    result = {"name": job["name"], "root": job["root"], "status": "ok", "error": None}
+    started = time.perf_counter()
+    with open(os.path.join(account_dir, "preprocess.log"), "w") as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            preprocess.use_export_root(job["root"])
+            ctx = preprocess.AnalysisContext()
+            preprocess.run_sections(ctx)
+            preprocess.write_stats(ctx.stats, os.path.join(account_dir, "stats.json"))
+            result["rows"] = len(ctx.df)
+        except MemoryError:
+            result.update(status="failed", error="exceeded the per-job memory cap")
+        except Exception as e:
+            traceback.print_exc()
+            result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    result["peakRssMb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+def run_account_star(args: tuple) -> dict:
+    return run_account(*args)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-memory-mb", type=float, default=None,
+                        help="address-space cap for each account's worker process (Unix only)")
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    if not jobs:
+        print(f"No accounts in {args.manifest}")
+        return 2
+    if args.max_memory_mb is not None and resource is None:
+        print("  --max-memory-mb is not supported on this platform; running without a cap")
+
+    warm_shared_tables()
+    # Loaded once here; fork hands the registered plugin sections to every worker
+    preprocess.load_plugins()
+    # fork shares the warmed tables and imported modules; one task per child
+    # gives every account a fresh process, so the memory cap and peak RSS are per job
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"Processing {len(jobs)} accounts with {workers} workers ({start_method}) …")
+
+    results = []
+    started = time.perf_counter()
+    with multiprocessing.get_context(start_method).Pool(
+        workers, initializer=init_worker, initargs=(args.max_memory_mb,), maxtasksperchild=1
+    ) as pool:
+        for result in pool.imap_unordered(run_account_star, [(job, args.output_dir) for job in jobs]):
+            results.append(result)
+            detail = f"{result.get('rows', 0):,} rows" if result["status"] == "ok" else result["error"]
+            print(f"  {result['name']}: {result['status']} in {result['seconds']:.1f}s, "
+                  f"peak {result['peakRssMb']:,.0f} MB ({detail})")
+    wall = time.perf_counter() - started
+
+    succeeded = sum(r["status"] == "ok" for r in results)
+    summary = {
+        "accounts": len(jobs),
+        "succeeded": succeeded,
+        "failed": len(jobs) - succeeded,
+        "workers": workers,
+        "maxMemoryMb": args.max_memory_mb,
+        "wallSeconds": round(wall, 2),
+        "accountsPerMinute": round(succeeded / wall * 60, 2) if wall > 0 else 0,
+        "results": sorted(results, key=lambda r: r["name"]),
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_path = os.path.join(args.output_dir, "summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"{succeeded}/{len(jobs)} accounts in {wall:.1f}s ({summary['accountsPerMinute']:.2f} accounts/minute)")
+    print(f"Wrote {summary_path}")
+    return 0 if succeeded == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
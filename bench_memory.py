@@ -0,0 +1,73 @@
+"""
+Peak-memory regression benchmark for preprocess.py.
+
+Runs the full preprocessing in a child process and compares its peak RSS
+(minus the cost of just importing pandas/numpy) against the size of the raw
+streaming history files. Exits non-zero when the ratio exceeds --max-ratio.
+
+Run from the history_analysis_web/ directory (Unix only):
+    python bench_memory.py
+    python bench_memory.py --max-ratio 4 > bench_output.txt
+"""
+
+import argparse
+import glob
+import os
+import resource
+import subprocess
+import sys
+import time
+
+# Same default as preprocess.py
+HISTORY_DIR = "../Spotify Extended Streaming History/"
+
+
+def child_peak_rss_bytes() -> int:
+    """Largest peak RSS among all waited-for child processes so far."""
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history-dir", default=HISTORY_DIR)
+    parser.add_argument("--max-ratio", type=float, default=5.0,
+                        help="fail when (peak RSS - import baseline) / raw history size exceeds this")
+    args = parser.parse_args()
+
+    history_files = (
+        glob.glob(os.path.join(args.history_dir, "Streaming_History_Audio_*.json"))
+        + glob.glob(os.path.join(args.history_dir, "Streaming_History_Video_*.json"))
+    )
+    raw_bytes = sum(os.path.getsize(fp) for fp in history_files)
+    if raw_bytes == 0:
+        print(f"No streaming history found in {args.history_dir}")
+        return 2
+
+    # Baseline: interpreter + pandas/numpy imports. Must run first, because
+    # RUSAGE_CHILDREN only ever reports the largest child seen.
+    subprocess.run([sys.executable, "-c", "import pandas, numpy"], check=True)
+    baseline = child_peak_rss_bytes()
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "preprocess.py", "--no-cache"], check=True, stdout=subprocess.DEVNULL)
+    elapsed = time.perf_counter() - started
+    peak = child_peak_rss_bytes()
+
+    net = max(peak - baseline, 0)
+    ratio = net / raw_bytes
+    mb = 1024 * 1024
+    print(f"raw history:     {raw_bytes / mb:,.1f} MB in {len(history_files)} files")
+    print(f"import baseline: {baseline / mb:,.1f} MB")
+    print(f"peak RSS:        {peak / mb:,.1f} MB ({elapsed:.1f}s)")
+    print(f"net / raw:       {ratio:.2f}x (limit {args.max_ratio:.2f}x)")
+    if ratio > args.max_ratio:
+        print("FAIL: peak memory regression")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
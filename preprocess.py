@@ -4,46 +4,510 @@ for the Next.js dashboard.
 
 Run from the history_analysis_web/ directory:
     python preprocess.py
+    python preprocess.py --watch   # rewrite stats.json as export files change
 """
 
+import argparse
+import contextlib
+import fnmatch
 import glob
+import hashlib
+import importlib.util
+import inspect
 import json
+import multiprocessing
 import os
 import re
-from collections import defaultdict
+import sys
+import tempfile
+import time
+import traceback
+import zoneinfo
+from collections import OrderedDict, defaultdict
 
 import pandas as pd
 import numpy as np
 
+try:
+    import polars as pl
+except ImportError:  # optional: only needed for --backend polars
+    pl = None
+
+# ---------------------------------------------------------------------------
+# 0. Shared loaders, classifiers and the section registry
+# ---------------------------------------------------------------------------
+TECHLOG_DIR = "../Spotify Technical Log Information/"
+
+# Time zone every timestamp is converted to before computing time-based stats
+LOCAL_TZ = "US/Eastern"
+
+# Several sections read the same technical-log files. Parsed frames are
+# memoized here and every caller gets a shallow copy, so adding columns
+# (ts, week, …) never touches the cached frame; callers must not modify
+# existing values in place. Set a budget to evict least-recently-used frames.
+FRAME_CACHE_BUDGET_MB = None
+frame_cache: "OrderedDict[str, tuple[pd.DataFrame, int]]" = OrderedDict()
+frame_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "hitsByKey": defaultdict(int)}
+
+
+def cached_frame(key: str, build) -> pd.DataFrame:
+    """Return a read-only view of the frame cached under `key`, building it on a miss."""
+    if key in frame_cache:
+        frame_cache.move_to_end(key)
+        frame_cache_stats["hits"] += 1
+        frame_cache_stats["hitsByKey"][key] += 1
+        return frame_cache[key][0].copy(deep=False)
+
+    frame_cache_stats["misses"] += 1
+    frame = build()
+    frame_cache[key] = (frame, int(frame.memory_usage(index=True, deep=True).sum()))
+    if FRAME_CACHE_BUDGET_MB is not None:
+        budget = FRAME_CACHE_BUDGET_MB * 1024 * 1024
+        # Never evict the frame just built, even if it alone exceeds the budget
+        while len(frame_cache) > 1 and sum(size for _, size in frame_cache.values()) > budget:
+            frame_cache.popitem(last=False)
+            frame_cache_stats["evictions"] += 1
+    return frame.copy(deep=False)
+
+
+def invalidate_frames(paths) -> list[str]:
+    """Drop cached frames built from any of `paths`; return the dropped keys."""
+    changed = {os.path.abspath(p) for p in paths}
+    stale = [
+        key for key in frame_cache
+        # Numbered keys are globs (prefix_*.json) that may have fallen back to prefix.json
+        if any(p == key or fnmatch.fnmatch(p, key) or p == key.replace("_*.json", ".json") for p in changed)
+    ]
+    for key in stale:
+        del frame_cache[key]
+    return stale
+
+
+def numbered_json_files(prefix: str, directory: str | None = None) -> list[str]:
+    """Paths of files like AddedToPlaylist_0.json, AddedToPlaylist_1.json, … (in TECHLOG_DIR by default)"""
+    directory = TECHLOG_DIR if directory is None else directory
+    pattern = os.path.join(directory, f"{prefix}_*.json")
+    files = sorted(glob.glob(pattern))
+    if not files:
+        # Try single file (no number suffix)
+        single = os.path.join(directory, f"{prefix}.json")
+        if os.path.exists(single):
+            files = [single]
+    return files
+
+def read_json_array(fp: str, sample: bool = False) -> pd.DataFrame:
+    """Parse a JSON array file into a frame (empty if missing or not a non-empty array).
+
+    With `sample`, a preview run keeps only its sampled fraction of the records.
+    """
+    if not os.path.exists(fp):
+        return pd.DataFrame()
+    with open(fp, "r") as fh:
+        data = json.load(fh)
+    if isinstance(data, list) and sample and preview_sampler is not None:
+        data = preview_sampler.thin(data)
+    if isinstance(data, list) and len(data) > 0:
+        return pd.DataFrame(data)
+    return pd.DataFrame()
+
+# Helper: load and concatenate numbered JSON files
+def load_numbered_json(prefix: str, directory: str | None = None) -> pd.DataFrame:
+    """Load files like AddedToPlaylist_0.json, AddedToPlaylist_1.json, …"""
+    directory = TECHLOG_DIR if directory is None else directory
+    files = numbered_json_files(prefix, directory)
+
+    def build() -> pd.DataFrame:
+        frames = [read_json_array(fp, sample=directory == TECHLOG_DIR) for fp in files]
+        frames = [frame for frame in frames if len(frame) > 0]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    return cached_frame(os.path.join(os.path.abspath(directory), f"{prefix}_*.json"), build)
+
+def load_single_json(filename: str, directory: str | None = None) -> pd.DataFrame:
+    """Load a single JSON array file (from TECHLOG_DIR by default)."""
+    directory = TECHLOG_DIR if directory is None else directory
+    fp = os.path.abspath(os.path.join(directory, filename))
+    return cached_frame(fp, lambda: read_json_array(fp, sample=directory == TECHLOG_DIR))
+
+def iter_json_array(path: str, chunk_records: int = 100_000, read_size: int = 1 << 20):
+    """Yield lists of up to `chunk_records` elements of a top-level JSON array.
+
+    The file is read `read_size` characters at a time and elements are decoded
+    one by one, so memory stays proportional to one chunk rather than the file.
+    Yields nothing if the file does not hold an array.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = " \t\n\r"
+    delimiters = whitespace + ",]"
+    with open(path, "r") as fh:
+        buf = fh.read(read_size)
+        eof = not buf
+        pos = 0
+        started = False
+        chunk = []
+        while True:
+            # Skip whitespace / separators, pulling in more text when the buffer runs dry
+            while pos < len(buf) and (buf[pos] in whitespace or (started and buf[pos] == ",")):
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    break
+                buf, pos = fh.read(read_size), 0
+                eof = not buf
+                continue
+            if not started:
+                if buf[pos] != "[":
+                    return
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                break
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                error = None
+            except json.JSONDecodeError as exc:
+                end, error = None, exc
+            # An element not followed by a delimiter may be cut short (e.g. "-45" of "-4500.0")
+            if end is None or (not eof and (end == len(buf) or buf[end] not in delimiters)):
+                more = fh.read(read_size)
+                if more:
+                    buf, pos = buf[pos:] + more, 0
+                    continue
+                eof = True
+                if error is not None:
+                    raise error
+            chunk.append(item)
+            pos = end
+            if len(chunk) >= chunk_records:
+                yield chunk
+                chunk = []
+            if pos > read_size:
+                buf, pos = buf[pos:], 0
+        if chunk:
+            yield chunk
+
+
+# Preview mode (--preview) builds every section from a sample of the rows; see
+# PreviewSampler. None during a full run.
+PREVIEW_CHUNK_RECORDS = 50_000
+preview_sampler: "PreviewSampler | None" = None
+
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream (Algorithm R), fed a chunk at a time.
+
+    `positions` holds each kept item's index in the stream, so the sample can
+    be put back in stream order.
+    """
+
+    def __init__(self, size: int, rng: np.random.Generator):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.items: list = []
+        self.positions: list[int] = []
+
+    def feed(self, records: list) -> None:
+        fill = max(0, min(len(records), self.size - len(self.items)))
+        self.items.extend(records[:fill])
+        self.positions.extend(range(self.seen, self.seen + fill))
+        rest = len(records) - fill
+        if rest > 0:
+            # Item i replaces a random slot with probability size / (i + 1); one vectorized
+            # draw per chunk, applied in stream order, matches drawing item by item
+            index = np.arange(self.seen + fill, self.seen + len(records))
+            slots = self.rng.integers(0, index + 1)
+            for i in np.flatnonzero(slots < self.size):
+                self.items[slots[i]] = records[fill + i]
+                self.positions[slots[i]] = int(index[i])
+        self.seen += len(records)
+
+    def in_order(self, keep: int | None = None) -> list:
+        """The sample in stream order, optionally cut down to a uniform subsample of `keep` items."""
+        picks = np.arange(len(self.items))
+        if keep is not None and keep < len(picks):
+            picks = self.rng.choice(picks, keep, replace=False)
+        picks = sorted(picks, key=lambda i: self.positions[i])
+        return [self.items[i] for i in picks]
+
+
+class PreviewSampler:
+    """Row sampling for --preview.
+
+    The streaming history is streamed through reservoirs down to `size` rows:
+    one reservoir over all files ("uniform"), or one per file, each cut to its
+    file's share of the rows ("stratified", which keeps every file, and so
+    every period of the history, represented in proportion). The realized
+    fraction n / N then thins the technical logs with an independent draw per
+    record, so every sampled input has the same inclusion probability and
+    additive metrics scale back up by 1 / fraction (see annotate_preview).
+    """
+
+    def __init__(self, size: int, strategy: str = "stratified", seed: int = 0):
+        self.size = size
+        self.strategy = strategy
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.fraction = 1.0
+        self.history_rows = 0
+        self.sampled_rows = 0
+
+    def sample_history(self, files: list[str]) -> list[dict]:
+        def feed(fp: str, reservoir: Reservoir) -> None:
+            for records in iter_json_array(fp, PREVIEW_CHUNK_RECORDS):
+                reservoir.feed(records)
+
+        if self.strategy == "uniform":
+            reservoir = Reservoir(self.size, self.rng)
+            for fp in files:
+                feed(fp, reservoir)
+            total, rows = reservoir.seen, reservoir.in_order()
+        else:
+            reservoirs = []
+            for fp in files:
+                reservoirs.append(Reservoir(self.size, self.rng))
+                feed(fp, reservoirs[-1])
+            total = sum(r.seen for r in reservoirs)
+            rows = []
+            for r in reservoirs:
+                rows.extend(r.in_order(round(self.size * r.seen / total)))
+
+        self.history_rows, self.sampled_rows = total, len(rows)
+        self.fraction = len(rows) / total if total else 1.0
+        return rows
+
+    def thin(self, records: list) -> list:
+        """Keep each record with probability `fraction`."""
+        if self.fraction >= 1:
+            return records
+        keep = self.rng.random(len(records)) < self.fraction
+        return [record for record, kept in zip(records, keep) if kept]
+
+# URI kinds and API endpoint groups are pure functions of the string, so
+# they are computed once per distinct value (for categorical columns, once
+# per category) and broadcast back to the rows.
+URI_KINDS = ["track", "album", "artist", "episode", "show"]
+URI_KIND_PATTERN = r"^spotify:(" + "|".join(URI_KINDS) + r"):"
+
+
+def classify_distinct(values: pd.Series, classify, missing: str) -> pd.Series:
+    """Categorical of `classify` (a vectorized Series -> labels function) applied to distinct values.
+
+    Missing values get the `missing` label.
+    """
+    codes, uniques = pd.factorize(values)
+    labels = np.append(np.asarray(classify(pd.Series(np.asarray(uniques, dtype=object))), dtype=object), missing)
+    label_codes, label_names = pd.factorize(labels)
+    # codes == -1 (missing) picks the trailing `missing` label
+    return pd.Series(pd.Categorical.from_codes(label_codes[codes], label_names), index=values.index)
+
+
+def uri_kind(uris: pd.Series) -> pd.Series:
+    """Kind of each Spotify URI: track, album, artist, episode, show or other."""
+    def classify(distinct: pd.Series) -> pd.Series:
+        text = distinct.where(distinct.map(type) == str)
+        return text.str.extract(URI_KIND_PATTERN, expand=False).fillna("other")
+
+    return classify_distinct(uris, classify, "other")
+
+
+def endpoint_category(paths: pd.Series) -> pd.Series:
+    """API path grouped by its first three segments, e.g. /v1/me/player/next -> /v1/me/player."""
+    def classify(distinct: pd.Series) -> pd.Series:
+        segments = distinct.astype(str).str.strip("/").str.split("/", n=3)
+        return "/" + segments.str[:3].str.join("/")
+
+    return classify_distinct(paths, classify, "/nan")
+
+
+# Sections are the metrics written to stats.json. Each registers with the
+# export files it reads itself (`inputs`, as (export dir, glob) pairs) and
+# the derived datasets it uses (`needs`). Datasets register the same way and
+# are built by the context on first use, once per run, however many sections
+# need them. A full run executes sections in registration order; watch mode
+# re-runs only the sections reached from the files that changed. Plugins
+# (see load_plugins) add more of both with the same decorators.
+SECTIONS: "OrderedDict[str, dict]" = OrderedDict()
+DATASETS: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def section(name: str, inputs=(), needs=()):
+    """Register the decorated function as the section `name`."""
+    if name in SECTIONS:
+        raise ValueError(f"section {name!r} is already registered")
+
+    def register(func):
+        SECTIONS[name] = {"run": func, "inputs": list(inputs), "needs": list(needs)}
+        return func
+
+    return register
+
+
+def dataset(name: str, inputs=(), needs=()):
+    """Register the decorated function as the derived dataset `name`.
+
+    The function takes the context and returns the dataset, built from the
+    files in `inputs` and the datasets in `needs`. Every section gets the
+    same object, so arrays and frames in it must be treated as read-only.
+    """
+    if name in DATASETS:
+        raise ValueError(f"dataset {name!r} is already registered")
+
+    def register(func):
+        DATASETS[name] = {"build": func, "inputs": list(inputs), "needs": list(needs)}
+        return func
+
+    return register
+
+
+def datasets_upstream(names) -> set[str]:
+    """`names` plus every dataset they need, transitively."""
+    found, todo = set(), list(names)
+    while todo:
+        name = todo.pop()
+        if name in found:
+            continue
+        if name not in DATASETS:
+            raise KeyError(f"unknown dataset {name!r}")
+        found.add(name)
+        todo.extend(DATASETS[name]["needs"])
+    return found
+
+
+def datasets_downstream(names) -> set[str]:
+    """`names` plus every dataset that needs one of them, transitively."""
+    affected = set(names)
+    grew = True
+    while grew:
+        grew = False
+        for name, spec in DATASETS.items():
+            if name not in affected and any(dep in affected for dep in spec["needs"]):
+                affected.add(name)
+                grew = True
+    return affected
+
+
+class AnalysisContext:
+    """State shared by the sections of a run.
+
+    `dataset(name)` builds a registered dataset the first time any section
+    asks for it and hands every later caller the same object; `df`, `masks`
+    and `row_subsets` are the streaming history datasets. `stats` is the
+    output being built. Watch mode keeps one context alive so datasets whose
+    inputs did not change stay built.
+    """
+
+    def __init__(self, backend: str = "pandas"):
+        self.backend = backend  # engine for section 2's core aggregates, see LISTENING_BACKENDS
+        self.datasets: dict = {}
+        self.build_seconds: dict[str, float] = {}
+        # ("section <name>" / "dataset <name>", the datasets it may use) for each one in progress
+        self.scopes: list[tuple[str, set[str]]] = []
+        self.stats: dict = {}
+        # Stage cache of the current run (None without one), for sections that cache per input file
+        self.cache = None
+
+    def dataset(self, name: str):
+        """The dataset `name`, built (after the datasets it needs) on first use."""
+        # Stage cache keys only cover declared datasets, so using any other one is an error
+        if self.scopes and name not in self.scopes[-1][1]:
+            raise KeyError(f"{self.scopes[-1][0]} uses dataset {name!r} without listing it in `needs`")
+        if name in self.datasets:
+            return self.datasets[name]
+        if any(owner == f"dataset {name}" for owner, _ in self.scopes):
+            raise RuntimeError(f"dataset {name!r} needs itself")
+        spec = DATASETS[name]
+        with self.scope(f"dataset {name}", spec["needs"]):
+            for dep in spec["needs"]:
+                self.dataset(dep)
+            started = time.perf_counter()
+            self.datasets[name] = spec["build"](self)
+            self.build_seconds[name] = time.perf_counter() - started
+        return self.datasets[name]
+
+    @contextlib.contextmanager
+    def scope(self, owner: str, needs):
+        """Let `owner` use the datasets in `needs` (and what they need) while the block runs."""
+        self.scopes.append((owner, datasets_upstream(needs)))
+        try:
+            yield
+        finally:
+            self.scopes.pop()
+
+    def invalidate(self, names) -> list[str]:
+        """Drop the built datasets `names` and everything built from them; return the dropped names."""
+        stale = [name for name in datasets_downstream(names) if name in self.datasets]
+        for name in stale:
+            del self.datasets[name]
+        return sorted(stale)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self.dataset("streams")
+
+    @property
+    def masks(self) -> dict[str, np.ndarray]:
+        return self.dataset("masks")
+
+    @property
+    def row_subsets(self) -> dict[str, np.ndarray]:
+        return self.dataset("row_subsets")
+
+    def rows(self, subset, *columns: str) -> pd.DataFrame:
+        """Narrow frame of `columns` for a named subset, boolean mask or row positions of df."""
+        positions = self.row_subsets[subset] if isinstance(subset, str) else subset
+        df = self.df
+        return df.iloc[positions, df.columns.get_indexer(list(columns))]
+
+
 # ---------------------------------------------------------------------------
 # 1. Load all streaming history JSON files
 # ---------------------------------------------------------------------------
 HISTORY_DIR = "../Spotify Extended Streaming History/"
 
-file_list = (
-    glob.glob(os.path.join(HISTORY_DIR, "Streaming_History_Audio_*.json"))
-    + glob.glob(os.path.join(HISTORY_DIR, "Streaming_History_Video_*.json"))
-)
+# Compact dtypes, assigned right at load: repeated strings become
+# categoricals and flags become nullable booleans. Groupbys on categorical
+# columns below pass observed=True so only categories present are emitted.
+STREAM_SCHEMA = {
+    "platform": "category",
+    "conn_country": "category",
+    "reason_start": "category",
+    "reason_end": "category",
+    "master_metadata_track_name": "category",
+    "master_metadata_album_artist_name": "category",
+    "master_metadata_album_album_name": "category",
+    "spotify_track_uri": "category",
+    "episode_show_name": "category",
+    "audiobook_title": "category",
+    "skipped": "boolean",
+    "shuffle": "boolean",
+    "offline": "boolean",
+    "incognito_mode": "boolean",
+}
+
 
-frames = []
-for fp in file_list:
-    frames.append(pd.read_json(fp))
-df = pd.concat(frames, ignore_index=True)
+def apply_schema(frame: pd.DataFrame, schema: dict) -> list[tuple[str, int, int]]:
+    """Cast `frame` columns in place; return (column, bytes before, bytes after)."""
+    report = []
+    for col, dtype in schema.items():
+        if col not in frame.columns:
+            continue
+        if dtype == "boolean" and frame[col].dtype == bool:
+            continue  # already one byte per row with no missing values
+        before = int(frame[col].memory_usage(index=False, deep=True))
+        frame[col] = frame[col].astype(dtype)
+        report.append((col, before, int(frame[col].memory_usage(index=False, deep=True))))
+    return report
 
-# Basic type coercions
-df["ts"] = pd.to_datetime(df["ts"], utc=True)
-df["ms_played"] = pd.to_numeric(df["ms_played"], errors="coerce").fillna(0)
-df["hours"] = df["ms_played"] / 3_600_000
 
-# Convert UTC to US/Eastern so all time-based stats use local time
-df["ts"] = df["ts"].dt.tz_convert("US/Eastern")
+def compact_ms_played(values: pd.Series) -> pd.Series:
+    """Milliseconds as uint32 (covers plays up to ~49 days) when the values allow it."""
+    ms = pd.to_numeric(values, errors="coerce").fillna(0)
+    if len(ms) > 0 and ms.min() >= 0 and ms.max() <= np.iinfo(np.uint32).max and (ms % 1 == 0).all():
+        return ms.astype(np.uint32)
+    return ms
 
-# Convenience columns
-df["date"] = df["ts"].dt.date
-df["month"] = df["ts"].dt.to_period("M")
-df["year"] = df["ts"].dt.year
-df["hour_of_day"] = df["ts"].dt.hour
-df["day_of_week"] = df["ts"].dt.dayofweek  # 0=Mon … 6=Sun
 
 # Classify content type
 def classify(row):
@@ -55,276 +519,1253 @@ def classify(row):
         return "audiobook"
     return "other"
 
-df["content_type"] = df.apply(classify, axis=1)
 
-print(f"Loaded {len(df):,} rows spanning {df['ts'].min()} – {df['ts'].max()}")
+# Local time of each play comes from the country it was played in
+# (conn_country), so listening abroad lands on that country's clock.
+# Countries spanning several zones map to their most populous one; countries
+# not listed (including the US) and rows without a country use LOCAL_TZ.
+# Override per country with --country-tz CC=Zone, or use --single-tz to put
+# every play in LOCAL_TZ.
+COUNTRY_TIMEZONES = {
+    "AR": "America/Argentina/Buenos_Aires", "AT": "Europe/Vienna", "AU": "Australia/Sydney",
+    "BE": "Europe/Brussels", "BG": "Europe/Sofia", "BR": "America/Sao_Paulo", "CA": "America/Toronto",
+    "CH": "Europe/Zurich", "CL": "America/Santiago", "CN": "Asia/Shanghai", "CO": "America/Bogota",
+    "CR": "America/Costa_Rica", "CY": "Asia/Nicosia", "CZ": "Europe/Prague", "DE": "Europe/Berlin",
+    "DK": "Europe/Copenhagen", "DO": "America/Santo_Domingo", "EC": "America/Guayaquil", "EE": "Europe/Tallinn",
+    "EG": "Africa/Cairo", "ES": "Europe/Madrid", "FI": "Europe/Helsinki", "FR": "Europe/Paris",
+    "GB": "Europe/London", "GR": "Europe/Athens", "GT": "America/Guatemala", "HK": "Asia/Hong_Kong",
+    "HR": "Europe/Zagreb", "HU": "Europe/Budapest", "ID": "Asia/Jakarta", "IE": "Europe/Dublin",
+    "IL": "Asia/Jerusalem", "IN": "Asia/Kolkata", "IS": "Atlantic/Reykjavik", "IT": "Europe/Rome",
+    "JM": "America/Jamaica", "JP": "Asia/Tokyo", "KE": "Africa/Nairobi", "KR": "Asia/Seoul",
+    "LT": "Europe/Vilnius", "LU": "Europe/Luxembourg", "LV": "Europe/Riga", "MA": "Africa/Casablanca",
+    "MT": "Europe/Malta", "MX": "America/Mexico_City", "MY": "Asia/Kuala_Lumpur", "NG": "Africa/Lagos",
+    "NL": "Europe/Amsterdam", "NO": "Europe/Oslo", "NZ": "Pacific/Auckland", "PA": "America/Panama",
+    "PE": "America/Lima", "PH": "Asia/Manila", "PL": "Europe/Warsaw", "PR": "America/Puerto_Rico",
+    "PT": "Europe/Lisbon", "RO": "Europe/Bucharest", "RS": "Europe/Belgrade", "SA": "Asia/Riyadh",
+    "SE": "Europe/Stockholm", "SG": "Asia/Singapore", "SI": "Europe/Ljubljana", "SK": "Europe/Bratislava",
+    "TH": "Asia/Bangkok", "TR": "Europe/Istanbul", "TW": "Asia/Taipei", "UA": "Europe/Kyiv",
+    "AE": "Asia/Dubai", "UY": "America/Montevideo", "VN": "Asia/Ho_Chi_Minh", "ZA": "Africa/Johannesburg",
+}
+# Set with --country-tz / --single-tz, see use_country_timezones
+COUNTRY_TZ_OVERRIDES: dict[str, str] = {}
+TZ_BY_COUNTRY = True
+
+
+def zone_for_country(country) -> str:
+    if not TZ_BY_COUNTRY or not isinstance(country, str):
+        return LOCAL_TZ
+    country = country.upper()
+    return COUNTRY_TZ_OVERRIDES.get(country) or COUNTRY_TIMEZONES.get(country, LOCAL_TZ)
+
+
+def local_wall_clock(utc_ns: np.ndarray, countries: pd.Series) -> tuple[np.ndarray, list[str]]:
+    """Wall-clock time of each play (UTC ns) in its country's zone, as int64 ns, and the zones used.
+
+    Rows are grouped by zone through the country codes and each group is
+    converted with one vectorized tz_convert, so the cost grows with the
+    number of distinct zones, not rows.
+    """
+    utc = utc_ns.astype("datetime64[ns]")
+    country_codes, country_names = pd.factorize(countries.astype(object))
+    zone_codes, zones = pd.factorize(np.array([zone_for_country(c) for c in country_names] + [LOCAL_TZ], dtype=object))
+    # factorize marks missing countries -1, which picks the trailing LOCAL_TZ entry
+    row_zone = zone_codes[country_codes]
+
+    wall = np.empty(len(utc), dtype=np.int64)
+    order = np.argsort(row_zone, kind="stable")
+    bounds = np.flatnonzero(np.diff(row_zone[order], prepend=-1))
+    for lo, hi in zip(bounds, np.append(bounds[1:], len(order))):
+        rows = order[lo:hi]
+        zone = zones[row_zone[rows[0]]]
+        wall[rows] = pd.DatetimeIndex(utc[rows]).tz_localize("UTC").tz_convert(zone).tz_localize(None).asi8
+    used = [zones[z] for z in np.unique(row_zone)]
+    return wall, used
+
+
+@dataset(
+    "streams",
+    inputs=[("history", "Streaming_History_Audio_*.json"), ("history", "Streaming_History_Video_*.json")],
+)
+def load_streams(ctx: AnalysisContext) -> pd.DataFrame:
+    """The streaming history, one row per play, with compact dtypes and local calendar columns (ctx.df)."""
+    file_list = (
+        glob.glob(os.path.join(HISTORY_DIR, "Streaming_History_Audio_*.json"))
+        + glob.glob(os.path.join(HISTORY_DIR, "Streaming_History_Video_*.json"))
+    )
+
+    if preview_sampler is not None:
+        df = pd.DataFrame(preview_sampler.sample_history(file_list))
+        print(f"Preview: sampled {preview_sampler.sampled_rows:,} of {preview_sampler.history_rows:,} rows "
+              f"({preview_sampler.strategy}, {preview_sampler.fraction:.2%})")
+    else:
+        frames = []
+        for fp in file_list:
+            frames.append(pd.read_json(fp))
+        df = pd.concat(frames, ignore_index=True)
+
+    # Basic type coercions
+    df["ts"] = pd.to_datetime(df["ts"], utc=True)
+    ms_before = int(df["ms_played"].memory_usage(index=False, deep=True))
+    df["ms_played"] = compact_ms_played(df["ms_played"])
+    schema_report = [("ms_played", ms_before, int(df["ms_played"].memory_usage(index=False)))]
+    schema_report += apply_schema(df, STREAM_SCHEMA)
+    df["hours"] = df["ms_played"] / 3_600_000
+
+    print("Compact dtypes:")
+    for col, before, after in schema_report:
+        print(f"  {col}: {before / 1e6:,.2f} MB -> {after / 1e6:,.2f} MB (saved {(before - after) / 1e6:,.2f} MB)")
+    total_before = sum(before for _, before, _ in schema_report)
+    total_after = sum(after for _, _, after in schema_report)
+    print(f"  total: saved {(total_before - total_after) / 1e6:,.2f} MB of {total_before / 1e6:,.2f} MB")
+
+    # Timestamps are shown in LOCAL_TZ; the calendar columns below use the
+    # wall clock of the country each play happened in
+    df["ts"] = df["ts"].dt.tz_convert(LOCAL_TZ)
+    utc_ns = ts_ns(df)
+    wall, zones = local_wall_clock(utc_ns, df["conn_country"])
+    if len(zones) > 1:
+        print(f"  local time from conn_country: {len(zones)} time zones")
+
+    # Convenience columns
+    # Local calendar day as an integer (days since 1970-01-01) for vectorized math
+    day_num = wall // 86_400_000_000_000
+    df["date"] = day_num.astype("datetime64[D]").astype(object)
+    df["month"] = pd.Series(wall.astype("datetime64[ns]"), index=df.index).dt.to_period("M")
+    df["year"] = (day_num.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970).astype(np.int32)
+    df["hour_of_day"] = (wall // 3_600_000_000_000 % 24).astype(np.int32)
+    df["day_of_week"] = ((day_num + 3) % 7).astype(np.int32)  # 0=Mon … 6=Sun (1970-01-01 was a Thursday)
+    df["day_num"] = day_num
+    # Offset of each play's local clock from UTC, for times derived later (e.g. session starts)
+    df["utc_offset_s"] = ((wall - utc_ns) // 1_000_000_000).astype(np.int32)
+
+    df["content_type"] = df.apply(classify, axis=1)
+
+    print(f"Loaded {len(df):,} rows spanning {df['ts'].min()} – {df['ts'].max()}")
+    return df
+
+
+# Shared row subsets. Sections select rows through these precomputed masks /
+# row positions (ctx.rows) and take only the columns they use, instead of
+# each making its own full-width copy of df.
+@dataset("masks", needs=["streams"])
+def stream_masks(ctx: AnalysisContext) -> dict[str, np.ndarray]:
+    """Boolean masks over df rows: music, podcast and uri (has a track uri)."""
+    df = ctx.df
+    masks = {
+        "music": (df["content_type"] == "music").to_numpy(),
+        "podcast": (df["content_type"] == "podcast").to_numpy(),
+        "uri": df["spotify_track_uri"].notna().to_numpy(),
+    }
+    for mask in masks.values():
+        mask.setflags(write=False)
+    return masks
+
+
+@dataset("row_subsets", needs=["masks"])
+def stream_row_subsets(ctx: AnalysisContext) -> dict[str, np.ndarray]:
+    """Row positions of each mask, plus music_uri (music plays with a track uri)."""
+    masks = ctx.masks
+    subsets = {name: np.flatnonzero(mask) for name, mask in masks.items()}
+    subsets["music_uri"] = np.flatnonzero(masks["music"] & masks["uri"])
+    for positions in subsets.values():
+        positions.setflags(write=False)
+    return subsets
+
+
+@dataset("music_in_order", needs=["streams", "row_subsets"])
+def music_in_order(ctx: AnalysisContext) -> np.ndarray:
+    """Row positions of music plays sorted by the time they ended."""
+    music = ctx.row_subsets["music"]
+    music = music[np.argsort(ts_ns(ctx.df)[music], kind="stable")]
+    music.setflags(write=False)
+    return music
+
+
+@dataset("music_with_uri", needs=["row_subsets"])
+def music_with_uri(ctx: AnalysisContext) -> pd.DataFrame:
+    """Music plays with a track uri: uri, title, artist, hours and ts."""
+    return ctx.rows(
+        "music_uri",
+        "spotify_track_uri", "master_metadata_track_name", "master_metadata_album_artist_name", "hours", "ts",
+    )
+
+
+@dataset("entity_index", needs=["streams"])
+def entity_index(ctx: AnalysisContext) -> dict:
+    """Category codes of every row's artist and track uri, with display labels for track uris.
+
+    "artist" and "track" map to (codes per df row, names per code), with -1
+    for missing values; "track_label" is indexed by track uri and holds the
+    title and artist of any play of it.
+    """
+    df = ctx.df
+    index = {}
+    for entity, column in [("artist", "master_metadata_album_artist_name"), ("track", "spotify_track_uri")]:
+        values = df[column].astype("category")
+        codes = values.cat.codes.to_numpy().copy()
+        codes.setflags(write=False)
+        index[entity] = (codes, np.asarray(values.cat.categories, dtype=object))
+    index["track_label"] = (
+        df.loc[df["spotify_track_uri"].notna(), ["spotify_track_uri", "master_metadata_track_name", "master_metadata_album_artist_name"]]
+        .drop_duplicates("spotify_track_uri")
+        .set_index("spotify_track_uri")
+    )
+    return index
+
 
 # ---------------------------------------------------------------------------
 # 2. Compute stats
 # ---------------------------------------------------------------------------
-stats: dict = {}
-
-# ---- Overview -----------------------------------------------------------
-total_hours = float(df["hours"].sum())
-total_plays = int(len(df))
-unique_artists = int(df["master_metadata_album_artist_name"].nunique())
-unique_tracks = int(df["master_metadata_track_name"].nunique())
-unique_albums = int(df["master_metadata_album_album_name"].nunique())
-date_start = str(df["ts"].min().date())
-date_end = str(df["ts"].max().date())
-
-# Longest listening streak (consecutive days with > 0 ms played)
-daily_mask = df.groupby("date")["ms_played"].sum()
-days_with_listening = sorted(daily_mask[daily_mask > 0].index)
-longest_streak = current_streak = 1
-for i in range(1, len(days_with_listening)):
-    diff = (days_with_listening[i] - days_with_listening[i - 1]).days
-    if diff == 1:
-        current_streak += 1
-        longest_streak = max(longest_streak, current_streak)
-    else:
-        current_streak = 1
-
-stats["overview"] = {
-    "totalHours": round(total_hours, 1),
-    "totalPlays": total_plays,
-    "uniqueArtists": unique_artists,
-    "uniqueTracks": unique_tracks,
-    "uniqueAlbums": unique_albums,
-    "dateRange": {"start": date_start, "end": date_end},
-    "longestStreak": longest_streak,
-}
+# Streaks (consecutive days / weeks with > 0 ms played)
+def consecutive_runs(units, groups=None):
+    """Find runs of consecutive integers (day or week numbers) with numpy.
+
+    `units` need not be sorted or unique. When `groups` (integer codes) is
+    given, runs are detected independently per group in the same pass.
+    Returns aligned arrays: group code, first unit and length of each run.
+    """
+    units = np.asarray(units, dtype=np.int64)
+    groups = np.zeros(len(units), dtype=np.int64) if groups is None else np.asarray(groups, dtype=np.int64)
+    if len(units) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    base = units.min()
+    # Leave a gap of at least one unit between groups so runs never span two groups
+    span = int(units.max() - base) + 2
+    keys = np.unique(groups * span + (units - base))
+    is_start = np.empty(len(keys), dtype=bool)
+    is_start[0] = True
+    is_start[1:] = np.diff(keys) != 1
+    start_idx = np.flatnonzero(is_start)
+    lengths = np.diff(np.append(start_idx, len(keys)))
+    return keys[start_idx] // span, keys[start_idx] % span + base, lengths
+
+def summarize_runs(run_groups, run_starts, run_lengths, n_groups, last_unit):
+    """Per-group longest run (with its first unit) and the run ending at `last_unit`."""
+    longest = np.zeros(n_groups, dtype=np.int64)
+    longest_start = np.full(n_groups, -1, dtype=np.int64)
+    current = np.zeros(n_groups, dtype=np.int64)
+    if len(run_lengths) > 0:
+        # Longest first, earliest first among ties; keep the first run of each group
+        order = np.lexsort((run_starts, -run_lengths, run_groups))
+        first = order[np.r_[True, run_groups[order][1:] != run_groups[order][:-1]]]
+        longest[run_groups[first]] = run_lengths[first]
+        longest_start[run_groups[first]] = run_starts[first]
+        ending_now = run_starts + run_lengths - 1 == last_unit
+        current[run_groups[ending_now]] = run_lengths[ending_now]
+    return longest, longest_start, current
+
+def week_num(day_nums):
+    """Monday-aligned week number for integer day numbers (1970-01-01 was a Thursday)."""
+    return (np.asarray(day_nums, dtype=np.int64) + 3) // 7
 
-# ---- Daily listening hours -----------------------------------------------
-daily = df.groupby("date")["hours"].sum().reset_index()
-daily.columns = ["date", "hours"]
-daily = daily.sort_values("date")
-stats["dailyListening"] = [
-    {"date": str(r["date"]), "hours": round(r["hours"], 2)}
-    for _, r in daily.iterrows()
-]
+DOW_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
-# ---- Monthly listening hours ---------------------------------------------
-monthly = df.groupby("month")["hours"].sum().reset_index()
-monthly.columns = ["month", "hours"]
-monthly = monthly.sort_values("month")
-stats["monthlyListening"] = [
-    {"month": str(r["month"]), "hours": round(r["hours"], 1)}
-    for _, r in monthly.iterrows()
-]
+# One pivot into a dense month x artist matrix, emitted column-wise
+ARTISTS_OVER_TIME_TOP_N = 10
+
+CONTENT_TYPES = ["music", "podcast", "audiobook", "other"]
+
+
+# Section 2's core group-bys (totals, time distributions, top lists, skip /
+# shuffle rates, platform and country) run on a selectable backend. Each
+# backend returns the same plain-Python structures, already sorted and cut to
+# the sizes emitted, and the section formats them once. Hours are summed as
+# integer milliseconds and converted per group, so both backends get exactly
+# the same numbers regardless of summation order. Ties break in category
+# (name) order, like groupby + nlargest(keep="first").
+def ms_to_hours(ms) -> float:
+    return float(ms) / 3_600_000
+
+
+def fused_time_aggregates(df: pd.DataFrame) -> dict:
+    """The time-keyed aggregates of listening_aggregates_* in one pass over the rows.
+
+    One bincount per measure fills a dense (local day x hour) cube; daily,
+    monthly, yearly, hour-of-day, day-of-week and heatmap totals are then
+    rolled up from the cube instead of rescanning rows. Only keys with at
+    least one play are emitted, as a groupby would.
+    """
+    day = df["day_num"].to_numpy()
+    first_day = int(day.min())
+    n_days = int(day.max()) - first_day + 1
+    cell = (day - first_day) * 24 + df["hour_of_day"].to_numpy()
+
+    def cube(rows_mask=None, weights=None) -> np.ndarray:
+        keys = cell if rows_mask is None else cell[rows_mask]
+        return np.bincount(keys, weights=weights, minlength=n_days * 24).reshape(n_days, 24)
+
+    skipped, shuffle = df["skipped"], df["shuffle"]
+    plays = cube()
+    # Integer ms are summed exactly in float64, so roll-up order cannot change totals
+    ms = cube(weights=df["ms_played"].to_numpy(dtype=np.float64))
+    counts = {
+        "skipKnown": cube(skipped.notna().to_numpy()),
+        "skipped": cube(skipped.fillna(False).to_numpy(dtype=bool)),
+        "shuffleKnown": cube(shuffle.notna().to_numpy()),
+        "shuffled": cube(shuffle.fillna(False).to_numpy(dtype=bool)),
+    }
 
-# ---- Yearly listening hours ----------------------------------------------
-yearly = df.groupby("year")["hours"].sum().reset_index()
-yearly.columns = ["year", "hours"]
-yearly = yearly.sort_values("year")
-stats["yearlyListening"] = [
-    {"year": int(r["year"]), "hours": round(r["hours"], 1)}
-    for _, r in yearly.iterrows()
-]
+    days = first_day + np.arange(n_days)
+    day_plays, day_ms = plays.sum(axis=1), ms.sum(axis=1)
+    dow = (days + 3) % 7  # 1970-01-01 was a Thursday; 0 = Monday
+    heat_plays, heat_ms = np.zeros((7, 24), dtype=np.int64), np.zeros((7, 24))
+    np.add.at(heat_plays, dow, plays)
+    np.add.at(heat_ms, dow, ms)
+    hour_plays, hour_ms = plays.sum(axis=0), ms.sum(axis=0)
+    dow_plays, dow_ms = heat_plays.sum(axis=1), heat_ms.sum(axis=1)
+
+    def roll_up(unit_of_day: np.ndarray, per_day: np.ndarray) -> np.ndarray:
+        return np.bincount(unit_of_day - unit_of_day[0], weights=per_day)
+
+    month_of_day = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    year_of_day = days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+    months = month_of_day[0] + np.arange(month_of_day[-1] - month_of_day[0] + 1)
+    years = year_of_day[0] + np.arange(year_of_day[-1] - year_of_day[0] + 1)
+    month_plays, month_ms = roll_up(month_of_day, day_plays), roll_up(month_of_day, day_ms)
+    month_counts = {key: roll_up(month_of_day, cells.sum(axis=1)) for key, cells in counts.items()}
+    year_plays, year_ms = roll_up(year_of_day, day_plays), roll_up(year_of_day, day_ms)
+
+    month_label = lambda m: str(np.datetime64(int(m), "M"))
+    active_months = np.flatnonzero(month_plays > 0)
+    return {
+        "daily": [(int(days[i]), ms_to_hours(day_ms[i])) for i in np.flatnonzero(day_plays > 0)],
+        "monthly": [(month_label(months[i]), ms_to_hours(month_ms[i])) for i in active_months],
+        "yearly": [(int(years[i]), ms_to_hours(year_ms[i])) for i in np.flatnonzero(year_plays > 0)],
+        "hourOfDay": {int(h): ms_to_hours(hour_ms[h]) for h in np.flatnonzero(hour_plays > 0)},
+        "dayOfWeek": {int(d): ms_to_hours(dow_ms[d]) for d in np.flatnonzero(dow_plays > 0)},
+        "heatmap": {
+            (int(d), int(h)): ms_to_hours(heat_ms[d, h]) for d, h in zip(*np.nonzero(heat_plays > 0))
+        },
+        "monthlySkips": [
+            (month_label(months[i]), int(month_counts["skipKnown"][i]), int(month_counts["skipped"][i]))
+            for i in active_months
+        ],
+        "monthlyShuffles": [
+            (month_label(months[i]), int(month_counts["shuffleKnown"][i]), int(month_counts["shuffled"][i]))
+            for i in active_months
+        ],
+    }
 
-# ---- Hour-of-day distribution --------------------------------------------
-hod = df.groupby("hour_of_day")["hours"].sum()
-stats["hourOfDay"] = [
-    {"hour": int(h), "hours": round(float(hod.get(h, 0)), 1)} for h in range(24)
-]
 
-# ---- Day-of-week distribution --------------------------------------------
-DOW_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-dow = df.groupby("day_of_week")["hours"].sum()
-stats["dayOfWeek"] = [
-    {"day": DOW_NAMES[d], "hours": round(float(dow.get(d, 0)), 1)} for d in range(7)
-]
+def listening_aggregates_pandas(ctx: AnalysisContext) -> dict:
+    df, rows = ctx.df, ctx.rows
+    music = rows("music", "master_metadata_album_artist_name", "master_metadata_track_name",
+                 "master_metadata_album_album_name", "ms_played", "skipped")
+    by_artist = music.groupby("master_metadata_album_artist_name", observed=True).agg(
+        ms=("ms_played", "sum"), skipTotal=("skipped", "count"), skipped=("skipped", "sum")
+    )
+    artist_ms = by_artist["ms"].sort_values(ascending=False, kind="stable")
+    artist_skips = by_artist[by_artist["skipTotal"] >= 20].nlargest(20, "skipTotal")
 
-# ---- Hour x Day-of-week heatmap -----------------------------------------
-heatmap_data = []
-heatmap_group = df.groupby(["day_of_week", "hour_of_day"])["hours"].sum()
-for d in range(7):
-    for h in range(24):
-        heatmap_data.append({
-            "day": DOW_NAMES[d],
-            "dayIndex": d,
-            "hour": h,
-            "hours": round(float(heatmap_group.get((d, h), 0)), 2),
-        })
-stats["heatmap"] = heatmap_data
-
-# ---- Top artists ---------------------------------------------------------
-top_artists = (
-    df[df["content_type"] == "music"]
-    .groupby("master_metadata_album_artist_name")["hours"]
-    .sum()
-    .nlargest(20)
-    .reset_index()
-)
-top_artists.columns = ["name", "hours"]
-stats["topArtists"] = [
-    {"name": r["name"], "hours": round(r["hours"], 1)}
-    for _, r in top_artists.iterrows()
-]
+    def top_pairs(keys: list[str]) -> list[tuple]:
+        top = music.groupby(keys, observed=True)["ms_played"].sum().nlargest(20)
+        return [(*key, ms_to_hours(ms)) for key, ms in top.items()]
 
-# ---- Top tracks ----------------------------------------------------------
-top_tracks = (
-    df[df["content_type"] == "music"]
-    .groupby(["master_metadata_track_name", "master_metadata_album_artist_name"])["hours"]
-    .sum()
-    .nlargest(20)
-    .reset_index()
-)
-top_tracks.columns = ["name", "artist", "hours"]
-stats["topTracks"] = [
-    {"name": r["name"], "artist": r["artist"], "hours": round(r["hours"], 1)}
-    for _, r in top_tracks.iterrows()
-]
+    def top_hours(col: str, n: int) -> list[tuple]:
+        top = df.groupby(col, observed=True)["ms_played"].sum().nlargest(n)
+        return [(key, ms_to_hours(ms)) for key, ms in top.items()]
 
-# ---- Top albums ----------------------------------------------------------
-top_albums = (
-    df[df["content_type"] == "music"]
-    .groupby(["master_metadata_album_album_name", "master_metadata_album_artist_name"])["hours"]
-    .sum()
-    .nlargest(20)
-    .reset_index()
-)
-top_albums.columns = ["name", "artist", "hours"]
-stats["topAlbums"] = [
-    {"name": r["name"], "artist": r["artist"], "hours": round(r["hours"], 1)}
-    for _, r in top_albums.iterrows()
-]
+    return {
+        "totals": {
+            "hours": ms_to_hours(df["ms_played"].sum()),
+            "plays": int(len(df)),
+            "artists": int(df["master_metadata_album_artist_name"].nunique()),
+            "tracks": int(df["master_metadata_track_name"].nunique()),
+            "albums": int(df["master_metadata_album_album_name"].nunique()),
+            "firstDay": int(df["day_num"].min()),
+            "lastDay": int(df["day_num"].max()),
+        },
+        **fused_time_aggregates(df),
+        "artistHours": [(a, ms_to_hours(ms)) for a, ms in artist_ms.items()],
+        "topTracks": top_pairs(["master_metadata_track_name", "master_metadata_album_artist_name"]),
+        "topAlbums": top_pairs(["master_metadata_album_album_name", "master_metadata_album_artist_name"]),
+        "artistSkips": [(a, int(r["skipTotal"]), int(r["skipped"])) for a, r in artist_skips.iterrows()],
+        "platformHours": top_hours("platform", 10),
+        "countryHours": top_hours("conn_country", 10),
+    }
 
-# ---- Artists over time (top 10, monthly) ---------------------------------
-top10_artist_names = [a["name"] for a in stats["topArtists"][:10]]
-music_df = df[df["content_type"] == "music"].copy()
-music_df["month_str"] = music_df["month"].astype(str)
-aot = (
-    music_df[music_df["master_metadata_album_artist_name"].isin(top10_artist_names)]
-    .groupby(["month_str", "master_metadata_album_artist_name"])["hours"]
-    .sum()
-    .reset_index()
-)
-aot.columns = ["month", "artist", "hours"]
-months_sorted = sorted(aot["month"].unique())
-artists_over_time: dict = {"months": months_sorted, "artists": {}}
-for artist in top10_artist_names:
-    artist_data = aot[aot["artist"] == artist].set_index("month")["hours"]
-    artists_over_time["artists"][artist] = [
-        round(float(artist_data.get(m, 0)), 2) for m in months_sorted
+
+def listening_aggregates_polars(ctx: AnalysisContext) -> dict:
+    """listening_aggregates_pandas on Polars' lazy engine, planned and run as one multithreaded batch.
+
+    Columns come straight from df's numpy buffers; categoricals are passed as
+    their integer codes (-1 = missing), so keys group as ints and sort in
+    category order, and names are looked up only for the rows emitted.
+    """
+    df = ctx.df
+    categorical = {
+        "artist": "master_metadata_album_artist_name",
+        "track": "master_metadata_track_name",
+        "album": "master_metadata_album_album_name",
+        "platform": "platform",
+        "country": "conn_country",
+    }
+    names = {key: np.asarray(df[col].cat.categories, dtype=object) for key, col in categorical.items()}
+    day = df["day_num"].to_numpy()
+    ms = df["ms_played"].to_numpy()
+    frame = pl.DataFrame({
+        # int64 so per-group sums cannot overflow
+        "ms": ms.astype(np.int64) if np.issubdtype(ms.dtype, np.integer) else ms,
+        "day": day,
+        "month": day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64),
+        "year": df["year"].to_numpy(),
+        "hour": df["hour_of_day"].to_numpy(),
+        "dow": df["day_of_week"].to_numpy(),
+        "music": ctx.masks["music"],
+        "skipKnown": df["skipped"].notna().to_numpy(),
+        "skipped": df["skipped"].fillna(False).to_numpy(dtype=bool),
+        "shuffleKnown": df["shuffle"].notna().to_numpy(),
+        "shuffled": df["shuffle"].fillna(False).to_numpy(dtype=bool),
+        **{key: df[col].cat.codes.to_numpy() for key, col in categorical.items()},
+    }).lazy()
+
+    hours = pl.col("ms").sum().alias("ms")
+    known = {key: pl.col(key) >= 0 for key in categorical}
+    music = frame.filter(pl.col("music"))
+
+    def top(lf, keys: list[str], n: int):
+        return lf.filter(*[known[k] for k in keys]).group_by(keys).agg(hours).sort(
+            ["ms", *keys], descending=[True] + [False] * len(keys)
+        ).head(n)
+
+    queries = {
+        "totals": frame.select(
+            hours,
+            plays=pl.len(),
+            **{f"{key}s": pl.col(key).filter(known[key]).n_unique() for key in ["artist", "track", "album"]},
+            firstDay=pl.col("day").min(),
+            lastDay=pl.col("day").max(),
+        ),
+        "daily": frame.group_by("day").agg(hours).sort("day"),
+        "monthly": frame.group_by("month").agg(
+            hours,
+            skipTotal=pl.col("skipKnown").sum(), skipped=pl.col("skipped").sum(),
+            shuffleTotal=pl.col("shuffleKnown").sum(), shuffled=pl.col("shuffled").sum(),
+        ).sort("month"),
+        "yearly": frame.group_by("year").agg(hours).sort("year"),
+        "hourOfDay": frame.group_by("hour").agg(hours),
+        "dayOfWeek": frame.group_by("dow").agg(hours),
+        "heatmap": frame.group_by("dow", "hour").agg(hours),
+        "artists": music.filter(known["artist"]).group_by("artist").agg(
+            hours, skipTotal=pl.col("skipKnown").sum(), skipped=pl.col("skipped").sum()
+        ),
+        "topTracks": top(music, ["track", "artist"], 20),
+        "topAlbums": top(music, ["album", "artist"], 20),
+        "platformHours": top(frame, ["platform"], 10),
+        "countryHours": top(frame, ["country"], 10),
+    }
+    result = dict(zip(queries, pl.collect_all(list(queries.values()))))
+
+    totals = result["totals"].row(0, named=True)
+    month_label = lambda m: str(np.datetime64(int(m), "M"))
+    artists = result["artists"]
+    artist_ms = artists.sort(["ms", "artist"], descending=[True, False])
+    artist_skips = artists.filter(pl.col("skipTotal") >= 20).sort(["skipTotal", "artist"], descending=[True, False]).head(20)
+    monthly = result["monthly"]
+    return {
+        "totals": {
+            "hours": ms_to_hours(totals["ms"]),
+            "plays": int(totals["plays"]),
+            "artists": int(totals["artists"]),
+            "tracks": int(totals["tracks"]),
+            "albums": int(totals["albums"]),
+            "firstDay": int(totals["firstDay"]),
+            "lastDay": int(totals["lastDay"]),
+        },
+        "daily": [(int(d), ms_to_hours(ms)) for d, ms in result["daily"].iter_rows()],
+        "monthly": [(month_label(m), ms_to_hours(ms)) for m, ms in monthly.select("month", "ms").iter_rows()],
+        "yearly": [(int(y), ms_to_hours(ms)) for y, ms in result["yearly"].iter_rows()],
+        "hourOfDay": {int(k): ms_to_hours(ms) for k, ms in result["hourOfDay"].iter_rows()},
+        "dayOfWeek": {int(k): ms_to_hours(ms) for k, ms in result["dayOfWeek"].iter_rows()},
+        "heatmap": {(int(d), int(h)): ms_to_hours(ms) for d, h, ms in result["heatmap"].iter_rows()},
+        "artistHours": [(names["artist"][a], ms_to_hours(ms)) for a, ms in artist_ms.select("artist", "ms").iter_rows()],
+        "topTracks": [
+            (names["track"][t], names["artist"][a], ms_to_hours(ms)) for t, a, ms in result["topTracks"].iter_rows()
+        ],
+        "topAlbums": [
+            (names["album"][b], names["artist"][a], ms_to_hours(ms)) for b, a, ms in result["topAlbums"].iter_rows()
+        ],
+        "artistSkips": [
+            (names["artist"][a], int(t), int(k))
+            for a, t, k in artist_skips.select("artist", "skipTotal", "skipped").iter_rows()
+        ],
+        "monthlySkips": [
+            (month_label(m), int(t), int(k)) for m, t, k in monthly.select("month", "skipTotal", "skipped").iter_rows()
+        ],
+        "monthlyShuffles": [
+            (month_label(m), int(t), int(k))
+            for m, t, k in monthly.select("month", "shuffleTotal", "shuffled").iter_rows()
+        ],
+        "platformHours": [(names["platform"][c], ms_to_hours(ms)) for c, ms in result["platformHours"].iter_rows()],
+        "countryHours": [(names["country"][c], ms_to_hours(ms)) for c, ms in result["countryHours"].iter_rows()],
+    }
+
+
+LISTENING_BACKENDS = {"pandas": listening_aggregates_pandas, "polars": listening_aggregates_polars}
+
+
+def rate_pct(hits: int, total: int) -> float:
+    """hits / total as a percentage rounded like Series.round(1); NaN when total is 0."""
+    return float(np.round(np.float64(hits) / total * 100, 1)) if total else float("nan")
+
+
+@section("listening", needs=["streams", "masks", "row_subsets"])
+def compute_listening_stats(ctx: AnalysisContext) -> None:
+    """Listening totals, streaks, time distributions, top lists and behaviour from the streaming history."""
+    df = ctx.df
+    stats = ctx.stats
+    rows = ctx.rows
+    is_music = ctx.masks["music"]
+
+    agg = LISTENING_BACKENDS[ctx.backend](ctx)
+    totals = agg["totals"]
+
+    # ---- Overview -----------------------------------------------------------
+    listened = df["ms_played"].to_numpy() > 0
+    listening_days = df["day_num"].to_numpy()[listened]
+    last_day = totals["lastDay"]
+
+    longest_daily, _, current_daily = summarize_runs(*consecutive_runs(listening_days), 1, last_day)
+    longest_weekly, _, current_weekly = summarize_runs(
+        *consecutive_runs(week_num(listening_days)), 1, int(week_num(last_day))
+    )
+    longest_streak = int(longest_daily[0])
+
+    stats["overview"] = {
+        "totalHours": round(totals["hours"], 1),
+        "totalPlays": totals["plays"],
+        "uniqueArtists": totals["artists"],
+        "uniqueTracks": totals["tracks"],
+        "uniqueAlbums": totals["albums"],
+        "dateRange": {
+            "start": str(np.datetime64(totals["firstDay"], "D")),
+            "end": str(np.datetime64(last_day, "D")),
+        },
+        "longestStreak": longest_streak,
+        "currentStreak": int(current_daily[0]),
+        "longestWeeklyStreak": int(longest_weekly[0]),
+        "currentWeeklyStreak": int(current_weekly[0]),
+    }
+
+    # ---- Per-artist streaks (consecutive days / weeks with a play) -----------
+    artist_rows = listened & is_music
+    artist_codes, artist_names = pd.factorize(df["master_metadata_album_artist_name"].to_numpy()[artist_rows])
+    artist_days = df["day_num"].to_numpy()[artist_rows][artist_codes >= 0]
+    artist_codes = artist_codes[artist_codes >= 0]
+
+    artist_longest, artist_longest_start, artist_current = summarize_runs(
+        *consecutive_runs(artist_days, artist_codes), len(artist_names), last_day
+    )
+    artist_longest_weeks, _, _ = summarize_runs(
+        *consecutive_runs(week_num(artist_days), artist_codes), len(artist_names), int(week_num(last_day))
+    )
+    top_streak_idx = np.lexsort((artist_names.astype(str), -artist_longest))[:20]
+    stats["artistStreaks"] = [
+        {
+            "name": artist_names[i],
+            "longestDays": int(artist_longest[i]),
+            "longestDaysStart": str(np.datetime64(int(artist_longest_start[i]), "D")),
+            "currentDays": int(artist_current[i]),
+            "longestWeeks": int(artist_longest_weeks[i]),
+        }
+        for i in top_streak_idx
     ]
-stats["artistsOverTime"] = artists_over_time
-
-# ---- Skip analysis -------------------------------------------------------
-# Skip rate by top artists
-music_plays = df[df["content_type"] == "music"].copy()
-artist_skip = (
-    music_plays.groupby("master_metadata_album_artist_name")
-    .agg(total=("skipped", "count"), skipped=("skipped", "sum"))
-    .reset_index()
-)
-artist_skip["skipRate"] = (artist_skip["skipped"] / artist_skip["total"] * 100).round(1)
-# Only artists with significant plays, sorted by total plays
-artist_skip = artist_skip[artist_skip["total"] >= 20].nlargest(20, "total")
-stats["skipByArtist"] = [
-    {"name": r["master_metadata_album_artist_name"], "skipRate": float(r["skipRate"]), "plays": int(r["total"])}
-    for _, r in artist_skip.iterrows()
-]
 
-# Skip rate over time (monthly)
-monthly_skip = (
-    df.groupby("month")
-    .agg(total=("skipped", "count"), skipped=("skipped", "sum"))
-    .reset_index()
-)
-monthly_skip["skipRate"] = (monthly_skip["skipped"] / monthly_skip["total"] * 100).round(1)
-monthly_skip = monthly_skip.sort_values("month")
-stats["skipRateOverTime"] = [
-    {"month": str(r["month"]), "skipRate": float(r["skipRate"])}
-    for _, r in monthly_skip.iterrows()
-]
+    # ---- Daily listening hours -----------------------------------------------
+    stats["dailyListening"] = [
+        {"date": str(np.datetime64(d, "D")), "hours": round(h, 2)} for d, h in agg["daily"]
+    ]
 
-# ---- Reason breakdown ----------------------------------------------------
-reason_start_counts = df["reason_start"].value_counts().to_dict()
-reason_end_counts = df["reason_end"].value_counts().to_dict()
-stats["reasonBreakdown"] = {
-    "start": [{"reason": k, "count": int(v)} for k, v in reason_start_counts.items()],
-    "end": [{"reason": k, "count": int(v)} for k, v in reason_end_counts.items()],
-}
+    # ---- Monthly listening hours ---------------------------------------------
+    stats["monthlyListening"] = [{"month": m, "hours": round(h, 1)} for m, h in agg["monthly"]]
 
-# ---- Shuffle over time (monthly %) ---------------------------------------
-monthly_shuffle = (
-    df.groupby("month")
-    .agg(total=("shuffle", "count"), shuffled=("shuffle", "sum"))
-    .reset_index()
-)
-monthly_shuffle["shuffleRate"] = (monthly_shuffle["shuffled"] / monthly_shuffle["total"] * 100).round(1)
-monthly_shuffle = monthly_shuffle.sort_values("month")
-stats["shuffleOverTime"] = [
-    {"month": str(r["month"]), "shuffleRate": float(r["shuffleRate"])}
-    for _, r in monthly_shuffle.iterrows()
-]
+    # ---- Yearly listening hours ----------------------------------------------
+    stats["yearlyListening"] = [{"year": y, "hours": round(h, 1)} for y, h in agg["yearly"]]
 
-# ---- Average listen duration per play ------------------------------------
-stats["avgListenMinutes"] = round(float(df["ms_played"].mean() / 60_000), 2)
+    # ---- Hour-of-day distribution --------------------------------------------
+    stats["hourOfDay"] = [
+        {"hour": h, "hours": round(agg["hourOfDay"].get(h, 0.0), 1)} for h in range(24)
+    ]
 
-# ---- Platform breakdown --------------------------------------------------
-platform_hours = df.groupby("platform")["hours"].sum().nlargest(10).reset_index()
-platform_hours.columns = ["platform", "hours"]
-stats["platformBreakdown"] = [
-    {"platform": r["platform"], "hours": round(r["hours"], 1)}
-    for _, r in platform_hours.iterrows()
-]
+    # ---- Day-of-week distribution --------------------------------------------
+    stats["dayOfWeek"] = [
+        {"day": DOW_NAMES[d], "hours": round(agg["dayOfWeek"].get(d, 0.0), 1)} for d in range(7)
+    ]
 
-# ---- Offline vs Online ---------------------------------------------------
-offline_hours = float(df[df["offline"] == True]["hours"].sum())
-online_hours = float(df[df["offline"] == False]["hours"].sum())
-stats["offlineVsOnline"] = {
-    "offline": round(offline_hours, 1),
-    "online": round(online_hours, 1),
-}
+    # ---- Hour x Day-of-week heatmap -----------------------------------------
+    stats["heatmap"] = [
+        {"day": DOW_NAMES[d], "dayIndex": d, "hour": h, "hours": round(agg["heatmap"].get((d, h), 0.0), 2)}
+        for d in range(7)
+        for h in range(24)
+    ]
 
-# ---- Country breakdown ---------------------------------------------------
-country_hours = df.groupby("conn_country")["hours"].sum().nlargest(10).reset_index()
-country_hours.columns = ["country", "hours"]
-stats["countryBreakdown"] = [
-    {"country": r["country"], "hours": round(r["hours"], 1)}
-    for _, r in country_hours.iterrows()
-]
+    # ---- Top artists ---------------------------------------------------------
+    stats["topArtists"] = [{"name": a, "hours": round(h, 1)} for a, h in agg["artistHours"][:20]]
 
-# ---- Content type split (monthly) ----------------------------------------
-ct_monthly = (
-    df.groupby(["month", "content_type"])["hours"].sum().reset_index()
-)
-ct_monthly["month"] = ct_monthly["month"].astype(str)
-ct_months = sorted(ct_monthly["month"].unique())
-content_type_split = []
-for m in ct_months:
-    row = {"month": m}
-    for ct in ["music", "podcast", "audiobook", "other"]:
-        val = ct_monthly[(ct_monthly["month"] == m) & (ct_monthly["content_type"] == ct)]["hours"]
-        row[ct] = round(float(val.iloc[0]), 2) if len(val) > 0 else 0
-    content_type_split.append(row)
-stats["contentTypeSplit"] = content_type_split
-
-# ---- Top podcasts --------------------------------------------------------
-podcasts = df[df["content_type"] == "podcast"]
-if len(podcasts) > 0:
-    top_pods = podcasts.groupby("episode_show_name")["hours"].sum().nlargest(10).reset_index()
-    top_pods.columns = ["name", "hours"]
-    stats["topPodcasts"] = [
-        {"name": r["name"], "hours": round(r["hours"], 1)}
-        for _, r in top_pods.iterrows()
+    # ---- Top tracks ----------------------------------------------------------
+    stats["topTracks"] = [
+        {"name": name, "artist": artist, "hours": round(h, 1)} for name, artist, h in agg["topTracks"]
+    ]
+
+    # ---- Top albums ----------------------------------------------------------
+    stats["topAlbums"] = [
+        {"name": name, "artist": artist, "hours": round(h, 1)} for name, artist, h in agg["topAlbums"]
+    ]
+
+    # ---- Artists over time (top N, monthly) ---------------------------------
+    top_n_artist_names = [a for a, _ in agg["artistHours"][:ARTISTS_OVER_TIME_TOP_N]]
+    aot_rows = is_music & df["master_metadata_album_artist_name"].isin(top_n_artist_names).to_numpy()
+    aot = (
+        rows(aot_rows, "month", "master_metadata_album_artist_name", "hours")
+        .groupby(["month", "master_metadata_album_artist_name"], observed=True)["hours"]
+        .sum()
+        .unstack(fill_value=0)
+        .sort_index()
+        .reindex(columns=top_n_artist_names, fill_value=0)
+    )
+    stats["artistsOverTime"] = {
+        "months": [str(m) for m in aot.index],
+        "artists": {
+            artist: [round(float(v), 2) for v in aot[artist].to_numpy()]
+            for artist in top_n_artist_names
+        },
+    }
+
+    # ---- Skip analysis -------------------------------------------------------
+    # Skip rate by top artists: only artists with significant plays, sorted by total plays
+    stats["skipByArtist"] = [
+        {"name": a, "skipRate": rate_pct(skipped, total), "plays": total}
+        for a, total, skipped in agg["artistSkips"]
     ]
-else:
-    stats["topPodcasts"] = []
-
-# ---- New artist discovery per month --------------------------------------
-music_sorted = music_df.sort_values("ts")
-first_listen = music_sorted.drop_duplicates("master_metadata_album_artist_name", keep="first")
-first_listen["month_str"] = first_listen["month"].astype(str)
-discovery = first_listen.groupby("month_str").size().reset_index(name="newArtists")
-discovery = discovery.sort_values("month_str")
-stats["newArtistDiscovery"] = [
-    {"month": r["month_str"], "newArtists": int(r["newArtists"])}
-    for _, r in discovery.iterrows()
+
+    # Skip rate over time (monthly)
+    stats["skipRateOverTime"] = [
+        {"month": m, "skipRate": rate_pct(skipped, total)} for m, total, skipped in agg["monthlySkips"]
+    ]
+
+    # ---- Reason breakdown ----------------------------------------------------
+    reason_start_counts = df["reason_start"].value_counts().to_dict()
+    reason_end_counts = df["reason_end"].value_counts().to_dict()
+    stats["reasonBreakdown"] = {
+        "start": [{"reason": k, "count": int(v)} for k, v in reason_start_counts.items()],
+        "end": [{"reason": k, "count": int(v)} for k, v in reason_end_counts.items()],
+    }
+
+    # ---- Shuffle over time (monthly %) ---------------------------------------
+    stats["shuffleOverTime"] = [
+        {"month": m, "shuffleRate": rate_pct(shuffled, total)} for m, total, shuffled in agg["monthlyShuffles"]
+    ]
+
+    # ---- Average listen duration per play ------------------------------------
+    stats["avgListenMinutes"] = round(float(df["ms_played"].mean() / 60_000), 2)
+
+    # ---- Platform breakdown --------------------------------------------------
+    stats["platformBreakdown"] = [{"platform": k, "hours": round(h, 1)} for k, h in agg["platformHours"]]
+
+    # ---- Offline vs Online ---------------------------------------------------
+    offline_hours = float(df[df["offline"] == True]["hours"].sum())
+    online_hours = float(df[df["offline"] == False]["hours"].sum())
+    stats["offlineVsOnline"] = {
+        "offline": round(offline_hours, 1),
+        "online": round(online_hours, 1),
+    }
+
+    # ---- Country breakdown ---------------------------------------------------
+    stats["countryBreakdown"] = [{"country": k, "hours": round(h, 1)} for k, h in agg["countryHours"]]
+
+    # ---- Content type split (monthly) ----------------------------------------
+    ct_monthly = (
+        df.groupby(["month", "content_type"])["hours"]
+        .sum()
+        .unstack()
+        .sort_index()
+        .reindex(columns=CONTENT_TYPES)
+    )
+    ct_columns = {
+        ct: [round(float(v), 2) if pd.notna(v) else 0 for v in ct_monthly[ct].to_numpy()]
+        for ct in CONTENT_TYPES
+    }
+    stats["contentTypeSplit"] = [
+        {"month": str(m), **{ct: ct_columns[ct][i] for ct in CONTENT_TYPES}}
+        for i, m in enumerate(ct_monthly.index)
+    ]
+
+    # ---- Top podcasts --------------------------------------------------------
+    podcasts = rows("podcast", "episode_show_name", "hours")
+    if len(podcasts) > 0:
+        top_pods = podcasts.groupby("episode_show_name", observed=True)["hours"].sum().nlargest(10).reset_index()
+        top_pods.columns = ["name", "hours"]
+        stats["topPodcasts"] = [
+            {"name": r["name"], "hours": round(r["hours"], 1)}
+            for _, r in top_pods.iterrows()
+        ]
+    else:
+        stats["topPodcasts"] = []
+
+    # ---- New artist discovery per month --------------------------------------
+    # Month of each artist's first play (the earliest ts falls in the earliest month)
+    first_listen_month = (
+        rows("music", "master_metadata_album_artist_name", "month")
+        .groupby("master_metadata_album_artist_name", observed=True, dropna=False)["month"]
+        .min()
+    )
+    discovery = first_listen_month.astype(str).value_counts().sort_index()
+    stats["newArtistDiscovery"] = [
+        {"month": m, "newArtists": int(c)} for m, c in discovery.items()
+    ]
+
+
+
+# ---------------------------------------------------------------------------
+# 2b. Listening sessions
+# ---------------------------------------------------------------------------
+# A session is a run of plays with no idle gap longer than this between the
+# end of one play and the start of the next (ts is when a play ended, so it
+# started ms_played earlier). Set with --session-idle-minutes.
+SESSION_IDLE_MINUTES = 30
+SESSION_LENGTH_BUCKETS = [
+    (0, 15, "<15m"), (15, 30, "15-30m"), (30, 60, "30-60m"),
+    (60, 120, "1-2h"), (120, 240, "2-4h"), (240, np.inf, "4h+"),
 ]
 
+
+def utc_ns(ts: pd.Series) -> np.ndarray:
+    """Tz-aware timestamps as int64 nanoseconds since the epoch (UTC)."""
+    return ts.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy().astype("datetime64[ns]").astype(np.int64)
+
+
+def ts_ns(df: pd.DataFrame) -> np.ndarray:
+    """Play end times as int64 nanoseconds since the epoch (UTC)."""
+    return utc_ns(df["ts"])
+
+
+def sessionize(start_ns: np.ndarray, end_ns: np.ndarray, idle_ns: int) -> tuple[np.ndarray, np.ndarray]:
+    """Order plays by end time and number their sessions with one vectorized gap test.
+
+    Returns the row order and, aligned with it, each row's session id. A
+    play opens a new session when it starts more than `idle_ns` after every
+    earlier play has ended (plays on two devices may overlap).
+    """
+    order = np.argsort(end_ns, kind="stable")
+    start, end = start_ns[order], end_ns[order]
+    new_session = np.ones(len(order), dtype=bool)
+    if len(order) > 1:
+        new_session[1:] = start[1:] - np.maximum.accumulate(end)[:-1] > idle_ns
+    return order, np.cumsum(new_session) - 1
+
+
+def session_table(df: pd.DataFrame, idle_minutes: float) -> tuple[pd.DataFrame, np.ndarray]:
+    """One row per session (start, end, ms_played, tracks, skips, platform) and each df row's session id.
+
+    `platform` is where most of the session's time was played. `local_start`
+    is the (naive) wall-clock start in the time zone of the session's first play.
+    """
+    end_ns = ts_ns(df)
+    ms = df["ms_played"].to_numpy().astype(np.int64)
+    order, session_ids = sessionize(end_ns - ms * 1_000_000, end_ns, int(idle_minutes * 60 * 1e9))
+
+    row_session = np.empty(len(order), dtype=np.int64)
+    row_session[order] = session_ids
+    if len(order) == 0:
+        empty = pd.DataFrame({
+            "start": pd.Series(dtype=f"datetime64[ns, {LOCAL_TZ}]"),
+            "end": pd.Series(dtype=f"datetime64[ns, {LOCAL_TZ}]"),
+            "local_start": pd.Series(dtype="datetime64[ns]"),
+            "ms_played": pd.Series(dtype=np.int64), "tracks": pd.Series(dtype=np.int64),
+            "skips": pd.Series(dtype=np.int64), "platform": pd.Series(dtype=object),
+        })
+        return empty, row_session
+
+    # Sessions are contiguous in `order`, so every per-session sum is one reduceat
+    bounds = np.flatnonzero(np.diff(session_ids, prepend=-1))
+    ms_sorted, end_sorted = ms[order], end_ns[order]
+    skips = df["skipped"].fillna(False).to_numpy(dtype=bool)[order]
+
+    # Dominant platform: ms played per (session, platform) pair, then the largest pair per session
+    platform_codes, platform_names = pd.factorize(df["platform"].to_numpy()[order])
+    width = len(platform_names) + 1
+    pairs, pair_of_row = np.unique(session_ids * width + platform_codes + 1, return_inverse=True)
+    pair_ms = np.bincount(pair_of_row.ravel(), weights=ms_sorted)
+    pair_session = pairs // width
+    best = np.lexsort((-pair_ms, pair_session))
+    first_of_session = best[np.flatnonzero(np.diff(pair_session[best], prepend=-1))]
+    platform_code = pairs[first_of_session] % width - 1
+    platform = np.append(np.asarray(platform_names, dtype=object), None)[platform_code]
+
+    def local(ns: np.ndarray) -> pd.Series:
+        return pd.Series(pd.to_datetime(ns, utc=True)).dt.tz_convert(LOCAL_TZ)
+
+    start_ns = np.minimum.reduceat(end_sorted - ms_sorted * 1_000_000, bounds)
+    offset_ns = df["utc_offset_s"].to_numpy().astype(np.int64)[order][bounds] * 1_000_000_000
+    table = pd.DataFrame({
+        "start": local(start_ns),
+        "end": local(np.maximum.reduceat(end_sorted, bounds)),
+        "local_start": (start_ns + offset_ns).astype("datetime64[ns]"),
+        "ms_played": np.add.reduceat(ms_sorted, bounds),
+        "tracks": np.diff(np.append(bounds, len(order))),
+        "skips": np.add.reduceat(skips.astype(np.int64), bounds),
+        "platform": platform,
+    })
+    return table, row_session
+
+
+@dataset("sessions", needs=["streams"])
+def listening_sessions(ctx: AnalysisContext) -> tuple[pd.DataFrame, np.ndarray]:
+    """session_table of the history at SESSION_IDLE_MINUTES: the sessions and each df row's session id."""
+    sessions, row_session = session_table(ctx.df, SESSION_IDLE_MINUTES)
+    row_session.setflags(write=False)
+    return sessions, row_session
+
+
+@section("listeningSessions", needs=["sessions"])
+def compute_listening_sessions(ctx: AnalysisContext) -> None:
+    """Session lengths, tracks per session, start hours and platforms."""
+    stats = ctx.stats
+    print(f"Computing listening sessions ({SESSION_IDLE_MINUTES:g} min idle gap) …")
+
+    sessions, _ = ctx.dataset("sessions")
+
+    minutes = ((sessions["end"] - sessions["start"]).dt.total_seconds() / 60).to_numpy()
+    tracks = sessions["tracks"].to_numpy()
+
+    longest = None
+    if len(sessions) > 0:
+        i = int(np.argmax(minutes))
+        longest = {
+            "start": str(sessions["start"].iloc[i].floor("s")),
+            "end": str(sessions["end"].iloc[i]),
+            "minutes": round(float(minutes[i]), 1),
+            "tracks": int(tracks[i]),
+            "platform": sessions["platform"].iloc[i],
+        }
+
+    start_hours = np.bincount(sessions["local_start"].dt.hour.to_numpy(), minlength=24)
+    by_platform = (
+        pd.DataFrame({"platform": sessions["platform"], "minutes": minutes})
+        .groupby("platform")["minutes"]
+        .agg(["size", "mean"])
+        .sort_values("size", ascending=False, kind="stable")
+        .head(10)
+    )
+    by_month = (
+        pd.DataFrame({"month": sessions["local_start"].dt.strftime("%Y-%m"), "minutes": minutes, "tracks": tracks})
+        .groupby("month")
+        .agg(sessions=("minutes", "size"), avgMinutes=("minutes", "mean"), avgTracks=("tracks", "mean"))
+    )
+
+    stats["listeningSessions"] = {
+        "idleMinutes": SESSION_IDLE_MINUTES,
+        "totalSessions": len(sessions),
+        "avgMinutes": round(float(minutes.mean()), 1) if len(sessions) > 0 else 0,
+        "medianMinutes": round(float(np.median(minutes)), 1) if len(sessions) > 0 else 0,
+        "avgTracks": round(float(tracks.mean()), 1) if len(sessions) > 0 else 0,
+        "avgSkips": round(float(sessions["skips"].mean()), 1) if len(sessions) > 0 else 0,
+        "longest": longest,
+        "lengthDistribution": [
+            {"bucket": label, "sessions": int(((minutes >= lo) & (minutes < hi)).sum())}
+            for lo, hi, label in SESSION_LENGTH_BUCKETS
+        ],
+        "startHour": [{"hour": h, "sessions": int(start_hours[h])} for h in range(24)],
+        "byPlatform": [
+            {"platform": name, "sessions": int(row["size"]), "avgMinutes": round(float(row["mean"]), 1)}
+            for name, row in by_platform.iterrows()
+        ],
+        "monthly": [
+            {"month": m, "sessions": int(r["sessions"]), "avgMinutes": round(float(r["avgMinutes"]), 1),
+             "avgTracks": round(float(r["avgTracks"]), 1)}
+            for m, r in by_month.iterrows()
+        ],
+    }
+    print(f"  {len(sessions):,} sessions, avg {stats['listeningSessions']['avgMinutes']} min, "
+          f"{stats['listeningSessions']['avgTracks']} tracks")
+
+
+# ---------------------------------------------------------------------------
+# 2c. Artist / track transitions ("what follows what")
+# ---------------------------------------------------------------------------
+TRANSITION_TOP_SOURCES = 20
+TRANSITION_TOP_SUCCESSORS = 5
+TRANSITION_TOP_PAIRS = 10
+
+
+def count_transitions(codes: np.ndarray, groups: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse (COO) matrix of how often code a is directly followed by code b.
+
+    `codes` are interned codes of consecutive plays (-1 for missing), and
+    only neighbours in the same `group` (session) count. Returns row, column
+    and count arrays sorted by row, then column.
+    """
+    follows = (groups[1:] == groups[:-1]) & (codes[1:] >= 0) & (codes[:-1] >= 0)
+    keys = codes[:-1][follows].astype(np.int64) * n + codes[1:][follows]
+    pairs, counts = np.unique(keys, return_counts=True)
+    return pairs // n, pairs % n, counts
+
+
+def top_k_per_row(rows: np.ndarray, cols: np.ndarray, counts: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the `k` largest entries of each row (ties by column), grouped by row."""
+    order = np.lexsort((cols, -counts, rows))
+    first = np.flatnonzero(np.diff(rows[order], prepend=-1))
+    rank = np.arange(len(order)) - np.repeat(first, np.diff(np.append(first, len(order))))
+    return order[rank < k]
+
+
+def transition_drift(months: np.ndarray, rows: np.ndarray, cols: np.ndarray, counts: np.ndarray, n: int) -> list[dict]:
+    """Month-over-month change in where each artist leads.
+
+    Takes a per-month COO matrix as aligned arrays sorted by month. For every artist with transitions in a month and the month before, the
+    total variation distance between its two successor distributions (0 =
+    same successors in the same proportions, 1 = no overlap), averaged with
+    the artist's transition count in the later month as weight.
+    """
+    _, degree_of_entry = np.unique(months.astype(np.int64) * n + rows, return_inverse=True)
+    degrees = np.bincount(degree_of_entry.ravel(), weights=counts)
+    share = counts / degrees[degree_of_entry.ravel()]
+
+    month_values = np.unique(months)
+    bounds = np.searchsorted(months, month_values)
+    ends = np.append(bounds[1:], len(months))
+    drift = []
+    for i in range(1, len(month_values)):
+        prev = slice(bounds[i - 1], ends[i - 1])
+        cur = slice(bounds[i], ends[i])
+        shared_sources = np.intersect1d(rows[prev], rows[cur])
+        entry = {"month": str(np.datetime64(int(month_values[i]), "M")), "transitions": int(counts[cur].sum()),
+                 "sharedArtists": len(shared_sources), "drift": None}
+        if len(shared_sources) > 0:
+            in_prev = np.isin(rows[prev], shared_sources)
+            in_cur = np.isin(rows[cur], shared_sources)
+            # Signed shares of both months on the union of (source, successor) cells
+            keys = np.concatenate([rows[prev][in_prev] * n + cols[prev][in_prev], rows[cur][in_cur] * n + cols[cur][in_cur]])
+            signed = np.concatenate([-share[prev][in_prev], share[cur][in_cur]])
+            cells, cell_of_entry = np.unique(keys, return_inverse=True)
+            gap = np.abs(np.bincount(cell_of_entry.ravel(), weights=signed))
+            source_of_cell = np.searchsorted(shared_sources, cells // n)
+            distance = 0.5 * np.bincount(source_of_cell, weights=gap, minlength=len(shared_sources))
+            weight = np.bincount(
+                np.searchsorted(shared_sources, rows[cur][in_cur]), weights=counts[cur][in_cur],
+                minlength=len(shared_sources),
+            )
+            entry["drift"] = round(float((distance * weight).sum() / weight.sum()), 3)
+        drift.append(entry)
+    return drift
+
+
+@dataset("artist_transitions", needs=["music_in_order", "sessions", "entity_index"])
+def artist_transitions(ctx: AnalysisContext) -> dict:
+    """Artist transition matrix in COO form: rows, cols, counts over entity_index artist codes, plus names.
+
+    Music plays follow each other in time order; a podcast in between does
+    not break a chain, a session gap does.
+    """
+    music = ctx.dataset("music_in_order")
+    sessions = ctx.dataset("sessions")[1][music]
+    codes, names = ctx.dataset("entity_index")["artist"]
+    rows, cols, counts = count_transitions(codes[music], sessions, max(len(names), 1))
+    return {"rows": rows, "cols": cols, "counts": counts, "names": names}
+
+
+@section("artistTransitions", needs=["streams", "artist_transitions", "music_in_order", "sessions", "entity_index"])
+def compute_artist_transitions(ctx: AnalysisContext) -> None:
+    """Which artists and tracks follow each other within listening sessions."""
+    df = ctx.df
+    stats = ctx.stats
+    print("Computing artist transitions …")
+
+    transitions = ctx.dataset("artist_transitions")
+    rows, cols, counts, artist_names = (transitions[k] for k in ("rows", "cols", "counts", "names"))
+    n_artists = max(len(artist_names), 1)
+
+    music = ctx.dataset("music_in_order")
+    sessions = ctx.dataset("sessions")[1][music]
+    index = ctx.dataset("entity_index")
+    artist_codes = index["artist"][0][music]
+    track_codes, track_uris = index["track"]
+    track_rows, track_cols, track_counts = count_transitions(track_codes[music], sessions, max(len(track_uris), 1))
+
+    total = int(counts.sum())
+    repeats = rows == cols
+
+    # Top successors (other artists) of the artists with the most outgoing transitions
+    moves = ~repeats
+    out_degree = np.bincount(rows[moves], weights=counts[moves], minlength=n_artists)
+    sources = np.lexsort((artist_names.astype(str), -out_degree))[:TRANSITION_TOP_SOURCES]
+    sources = sources[out_degree[sources] > 0]
+    picked = np.flatnonzero(moves & np.isin(rows, sources))
+    top = picked[top_k_per_row(rows[picked], cols[picked], counts[picked], TRANSITION_TOP_SUCCESSORS)]
+    successors = defaultdict(list)
+    for i in top:
+        successors[int(rows[i])].append({
+            "name": artist_names[cols[i]],
+            "count": int(counts[i]),
+            "share": round(float(counts[i] / out_degree[rows[i]] * 100), 1),
+        })
+
+    # Track names for the top track pairs, from any play of each uri
+    track_label = index["track_label"]
+
+    def track_name(code: int) -> dict:
+        uri = track_uris[code]
+        if uri in track_label.index:
+            row = track_label.loc[uri]
+            return {"name": row["master_metadata_track_name"], "artist": row["master_metadata_album_artist_name"]}
+        return {"name": uri, "artist": None}
+
+    def top_pairs(r: np.ndarray, c: np.ndarray, k: np.ndarray) -> np.ndarray:
+        candidates = np.flatnonzero(r != c)
+        return candidates[np.lexsort((c[candidates], r[candidates], -k[candidates]))[:TRANSITION_TOP_PAIRS]]
+
+    # Per-month transition matrices (month of the second play) for the drift measure
+    month_of_play = df["day_num"].to_numpy()[music].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    follows = (sessions[1:] == sessions[:-1]) & (artist_codes[1:] >= 0) & (artist_codes[:-1] >= 0)
+    n_pairs = n_artists * n_artists
+    cells, cell_counts = np.unique(
+        month_of_play[1:][follows] * n_pairs
+        + artist_codes[:-1][follows].astype(np.int64) * n_artists
+        + artist_codes[1:][follows],
+        return_counts=True,
+    )
+    cell_months, cell_pairs = cells // n_pairs, cells % n_pairs
+
+    stats["artistTransitions"] = {
+        "totalTransitions": total,
+        "distinctArtistPairs": int(len(rows)),
+        "distinctTrackPairs": int(len(track_rows)),
+        "sameArtistPct": round(float(counts[repeats].sum() / total * 100), 1) if total else 0,
+        "topPairs": [
+            {"from": artist_names[rows[i]], "to": artist_names[cols[i]], "count": int(counts[i])}
+            for i in top_pairs(rows, cols, counts)
+        ],
+        "topTrackPairs": [
+            {"from": track_name(track_rows[i]), "to": track_name(track_cols[i]), "count": int(track_counts[i])}
+            for i in top_pairs(track_rows, track_cols, track_counts)
+        ],
+        "topSuccessors": [
+            {"name": artist_names[a], "transitions": int(out_degree[a]), "successors": successors[int(a)]}
+            for a in sources
+        ],
+        "monthlyDrift": transition_drift(
+            cell_months, cell_pairs // n_artists, cell_pairs % n_artists, cell_counts, n_artists
+        ),
+    }
+    print(f"  {total:,} transitions, {len(rows):,} artist pairs, {len(track_rows):,} track pairs")
+
+
+# ---------------------------------------------------------------------------
+# 2d. Obsessions (back-to-back plays and day streaks)
+# ---------------------------------------------------------------------------
+OBSESSIONS_TOP_N = 10
+
+
+def run_lengths(codes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Run-length encode `codes`: value, first position and length of every run (missing codes, -1, dropped)."""
+    if len(codes) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+    starts = np.flatnonzero(np.diff(codes, prepend=codes[0] - 1))
+    lengths = np.diff(np.append(starts, len(codes)))
+    values = codes[starts]
+    keep = values >= 0
+    return values[keep], starts[keep], lengths[keep]
+
+
+def longest_run_per_code(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray, n: int):
+    """Per code: length and first position of its longest run (earliest among ties), -1 if it never ran."""
+    longest = np.zeros(n, dtype=np.int64)
+    longest_start = np.full(n, -1, dtype=np.int64)
+    order = np.lexsort((starts, -lengths, values))
+    first = order[np.flatnonzero(np.diff(values[order], prepend=-1))]
+    longest[values[first]] = lengths[first]
+    longest_start[values[first]] = starts[first]
+    return longest, longest_start
+
+
+@dataset("obsession_tables", needs=["streams", "music_in_order", "entity_index"])
+def obsession_tables(ctx: AnalysisContext) -> dict[str, pd.DataFrame]:
+    """Longest back-to-back run and consecutive-day streak of every track and artist.
+
+    One table per entity ("track" / "artist"), indexed by entity_index code.
+    """
+    df = ctx.df
+    # Music plays in time order; runs skip over podcasts and other content
+    music = ctx.dataset("music_in_order")
+    days = df["day_num"].to_numpy()[music]
+    ms = df["ms_played"].to_numpy()[music].astype(np.int64)
+    ms_before = np.concatenate([[0], np.cumsum(ms)])
+    last_day = int(df["day_num"].max())
+
+    tables = {}
+    index = ctx.dataset("entity_index")
+    for entity in ["track", "artist"]:
+        all_codes, names = index[entity]
+        codes = all_codes[music].astype(np.int64)
+        n = len(names)
+
+        run_values, run_starts, run_len = run_lengths(codes)
+        longest, longest_at = longest_run_per_code(run_values, run_starts, run_len, n)
+        has_run = longest_at >= 0
+        run_ms = np.zeros(n, dtype=np.int64)
+        run_ms[has_run] = ms_before[longest_at[has_run] + longest[has_run]] - ms_before[longest_at[has_run]]
+
+        # Day streaks reuse the streak engine: unique (code, day) pairs act as a per-entity
+        # day bitmap. Like artistStreaks, only plays with time listened count
+        listened = (codes >= 0) & (ms > 0)
+        streak, streak_start, current = summarize_runs(
+            *consecutive_runs(days[listened], codes[listened]), n, last_day
+        )
+        tables[entity] = pd.DataFrame({
+            "name": names,
+            "longestRun": longest,
+            "runStartDay": np.where(has_run, days[np.maximum(longest_at, 0)], -1),
+            "runEndDay": np.where(has_run, days[np.maximum(longest_at + longest - 1, 0)], -1),
+            "runMs": run_ms,
+            "longestDays": streak,
+            "daysStartDay": streak_start,
+            "currentDays": current,
+        })
+    return tables
+
+
+@section("obsessions", needs=["obsession_tables", "entity_index"])
+def compute_obsessions(ctx: AnalysisContext) -> None:
+    """Longest back-to-back play runs and consecutive-day streaks of tracks and artists.
+
+    Only track day streaks are reported here; artistStreaks already covers artists.
+    """
+    stats = ctx.stats
+    print("Computing obsessions …")
+
+    tables = ctx.dataset("obsession_tables")
+    # Display names for track uris, from any play of each uri
+    track_label = ctx.dataset("entity_index")["track_label"]
+
+    def day(day_num: int) -> str:
+        return str(np.datetime64(int(day_num), "D"))
+
+    def label(entity: str, name: str) -> dict:
+        if entity == "artist":
+            return {"name": name}
+        row = track_label.loc[name]
+        return {"name": row["master_metadata_track_name"], "artist": row["master_metadata_album_artist_name"]}
+
+    def top(entity: str, key: str) -> pd.DataFrame:
+        table = tables[entity]
+        table = table[table[key] > 1]
+        return table.iloc[np.lexsort((table["name"].astype(str).to_numpy(), -table[key].to_numpy()))[:OBSESSIONS_TOP_N]]
+
+    def runs(entity: str) -> list[dict]:
+        return [
+            {**label(entity, r["name"]), "plays": int(r["longestRun"]), "hours": round(ms_to_hours(r["runMs"]), 1),
+             "start": day(r["runStartDay"]), "end": day(r["runEndDay"])}
+            for _, r in top(entity, "longestRun").iterrows()
+        ]
+
+    stats["obsessions"] = {
+        "trackRuns": runs("track"),
+        "artistRuns": runs("artist"),
+        "trackDayStreaks": [
+            {**label("track", r["name"]), "days": int(r["longestDays"]), "start": day(r["daysStartDay"]),
+             "currentDays": int(r["currentDays"])}
+            for _, r in top("track", "longestDays").iterrows()
+        ],
+    }
+    obsessions = stats["obsessions"]
+    if obsessions["trackRuns"]:
+        best = obsessions["trackRuns"][0]
+        print(f"  longest run: {best['name']} x{best['plays']} in a row")
+
+
+# ---------------------------------------------------------------------------
+# 2e. Rolling favorites (top artists / tracks over sliding windows)
+# ---------------------------------------------------------------------------
+ROLLING_WINDOWS_DAYS = (30, 90, 365)
+ROLLING_TOP_N = 10
+
+
+def day_cells(days: np.ndarray, codes: np.ndarray, ms: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Plays summed per (day, code): the cells' day, code and integer ms, in day order."""
+    cells, cell_of_play = np.unique(days.astype(np.int64) * n + codes, return_inverse=True)
+    cell_ms = np.bincount(cell_of_play.ravel(), weights=ms, minlength=len(cells)).astype(np.int64)
+    return cells // n, cells % n, cell_ms
+
+
+def rolling_top_k(cells: tuple[np.ndarray, np.ndarray, np.ndarray], n: int,
+                  boundaries: np.ndarray, window_days: int, k: int):
+    """Yield the top `k` codes and their ms over the `window_days` days before each boundary day.
+
+    `cells` come from day_cells. A single running total per code slides
+    forward: each cell is added once when the window reaches its day and
+    evicted once when it leaves, all in integer ms so nothing drifts. Top-k
+    is picked among the codes with a cell inside the window, ties broken by
+    code. The work is proportional to days x active codes, however many
+    rows there are.
+    """
+    cell_day, cell_code, cell_ms = cells
+    totals = np.zeros(n, dtype=np.int64)
+    lo = hi = 0
+    for boundary in boundaries:
+        new_hi = int(np.searchsorted(cell_day, boundary, side="left"))
+        new_lo = int(np.searchsorted(cell_day, boundary - window_days, side="left"))
+        np.add.at(totals, cell_code[hi:new_hi], cell_ms[hi:new_hi])
+        np.subtract.at(totals, cell_code[lo:new_lo], cell_ms[lo:new_lo])
+        lo, hi = new_lo, new_hi
+        active = np.unique(cell_code[lo:hi])
+        ranked = active[np.lexsort((active, -totals[active]))[:k]]
+        ranked = ranked[totals[ranked] > 0]
+        yield ranked, totals[ranked]
+
+
+@section("rollingTop", needs=["streams", "row_subsets", "entity_index"])
+def compute_rolling_top(ctx: AnalysisContext) -> None:
+    """Top artists and tracks over the last 30/90/365 days, taken at the end of every month."""
+    df = ctx.df
+    stats = ctx.stats
+    print("Computing rolling favorites …")
+
+    music = ctx.row_subsets["music"]
+    days = df["day_num"].to_numpy()[music]
+    ms = df["ms_played"].to_numpy()[music].astype(np.int64)
+    if len(music) == 0:
+        stats["rollingTop"] = {"windows": list(ROLLING_WINDOWS_DAYS), "artists": {}, "tracks": {}}
+        return
+
+    # One snapshot per month, on the first day of the next one
+    first_month, last_month = days.min().astype("datetime64[D]").astype("datetime64[M]"), days.max().astype("datetime64[D]").astype("datetime64[M]")
+    months = np.arange(first_month, last_month + 1)
+    boundaries = (months + 1).astype("datetime64[D]").astype(np.int64)
+
+    index = ctx.dataset("entity_index")
+    track_label = index["track_label"]
+
+    def label(entity: str, name: str) -> dict:
+        if entity == "artists":
+            return {"name": name}
+        row = track_label.loc[name]
+        return {"name": row["master_metadata_track_name"], "artist": row["master_metadata_album_artist_name"]}
+
+    out = {"windows": list(ROLLING_WINDOWS_DAYS)}
+    for entity, key in [("artists", "artist"), ("tracks", "track")]:
+        all_codes, names = index[key]
+        codes = all_codes[music].astype(np.int64)
+        known = codes >= 0
+        cells = day_cells(days[known], codes[known], ms[known], len(names))
+        out[entity] = {
+            str(window): [
+                {"month": str(month), "top": [
+                    {**label(entity, names[c]), "hours": round(ms_to_hours(t), 2)} for c, t in zip(ranked, totals)
+                ]}
+                for month, (ranked, totals) in zip(
+                    months, rolling_top_k(cells, len(names), boundaries, window, ROLLING_TOP_N)
+                )
+            ]
+            for window in ROLLING_WINDOWS_DAYS
+        }
+    stats["rollingTop"] = out
+
+    latest = out["artists"][str(ROLLING_WINDOWS_DAYS[0])][-1]["top"]
+    if latest:
+        print(f"  {len(months)} months; last {ROLLING_WINDOWS_DAYS[0]} days led by {latest[0]['name']}")
+
 # ===========================================================================
 # 3. Spotify Account Data metrics
 # ===========================================================================
@@ -333,224 +1774,272 @@ ACCOUNT_DIR = "../Spotify Account Data/"
 # ---------------------------------------------------------------------------
 # 3a. Playlist Insights
 # ---------------------------------------------------------------------------
-print("Computing playlist insights …")
-playlist_files = sorted(
-    glob.glob(os.path.join(ACCOUNT_DIR, "Playlist*.json"))
-)
+@dataset("playlists", inputs=[("account", "Playlist*.json")])
+def load_playlists(ctx: AnalysisContext) -> list[tuple[str, list]]:
+    """(name, items) of every playlist in the account export."""
+    playlist_files = sorted(
+        glob.glob(os.path.join(ACCOUNT_DIR, "Playlist*.json"))
+    )
 
-all_playlists = []  # list of (name, items_list)
-for pf in playlist_files:
-    with open(pf, "r") as fh:
-        data = json.load(fh)
-    # Normal playlist files have a "playlists" key
-    if "playlists" in data:
-        for pl in data["playlists"]:
-            items = pl.get("items", [])
-            all_playlists.append((pl["name"], items))
-    # PlaylistInABottle has capsule keys – skip for playlist stats
-
-total_playlists = len(all_playlists)
-total_playlist_tracks = sum(len(items) for _, items in all_playlists)
-avg_playlist_size = round(total_playlist_tracks / max(total_playlists, 1), 1)
-largest_playlist = max(all_playlists, key=lambda x: len(x[1]), default=("", []))
-
-# Playlist growth over time (tracks added per month)
-added_dates = []
-for _, items in all_playlists:
-    for item in items:
-        ad = item.get("addedDate")
-        if ad:
-            added_dates.append(ad[:7])  # "YYYY-MM"
-
-playlist_growth_counter: dict[str, int] = defaultdict(int)
-for ym in added_dates:
-    playlist_growth_counter[ym] += 1
-playlist_growth = [
-    {"month": m, "tracks": playlist_growth_counter[m]}
-    for m in sorted(playlist_growth_counter.keys())
-]
+    all_playlists = []  # list of (name, items_list)
+    for pf in playlist_files:
+        with open(pf, "r") as fh:
+            data = json.load(fh)
+        # Normal playlist files have a "playlists" key
+        if "playlists" in data:
+            for pl in data["playlists"]:
+                items = pl.get("items", [])
+                all_playlists.append((pl["name"], items))
+        # PlaylistInABottle has capsule keys – skip for playlist stats
+    return all_playlists
+
+
+@dataset("playlist_edits", inputs=[("techlog", "AddedToPlaylist*.json"), ("techlog", "RemovedFromPlaylist*.json")])
+def load_playlist_edits(ctx: AnalysisContext) -> dict[str, pd.DataFrame]:
+    """AddedToPlaylist / RemovedFromPlaylist events ("added" / "removed") with local time columns.
+
+    Where the log has timestamp_utc, ts is it in LOCAL_TZ (NaT when
+    unparseable) with date, week, hour_of_day and day_of_week derived from it.
+    """
+    edits = {}
+    for kind, prefix in [("added", "AddedToPlaylist"), ("removed", "RemovedFromPlaylist")]:
+        frame = load_numbered_json(prefix)
+        if "timestamp_utc" in frame.columns:
+            frame["ts"] = pd.to_datetime(
+                frame["timestamp_utc"], format="ISO8601", utc=True, errors="coerce"
+            ).dt.tz_convert(LOCAL_TZ)
+            frame["date"] = frame["ts"].dt.date
+            frame["week"] = frame["ts"].dt.to_period("W").astype(str)
+            frame["hour_of_day"] = frame["ts"].dt.hour
+            frame["day_of_week"] = frame["ts"].dt.dayofweek
+        edits[kind] = frame
+    return edits
+
+
+@section("playlistInsights", needs=["playlists", "playlist_edits"])
+def compute_playlist_insights(ctx: AnalysisContext) -> None:
+    """Playlist sizes, growth and composition from the account export."""
+    stats = ctx.stats
+    print("Computing playlist insights …")
+    all_playlists = ctx.dataset("playlists")
+
+    total_playlists = len(all_playlists)
+    total_playlist_tracks = sum(len(items) for _, items in all_playlists)
+    avg_playlist_size = round(total_playlist_tracks / max(total_playlists, 1), 1)
+    largest_playlist = max(all_playlists, key=lambda x: len(x[1]), default=("", []))
+
+    # Playlist growth over time (tracks added per month)
+    added_dates = []
+    for _, items in all_playlists:
+        for item in items:
+            ad = item.get("addedDate")
+            if ad:
+                added_dates.append(ad[:7])  # "YYYY-MM"
+
+    playlist_growth_counter: dict[str, int] = defaultdict(int)
+    for ym in added_dates:
+        playlist_growth_counter[ym] += 1
+    playlist_growth = [
+        {"month": m, "tracks": playlist_growth_counter[m]}
+        for m in sorted(playlist_growth_counter.keys())
+    ]
 
-# Playlist growth from technical logs (long history, supports user-only toggle)
-techlog_playlist_growth_all = []
-techlog_playlist_growth_user = []
-techlog_dir_for_playlist_insights = "../Spotify Technical Log Information/"
-added_to_playlist_files = sorted(
-    glob.glob(os.path.join(techlog_dir_for_playlist_insights, "AddedToPlaylist_*.json"))
-)
-if not added_to_playlist_files:
-    single_adds = os.path.join(techlog_dir_for_playlist_insights, "AddedToPlaylist.json")
-    if os.path.exists(single_adds):
-        added_to_playlist_files = [single_adds]
-
-if added_to_playlist_files:
-    add_frames = []
-    for fp in added_to_playlist_files:
-        with open(fp, "r") as fh:
-            add_data = json.load(fh)
-        if isinstance(add_data, list) and len(add_data) > 0:
-            add_frames.append(pd.DataFrame(add_data))
-
-    if add_frames:
-        tech_adds_df = pd.concat(add_frames, ignore_index=True)
-        if "timestamp_utc" in tech_adds_df.columns:
-            tech_adds_df["ts"] = pd.to_datetime(
-                tech_adds_df["timestamp_utc"], format="ISO8601", utc=True, errors="coerce"
-            )
-            tech_adds_df = tech_adds_df[tech_adds_df["ts"].notna()].copy()
-
-            if "message_item_uri_kind" in tech_adds_df.columns:
-                tech_adds_df = tech_adds_df[
-                    tech_adds_df["message_item_uri_kind"].eq("track")
-                ].copy()
-
-            if len(tech_adds_df) > 0:
-                tech_adds_df["month"] = tech_adds_df["ts"].dt.to_period("M").astype(str)
-                all_growth = tech_adds_df.groupby("month").size()
-                techlog_playlist_growth_all = [
-                    {"month": m, "tracks": int(all_growth[m])}
-                    for m in sorted(all_growth.index)
+    # Playlist growth from technical logs (long history, supports user-only toggle)
+    techlog_playlist_growth_all = []
+    techlog_playlist_growth_user = []
+    tech_adds_df = ctx.dataset("playlist_edits")["added"]
+    if "ts" in tech_adds_df.columns:
+        tech_adds_df = tech_adds_df[tech_adds_df["ts"].notna()].copy()
+
+        if "message_item_uri_kind" in tech_adds_df.columns:
+            tech_adds_df = tech_adds_df[
+                tech_adds_df["message_item_uri_kind"].eq("track")
+            ].copy()
+
+        if len(tech_adds_df) > 0:
+            # Months in UTC, as the log records them
+            tech_adds_df["month"] = tech_adds_df["ts"].dt.tz_convert("UTC").dt.to_period("M").astype(str)
+            all_growth = tech_adds_df.groupby("month").size()
+            techlog_playlist_growth_all = [
+                {"month": m, "tracks": int(all_growth[m])}
+                for m in sorted(all_growth.index)
+            ]
+
+            if "message_client_platform" in tech_adds_df.columns:
+                user_adds_df = tech_adds_df[tech_adds_df["message_client_platform"].notna()].copy()
+            else:
+                user_adds_df = tech_adds_df.iloc[0:0].copy()
+
+            if len(user_adds_df) > 0:
+                user_growth = user_adds_df.groupby("month").size()
+                techlog_playlist_growth_user = [
+                    {"month": m, "tracks": int(user_growth[m])}
+                    for m in sorted(user_growth.index)
                 ]
 
-                if "message_client_platform" in tech_adds_df.columns:
-                    user_adds_df = tech_adds_df[tech_adds_df["message_client_platform"].notna()].copy()
-                else:
-                    user_adds_df = tech_adds_df.iloc[0:0].copy()
-
-                if len(user_adds_df) > 0:
-                    user_growth = user_adds_df.groupby("month").size()
-                    techlog_playlist_growth_user = [
-                        {"month": m, "tracks": int(user_growth[m])}
-                        for m in sorted(user_growth.index)
-                    ]
-
-# Top playlists by size
-playlists_by_size = sorted(all_playlists, key=lambda x: len(x[1]), reverse=True)[:15]
-top_playlists_by_size = [
-    {"name": name, "tracks": len(items)} for name, items in playlists_by_size
-]
+    # Top playlists by size
+    playlists_by_size = sorted(all_playlists, key=lambda x: len(x[1]), reverse=True)[:15]
+    top_playlists_by_size = [
+        {"name": name, "tracks": len(items)} for name, items in playlists_by_size
+    ]
+
+    # Playlist diversity score (unique artists / total tracks)
+    playlist_diversity = []
+    for name, items in all_playlists:
+        if len(items) < 5:
+            continue  # skip tiny playlists
+        artists_in_pl = set()
+        for item in items:
+            tr = item.get("track")
+            if tr and tr.get("artistName"):
+                artists_in_pl.add(tr["artistName"])
+        diversity = round(len(artists_in_pl) / len(items), 3) if items else 0
+        playlist_diversity.append({
+            "name": name,
+            "diversity": diversity,
+            "uniqueArtists": len(artists_in_pl),
+            "totalTracks": len(items),
+        })
+    playlist_diversity.sort(key=lambda x: x["diversity"], reverse=True)
+
+    stats["playlistInsights"] = {
+        "totalPlaylists": total_playlists,
+        "totalTracks": total_playlist_tracks,
+        "avgPlaylistSize": avg_playlist_size,
+        "largestPlaylist": {"name": largest_playlist[0], "tracks": len(largest_playlist[1])},
+        "growthOverTime": playlist_growth,
+        "growthOverTimeAll": techlog_playlist_growth_all,
+        "growthOverTimeUserOnly": techlog_playlist_growth_user,
+        "topBySize": top_playlists_by_size,
+        "diversity": playlist_diversity[:20],  # top 20 most diverse
+    }
+    print(f"  {total_playlists} playlists, {total_playlist_tracks} total tracks")
 
-# Playlist diversity score (unique artists / total tracks)
-playlist_diversity = []
-for name, items in all_playlists:
-    if len(items) < 5:
-        continue  # skip tiny playlists
-    artists_in_pl = set()
-    for item in items:
-        tr = item.get("track")
-        if tr and tr.get("artistName"):
-            artists_in_pl.add(tr["artistName"])
-    diversity = round(len(artists_in_pl) / len(items), 3) if items else 0
-    playlist_diversity.append({
-        "name": name,
-        "diversity": diversity,
-        "uniqueArtists": len(artists_in_pl),
-        "totalTracks": len(items),
-    })
-playlist_diversity.sort(key=lambda x: x["diversity"], reverse=True)
-
-stats["playlistInsights"] = {
-    "totalPlaylists": total_playlists,
-    "totalTracks": total_playlist_tracks,
-    "avgPlaylistSize": avg_playlist_size,
-    "largestPlaylist": {"name": largest_playlist[0], "tracks": len(largest_playlist[1])},
-    "growthOverTime": playlist_growth,
-    "growthOverTimeAll": techlog_playlist_growth_all,
-    "growthOverTimeUserOnly": techlog_playlist_growth_user,
-    "topBySize": top_playlists_by_size,
-    "diversity": playlist_diversity[:20],  # top 20 most diverse
-}
-print(f"  {total_playlists} playlists, {total_playlist_tracks} total tracks")
 
 # ---------------------------------------------------------------------------
 # 3b. Search Behavior
 # ---------------------------------------------------------------------------
-print("Computing search behavior …")
-search_path = os.path.join(ACCOUNT_DIR, "SearchQueries.json")
-with open(search_path, "r") as fh:
-    search_data = json.load(fh)
-
-# Parse timestamps and filter to meaningful searches (those with interactions)
-search_records = []
-for s in search_data:
-    query = s.get("searchQuery", "").strip()
-    uris = s.get("searchInteractionURIs", [])
-    raw_time = s.get("searchTime", "")
-    platform = s.get("platform", "")
-    # Parse timestamp – remove [UTC] suffix
-    ts_str = raw_time.replace("[UTC]", "").strip()
-    try:
-        ts = pd.to_datetime(ts_str, utc=True)
-    except Exception:
-        continue
-    search_records.append({
-        "query": query,
+def parse_search_queries(raw: pd.DataFrame) -> pd.DataFrame:
+    """Column-wise parse of SearchQueries.json records.
+
+    Returns query, ts (UTC), platform and hasInteraction (at least one
+    non-empty interaction URI); rows whose searchTime cannot be parsed are
+    dropped.
+    """
+    def column(name: str) -> pd.Series:
+        if name in raw.columns:
+            return raw[name]
+        return pd.Series(None, index=raw.index, dtype=object)
+
+    # Timestamps look like "2024-01-02T03:04:05.678Z[UTC]"; strip the zone suffix
+    times = column("searchTime").fillna("").astype(str).str.replace("[UTC]", "", regex=False).str.strip()
+    ts = pd.to_datetime(times, format="ISO8601", utc=True, errors="coerce")
+    # Anything not ISO 8601 gets one more (still batched) attempt with per-element format inference
+    retry = ts.isna() & times.ne("")
+    if retry.any():
+        ts[retry] = pd.to_datetime(times[retry], format="mixed", utc=True, errors="coerce")
+
+    uris = column("searchInteractionURIs").explode()
+    has_uri = uris.notna() & uris.astype(str).ne("")
+    has_interaction = has_uri.groupby(level=0).any().reindex(raw.index, fill_value=False)
+
+    parsed = pd.DataFrame({
+        "query": column("searchQuery").fillna("").astype(str).str.strip(),
         "ts": ts,
-        "platform": platform,
-        "hasInteraction": len(uris) > 0 and any(u for u in uris),
-        "uris": uris,
+        "platform": column("platform").fillna("").astype(str),
+        "hasInteraction": has_interaction.astype(bool),
     })
+    return parsed[parsed["ts"].notna()].reset_index(drop=True)
 
-search_df = pd.DataFrame(search_records)
-if len(search_df) > 0:
-    search_df["ts"] = pd.to_datetime(search_df["ts"], utc=True)
-    search_df["ts"] = search_df["ts"].dt.tz_convert("US/Eastern")
+
+@dataset("searches", inputs=[("account", "SearchQueries.json")])
+def meaningful_searches(ctx: AnalysisContext) -> pd.DataFrame:
+    """Searches with at least one interaction, with local ts, week, hour_of_day and date."""
+    search_df = parse_search_queries(load_single_json("SearchQueries.json", ACCOUNT_DIR))
+    if len(search_df) == 0:
+        return search_df
+    search_df["ts"] = search_df["ts"].dt.tz_convert(LOCAL_TZ)
     search_df["week"] = search_df["ts"].dt.to_period("W").astype(str)
     search_df["hour_of_day"] = search_df["ts"].dt.hour
     search_df["date"] = search_df["ts"].dt.date
+    return search_df[search_df["hasInteraction"]].copy()
+
+
+@section("searchBehavior", needs=["searches"])
+def compute_search_behavior(ctx: AnalysisContext) -> None:
+    """Search volume, top queries and timing from SearchQueries.json."""
+    stats = ctx.stats
+    print("Computing search behavior …")
+
+    meaningful = ctx.dataset("searches")
+    if len(meaningful) > 0:
+        total_searches = len(meaningful)
+        unique_queries = int(meaningful["query"].nunique())
+        date_range_days = (meaningful["date"].max() - meaningful["date"].min()).days + 1
+        avg_searches_per_day = round(total_searches / max(date_range_days, 1), 1)
+
+        # Search activity over time (weekly)
+        search_weekly = meaningful.groupby("week").size().reset_index(name="count")
+        search_weekly = search_weekly.sort_values("week")
+        search_over_time = [
+            {"week": r["week"], "count": int(r["count"])}
+            for _, r in search_weekly.iterrows()
+        ]
 
-    # Only meaningful searches (with interactions)
-    meaningful = search_df[search_df["hasInteraction"]].copy()
-
-    total_searches = len(meaningful)
-    unique_queries = int(meaningful["query"].nunique())
-    date_range_days = (meaningful["date"].max() - meaningful["date"].min()).days + 1
-    avg_searches_per_day = round(total_searches / max(date_range_days, 1), 1)
-
-    # Search activity over time (weekly)
-    search_weekly = meaningful.groupby("week").size().reset_index(name="count")
-    search_weekly = search_weekly.sort_values("week")
-    search_over_time = [
-        {"week": r["week"], "count": int(r["count"])}
-        for _, r in search_weekly.iterrows()
-    ]
+        # Top search queries
+        query_counts = meaningful["query"].str.lower().value_counts().head(20)
+        top_queries = [
+            {"query": q, "count": int(c)} for q, c in query_counts.items()
+        ]
 
-    # Top search queries
-    query_counts = meaningful["query"].str.lower().value_counts().head(20)
-    top_queries = [
-        {"query": q, "count": int(c)} for q, c in query_counts.items()
-    ]
+        # Search hour-of-day distribution
+        search_hod = meaningful.groupby("hour_of_day").size()
+        search_hour_dist = [
+            {"hour": int(h), "count": int(search_hod.get(h, 0))} for h in range(24)
+        ]
 
-    # Search hour-of-day distribution
-    search_hod = meaningful.groupby("hour_of_day").size()
-    search_hour_dist = [
-        {"hour": int(h), "count": int(search_hod.get(h, 0))} for h in range(24)
-    ]
+        stats["searchBehavior"] = {
+            "totalSearches": total_searches,
+            "uniqueQueries": unique_queries,
+            "avgSearchesPerDay": avg_searches_per_day,
+            "overTime": search_over_time,
+            "topQueries": top_queries,
+            "hourOfDay": search_hour_dist,
+        }
+        print(f"  {total_searches} meaningful searches, {unique_queries} unique queries")
+    else:
+        stats["searchBehavior"] = {
+            "totalSearches": 0, "uniqueQueries": 0, "avgSearchesPerDay": 0,
+            "overTime": [], "topQueries": [], "hourOfDay": [],
+        }
 
-    stats["searchBehavior"] = {
-        "totalSearches": total_searches,
-        "uniqueQueries": unique_queries,
-        "avgSearchesPerDay": avg_searches_per_day,
-        "overTime": search_over_time,
-        "topQueries": top_queries,
-        "hourOfDay": search_hour_dist,
-    }
-    print(f"  {total_searches} meaningful searches, {unique_queries} unique queries")
-else:
-    stats["searchBehavior"] = {
-        "totalSearches": 0, "uniqueQueries": 0, "avgSearchesPerDay": 0,
-        "overTime": [], "topQueries": [], "hourOfDay": [],
-    }
 
 # ---------------------------------------------------------------------------
-# 3c. Wrapped Spotlight (auto-detect year)
+# 3c. Wrapped Spotlight (every year found)
 # ---------------------------------------------------------------------------
-print("Computing Wrapped spotlight …")
-wrapped_files = sorted(glob.glob(os.path.join(ACCOUNT_DIR, "Wrapped*.json")))
-if wrapped_files:
-    wrapped_path = wrapped_files[-1]  # latest year
+# Numeric Wrapped metrics compared year over year, with the highlight label each one has
+WRAPPED_METRIC_LABELS = {
+    "totalHours": "Total Hours",
+    "topPercent": "Global Ranking",
+    "distinctTracks": "Distinct Tracks",
+    "uniqueArtists": "Unique Artists",
+    "topTrackPlays": "#1 Track Plays",
+    "listeningDays": "Listening Days",
+    "longestStreak": "Longest Streak",
+    "artistsDiscovered": "Artists Discovered",
+    "genresExplored": "Genres Explored",
+    "albumsCompleted": "Albums Completed",
+}
+
+
+def summarize_wrapped_year(wrapped_path: str) -> dict:
+    """Highlights, sections and raw metrics of one Wrapped export.
+
+    Module-level and self-contained so it can run in a worker process and
+    its result can be cached by the file's hash.
+    """
     wrapped_year_match = re.search(r"Wrapped(\d{4})", os.path.basename(wrapped_path))
     wrapped_year = int(wrapped_year_match.group(1)) if wrapped_year_match else 0
-    print(f"  Found {os.path.basename(wrapped_path)}")
     with open(wrapped_path, "r") as fh:
         wrapped = json.load(fh)
 
@@ -568,6 +2057,7 @@ if wrapped_files:
     # --- Build highlights (hero KPI stats) ---
     highlights = []
 
+    total_hours = top_pct = None
     total_ms = yearly_metrics.get("totalMsListened", 0)
     if total_ms:
         total_hours = round(total_ms / 3_600_000, 1)
@@ -708,175 +2198,117 @@ if wrapped_files:
             "items": [{"label": f"First played {top_track_first}", "value": f"{top_play_count} plays"}],
         })
 
-    stats["wrappedSpotlight"] = {
+    # Raw values behind the highlights, for year-over-year deltas
+    metrics = {
+        "totalHours": total_hours,
+        "topPercent": top_pct,
+        "distinctTracks": distinct,
+        "uniqueArtists": unique_artists,
+        "topTrackPlays": top_play_count,
+        "listeningDays": listening_days,
+        "longestStreak": streak,
+        "artistsDiscovered": discovered,
+        "genresExplored": total_genres,
+        "albumsCompleted": completed_albums,
+    }
+    return {
         "year": wrapped_year,
+        "file": os.path.basename(wrapped_path),
         "highlights": highlights,
         "sections": sections,
+        "metrics": {k: float(v) for k, v in metrics.items() if v is not None},
     }
-    print(f"  {wrapped_year}: {len(highlights)} highlights, {len(sections)} sections")
-else:
-    stats["wrappedSpotlight"] = {"year": 0, "highlights": [], "sections": []}
-    print("  No Wrapped file found")
-
-# ---------------------------------------------------------------------------
-# 3d. Library Health (cross-dataset)
-# ---------------------------------------------------------------------------
-print("Computing library health …")
-library_path = os.path.join(ACCOUNT_DIR, "YourLibrary.json")
-with open(library_path, "r") as fh:
-    library_data = json.load(fh)
-
-library_tracks = library_data.get("tracks", [])
-library_uris = set(t.get("uri") for t in library_tracks if t.get("uri"))
-library_size = len(library_tracks)
-
-# Set of all URIs ever streamed
-streamed_uris = set(df["spotify_track_uri"].dropna().unique())
-
-# Build music-only frame once for URI + title/artist matching
-music_with_uri = df[(df["content_type"] == "music") & df["spotify_track_uri"].notna()].copy()
-
-# Library utilization: how many saved tracks appear in streaming history
-streamed_title_artist = set(
-    zip(
-        music_with_uri["master_metadata_track_name"].fillna("").str.strip().str.lower(),
-        music_with_uri["master_metadata_album_artist_name"].fillna("").str.strip().str.lower(),
-    )
-)
 
-library_rows = []
-for t in library_tracks:
-    uri = t.get("uri", "")
-    name = (t.get("track") or "").strip()
-    artist = (t.get("artist") or "").strip()
-    key = (name.lower(), artist.lower()) if name and artist else ("", "")
-    library_rows.append({"uri": uri, "name": name, "artist": artist, "key": key})
-
-utilized_library_rows = [
-    row
-    for row in library_rows
-    if (row["uri"] in streamed_uris)
-    or (row["key"] != ("", "") and row["key"] in streamed_title_artist)
-]
 
-utilized_count = len(utilized_library_rows)
-utilization_rate = round(utilized_count / max(library_size, 1) * 100, 1)
-
-# Examples of saved tracks never played in streaming history
-# (after URI + title/artist fallback matching)
-never_played_examples = []
-for row in library_rows:
-    is_utilized = (row["uri"] in streamed_uris) or (
-        row["key"] != ("", "") and row["key"] in streamed_title_artist
-    )
-    if not is_utilized and row["name"] and row["artist"]:
-        never_played_examples.append({"name": row["name"], "artist": row["artist"]})
-    if len(never_played_examples) >= 8:
-        break
-
-# "Unsaved Favorites": top played tracks NOT in library
-# Deduplicate by (title, artist) so singles and album versions count as one
-track_hours = (
-    music_with_uri.groupby(["spotify_track_uri", "master_metadata_track_name", "master_metadata_album_artist_name"])
-    ["hours"].sum().reset_index()
-)
-track_hours.columns = ["uri", "name", "artist", "hours"]
-
-# Build a set of (lowercase title, lowercase artist) from library for fuzzy matching
-library_title_artist = set()
-for t in library_tracks:
-    lib_name = (t.get("track") or "").strip().lower()
-    lib_artist = (t.get("artist") or "").strip().lower()
-    if lib_name and lib_artist:
-        library_title_artist.add((lib_name, lib_artist))
-
-# Exclude tracks that match library by URI *or* by title+artist
-unsaved_by_uri = track_hours[~track_hours["uri"].isin(library_uris)].copy()
-unsaved_by_uri["_key"] = list(zip(
-    unsaved_by_uri["name"].str.strip().str.lower(),
-    unsaved_by_uri["artist"].str.strip().str.lower(),
-))
-unsaved_filtered = unsaved_by_uri[~unsaved_by_uri["_key"].isin(library_title_artist)].copy()
-
-# Aggregate hours by (title, artist) to merge singles/album versions
-unsaved_deduped = (
-    unsaved_filtered.groupby(["name", "artist"])["hours"]
-    .sum()
-    .reset_index()
-    .nlargest(10, "hours")
-)
-unsaved_favorites = [
-    {"name": r["name"], "artist": r["artist"], "hours": round(r["hours"], 1)}
-    for _, r in unsaved_deduped.iterrows()
-]
-
-# "Forgotten Saves": library tracks not played in last 12 months
-last_date = df["ts"].max()
-twelve_months_ago = last_date - pd.DateOffset(months=12)
-recent_music = df[(df["content_type"] == "music") & (df["ts"] >= twelve_months_ago)]
-recent_uris = set(recent_music["spotify_track_uri"].dropna().unique())
-recent_title_artist = set(
-    zip(
-        recent_music["master_metadata_track_name"].fillna("").str.strip().str.lower(),
-        recent_music["master_metadata_album_artist_name"].fillna("").str.strip().str.lower(),
-    )
-)
-
-forgotten_count = sum(
-    1
-    for row in library_rows
-    if not (
-        (row["uri"] in recent_uris)
-        or (row["key"] != ("", "") and row["key"] in recent_title_artist)
-    )
-)
-forgotten_pct = round(forgotten_count / max(library_size, 1) * 100, 1)
-
-# Library artist concentration
-lib_artist_counts: dict[str, int] = defaultdict(int)
-for t in library_tracks:
-    artist = t.get("artist", "Unknown")
-    if artist:
-        lib_artist_counts[artist] += 1
-top_lib_artists = sorted(lib_artist_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-library_artist_concentration = [
-    {"name": a, "count": c} for a, c in top_lib_artists
-]
+def summarize_wrapped_files(paths: list[str], cache=None) -> list[dict]:
+    """summarize_wrapped_year for each path, in order.
+
+    With a stage cache, summaries are stored under the hash of the file's
+    name and contents (and of the summarizing code), so only new or changed years are
+    parsed. Those are spread over a process pool when there are several.
+    """
+    summaries: dict[str, dict] = {}
+    keys = {}
+    if cache is not None:
+        code = code_fingerprint(summarize_wrapped_year)
+        for fp in paths:
+            # The name too: the year comes from it
+            keys[fp] = hashlib.sha256(f"{code}:{os.path.basename(fp)}:{cache.file_digest(fp)}".encode()).hexdigest()
+            entry = cache.load("wrappedYears", keys[fp])
+            if entry is not None:
+                summaries[fp] = entry
+    missing = [fp for fp in paths if fp not in summaries]
+    if cache is not None:
+        print(f"  {len(paths) - len(missing)} of {len(paths)} Wrapped years cached")
+
+    # Daemonic processes (e.g. batch_preprocess workers) may not start children
+    if len(missing) > 1 and not multiprocessing.current_process().daemon:
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        workers = max(1, min(os.cpu_count() or 1, len(missing)))
+        with multiprocessing.get_context(start_method).Pool(workers) as pool:
+            parsed = pool.map(summarize_wrapped_year, missing)
+    else:
+        parsed = [summarize_wrapped_year(fp) for fp in missing]
+
+    for fp, summary in zip(missing, parsed):
+        summaries[fp] = summary
+        if cache is not None:
+            cache.store("wrappedYears", keys[fp], summary)
+    return [summaries[fp] for fp in paths]
+
+
+def wrapped_year_over_year(years: list[dict]) -> list[dict]:
+    """Change in every metric two consecutive Wrapped years both report."""
+    changes = []
+    for prev, cur in zip(years, years[1:]):
+        deltas = []
+        for metric, label in WRAPPED_METRIC_LABELS.items():
+            if metric in prev["metrics"] and metric in cur["metrics"]:
+                before, after = prev["metrics"][metric], cur["metrics"][metric]
+                deltas.append({
+                    "metric": metric,
+                    "label": label,
+                    "previous": before,
+                    "current": after,
+                    "change": round(after - before, 1),
+                    "pctChange": round((after - before) / before * 100, 1) if before else None,
+                })
+        changes.append({"year": cur["year"], "previousYear": prev["year"], "deltas": deltas})
+    return changes
+
+
+@section("wrappedSpotlight", inputs=[("account", "Wrapped*.json")])
+def compute_wrapped_spotlight(ctx: AnalysisContext) -> None:
+    """Highlights from every Wrapped export, the latest year up top, with year-over-year deltas."""
+    stats = ctx.stats
+    print("Computing Wrapped spotlight …")
+    wrapped_files = sorted(glob.glob(os.path.join(ACCOUNT_DIR, "Wrapped*.json")))
+    if wrapped_files:
+        print(f"  Found {', '.join(os.path.basename(fp) for fp in wrapped_files)}")
+        years = sorted(summarize_wrapped_files(wrapped_files, ctx.cache), key=lambda y: y["year"])
+        latest = years[-1]
+        stats["wrappedSpotlight"] = {
+            "year": latest["year"],
+            "highlights": latest["highlights"],
+            "sections": latest["sections"],
+            "years": years,
+            "yearOverYear": wrapped_year_over_year(years),
+        }
+        for y in years:
+            print(f"  {y['year']}: {len(y['highlights'])} highlights, {len(y['sections'])} sections")
+    else:
+        stats["wrappedSpotlight"] = {"year": 0, "highlights": [], "sections": [], "years": [], "yearOverYear": []}
+        print("  No Wrapped file found")
 
-# Library album concentration (album + artist to avoid ambiguous titles)
-lib_album_counts: dict[tuple[str, str], int] = defaultdict(int)
-for t in library_tracks:
-    album = t.get("album", "Unknown")
-    artist = t.get("artist", "Unknown")
-    if album:
-        lib_album_counts[(album, artist)] += 1
-top_lib_albums = sorted(lib_album_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-library_album_concentration = [
-    {"name": album, "artist": artist, "count": count}
-    for (album, artist), count in top_lib_albums
-]
 
+# ---------------------------------------------------------------------------
+# 3d. Library Health (cross-dataset)
+# ---------------------------------------------------------------------------
 # -----------------------------------------------------------------------
 # Library interactions from technical logs (AddedToCollection/RemovedToCollection)
 # Primary scope: message_set == "collection"
 # Secondary context: other sets (e.g., listenlater)
 # -----------------------------------------------------------------------
-def detect_uri_kind(uri: str) -> str:
-    if not isinstance(uri, str) or not uri:
-        return "other"
-    if uri.startswith("spotify:track:"):
-        return "track"
-    if uri.startswith("spotify:album:"):
-        return "album"
-    if uri.startswith("spotify:artist:"):
-        return "artist"
-    if uri.startswith("spotify:episode:"):
-        return "episode"
-    if uri.startswith("spotify:show:"):
-        return "show"
-    return "other"
-
-
 def empty_collection_interaction_metrics() -> dict:
     return {
         "totalAdds": 0,
@@ -888,7 +2320,6 @@ def empty_collection_interaction_metrics() -> dict:
         "kindBreakdown": [],
     }
 
-
 def compute_collection_interaction_metrics(events_df: pd.DataFrame) -> dict:
     if len(events_df) == 0:
         return empty_collection_interaction_metrics()
@@ -939,432 +2370,591 @@ def compute_collection_interaction_metrics(events_df: pd.DataFrame) -> dict:
         "kindBreakdown": kind_breakdown,
     }
 
-
-def load_collection_log(filename: str) -> pd.DataFrame:
-    fp = os.path.join(TECHLOG_DIR if "TECHLOG_DIR" in globals() else "../Spotify Technical Log Information/", filename)
-    if not os.path.exists(fp):
-        return pd.DataFrame()
-    with open(fp, "r") as fh:
-        payload = json.load(fh)
-    if isinstance(payload, list) and len(payload) > 0:
-        return pd.DataFrame(payload)
-    return pd.DataFrame()
-
-
 def prepare_collection_events(raw_df: pd.DataFrame, event_type: str) -> pd.DataFrame:
     if len(raw_df) == 0 or "timestamp_utc" not in raw_df.columns:
         return pd.DataFrame(columns=["ts", "month", "week", "set", "uriKind", "eventType", "isUserOnly"])
 
-    out = raw_df.copy()
-    out["ts"] = pd.to_datetime(out["timestamp_utc"], format="ISO8601", utc=True, errors="coerce")
-    out = out[out["ts"].notna()].copy()
-    if len(out) == 0:
+    # Build only the output columns instead of copying the raw log frame
+    ts = pd.to_datetime(raw_df["timestamp_utc"], format="ISO8601", utc=True, errors="coerce")
+    valid = ts.notna()
+    if not valid.any():
         return pd.DataFrame(columns=["ts", "month", "week", "set", "uriKind", "eventType", "isUserOnly"])
 
-    out["ts"] = out["ts"].dt.tz_convert("US/Eastern")
-    out["month"] = out["ts"].dt.to_period("M").astype(str)
-    out["week"] = out["ts"].dt.to_period("W").astype(str)
-    out["set"] = out.get("message_set", "unknown").fillna("unknown").astype(str)
-    out["uriKind"] = out.get("message_item_uri", "").fillna("").astype(str).apply(detect_uri_kind)
-    out["eventType"] = event_type
-    if "message_client_platform" in out.columns:
-        out["isUserOnly"] = out["message_client_platform"].notna()
-    else:
-        out["isUserOnly"] = False
+    ts = ts[valid].dt.tz_convert(LOCAL_TZ)
 
-    return out[["ts", "month", "week", "set", "uriKind", "eventType", "isUserOnly"]]
+    def raw_column(name: str) -> pd.Series:
+        if name in raw_df.columns:
+            return raw_df[name][valid]
+        return pd.Series(None, index=ts.index, dtype=object)
 
+    return pd.DataFrame({
+        "ts": ts,
+        "month": ts.dt.to_period("M").astype(str),
+        "week": ts.dt.to_period("W").astype(str),
+        "set": raw_column("message_set").fillna("unknown").astype(str),
+        "uriKind": uri_kind(raw_column("message_item_uri")).astype(str),
+        "eventType": event_type,
+        "isUserOnly": raw_column("message_client_platform").notna(),
+    })
 
-added_collection_raw = load_collection_log("AddedToCollection.json")
-removed_collection_raw = load_collection_log("RemovedFromCollection.json")
 
-added_collection_events = prepare_collection_events(added_collection_raw, "add")
-removed_collection_events = prepare_collection_events(removed_collection_raw, "remove")
-collection_events_all_sets = pd.concat([added_collection_events, removed_collection_events], ignore_index=True)
+@dataset("library", inputs=[("account", "YourLibrary.json")])
+def load_library(ctx: AnalysisContext) -> dict:
+    """Saved tracks from YourLibrary.json: "tracks" (records), "uris" (set) and "size"."""
+    library_path = os.path.join(ACCOUNT_DIR, "YourLibrary.json")
+    with open(library_path, "r") as fh:
+        library_data = json.load(fh)
 
-collection_only_events = collection_events_all_sets[
-    collection_events_all_sets["set"].str.lower() == "collection"
-].copy() if len(collection_events_all_sets) > 0 else pd.DataFrame(columns=["ts", "month", "set", "uriKind", "eventType", "isUserOnly"])
+    library_tracks = library_data.get("tracks", [])
+    return {
+        "tracks": library_tracks,
+        "uris": set(t.get("uri") for t in library_tracks if t.get("uri")),
+        "size": len(library_tracks),
+    }
 
-supports_user_only = (
-    ("message_client_platform" in added_collection_raw.columns and added_collection_raw["message_client_platform"].notna().any())
-    or ("message_client_platform" in removed_collection_raw.columns and removed_collection_raw["message_client_platform"].notna().any())
-)
 
-collection_all_metrics = compute_collection_interaction_metrics(collection_only_events)
-collection_user_metrics = (
-    compute_collection_interaction_metrics(collection_only_events[collection_only_events["isUserOnly"]])
-    if supports_user_only else empty_collection_interaction_metrics()
+@section(
+    "libraryHealth",
+    inputs=[("techlog", "AddedToCollection*.json"), ("techlog", "RemovedFromCollection*.json")],
+    needs=["library", "streams", "masks", "music_with_uri"],
 )
+def compute_library_health(ctx: AnalysisContext) -> None:
+    """Saved-library utilization and collection activity, joined with the streaming history."""
+    df = ctx.df
+    stats = ctx.stats
+    rows = ctx.rows
+    is_music = ctx.masks["music"]
+    print("Computing library health …")
+    library = ctx.dataset("library")
+    library_tracks, library_uris, library_size = library["tracks"], library["uris"], library["size"]
+
+    # Set of all URIs ever streamed
+    streamed_uris = set(df["spotify_track_uri"].dropna().unique())
+
+    # Music-only frame for URI + title/artist matching
+    music_with_uri = ctx.dataset("music_with_uri")
+
+    # Library utilization: how many saved tracks appear in streaming history
+    streamed_title_artist = set(
+        zip(
+            music_with_uri["master_metadata_track_name"].astype(object).fillna("").str.strip().str.lower(),
+            music_with_uri["master_metadata_album_artist_name"].astype(object).fillna("").str.strip().str.lower(),
+        )
+    )
 
-stats["libraryHealth"] = {
-    "librarySize": library_size,
-    "utilizationRate": utilization_rate,
-    "utilizedCount": utilized_count,
-    "neverPlayedExamples": never_played_examples,
-    "unsavedFavorites": unsaved_favorites,
-    "forgottenSaves": forgotten_count,
-    "forgottenSavesPct": forgotten_pct,
-    "artistConcentration": library_artist_concentration,
-    "albumConcentration": library_album_concentration,
-    "collectionInteractions": {
-        "supportsUserOnly": bool(supports_user_only),
-        "all": collection_all_metrics,
-        "userOnly": collection_user_metrics,
-    },
-}
-print(
-    f"  Library: {library_size} tracks, {utilization_rate}% utilized, {forgotten_count} forgotten | "
-    f"collection interactions: +{collection_all_metrics['totalAdds']} / -{collection_all_metrics['totalRemoves']}"
-)
+    library_rows = []
+    for t in library_tracks:
+        uri = t.get("uri", "")
+        name = (t.get("track") or "").strip()
+        artist = (t.get("artist") or "").strip()
+        key = (name.lower(), artist.lower()) if name and artist else ("", "")
+        library_rows.append({"uri": uri, "name": name, "artist": artist, "key": key})
+
+    utilized_library_rows = [
+        row
+        for row in library_rows
+        if (row["uri"] in streamed_uris)
+        or (row["key"] != ("", "") and row["key"] in streamed_title_artist)
+    ]
 
-# ---------------------------------------------------------------------------
-# 3d½. Explicit Content Analysis (saved_tracks.json x streaming)
-# ---------------------------------------------------------------------------
-print("Computing explicit content …")
-
-saved_tracks_path = os.path.join("..", "saved_tracks.json")
-if os.path.exists(saved_tracks_path):
-    with open(saved_tracks_path, "r") as fh:
-        saved_tracks_data = json.load(fh)
-    saved_items = saved_tracks_data.get("tracks", [])
-
-    # URI → explicit flag + artist
-    uri_is_explicit: dict[str, bool] = {}
-    uri_primary_artist: dict[str, str] = {}
-    for item in saved_items:
-        tr = item.get("track", {})
-        uri = tr.get("uri")
-        if uri:
-            uri_is_explicit[uri] = bool(tr.get("explicit", False))
-            artists = tr.get("artists", [])
-            if artists:
-                uri_primary_artist[uri] = artists[0].get("name", "Unknown")
-
-    # ---- Library split ----
-    lib_total = len(uri_is_explicit)
-    lib_explicit = sum(1 for v in uri_is_explicit.values() if v)
-    lib_clean = lib_total - lib_explicit
-    lib_explicit_pct = round(lib_explicit / max(lib_total, 1) * 100, 1)
-
-    # ---- Top explicit artists (by library save count) ----
-    artist_exp_saves: dict[str, int] = defaultdict(int)
-    for uri, is_exp in uri_is_explicit.items():
-        if is_exp and uri in uri_primary_artist:
-            artist_exp_saves[uri_primary_artist[uri]] += 1
-    top_explicit_artists = [
-        {"name": a, "saves": c}
-        for a, c in sorted(artist_exp_saves.items(), key=lambda x: x[1], reverse=True)[:10]
+    utilized_count = len(utilized_library_rows)
+    utilization_rate = round(utilized_count / max(library_size, 1) * 100, 1)
+
+    # Examples of saved tracks never played in streaming history
+    # (after URI + title/artist fallback matching)
+    never_played_examples = []
+    for row in library_rows:
+        is_utilized = (row["uri"] in streamed_uris) or (
+            row["key"] != ("", "") and row["key"] in streamed_title_artist
+        )
+        if not is_utilized and row["name"] and row["artist"]:
+            never_played_examples.append({"name": row["name"], "artist": row["artist"]})
+        if len(never_played_examples) >= 8:
+            break
+
+    # "Unsaved Favorites": top played tracks NOT in library
+    # Deduplicate by (title, artist) so singles and album versions count as one
+    track_hours = (
+        music_with_uri.groupby(
+            ["spotify_track_uri", "master_metadata_track_name", "master_metadata_album_artist_name"], observed=True
+        )
+        ["hours"].sum().reset_index()
+    )
+    track_hours.columns = ["uri", "name", "artist", "hours"]
+
+    # Build a set of (lowercase title, lowercase artist) from library for fuzzy matching
+    library_title_artist = set()
+    for t in library_tracks:
+        lib_name = (t.get("track") or "").strip().lower()
+        lib_artist = (t.get("artist") or "").strip().lower()
+        if lib_name and lib_artist:
+            library_title_artist.add((lib_name, lib_artist))
+
+    # Exclude tracks that match library by URI *or* by title+artist
+    unsaved_by_uri = track_hours[~track_hours["uri"].isin(library_uris)].copy()
+    unsaved_by_uri["_key"] = list(zip(
+        unsaved_by_uri["name"].str.strip().str.lower(),
+        unsaved_by_uri["artist"].str.strip().str.lower(),
+    ))
+    unsaved_filtered = unsaved_by_uri[~unsaved_by_uri["_key"].isin(library_title_artist)].copy()
+
+    # Aggregate hours by (title, artist) to merge singles/album versions
+    unsaved_deduped = (
+        unsaved_filtered.groupby(["name", "artist"], observed=True)["hours"]
+        .sum()
+        .reset_index()
+        .nlargest(10, "hours")
+    )
+    unsaved_favorites = [
+        {"name": r["name"], "artist": r["artist"], "hours": round(r["hours"], 1)}
+        for _, r in unsaved_deduped.iterrows()
     ]
 
-    # ---- Library adds explicit trend ----
-    adds_yearly_total: dict[int, int] = defaultdict(int)
-    adds_yearly_explicit: dict[int, int] = defaultdict(int)
-    for item in saved_items:
-        added = item.get("added_at", "")[:4]
-        if added and added.isdigit():
-            yr = int(added)
-            adds_yearly_total[yr] += 1
-            if item["track"].get("explicit", False):
-                adds_yearly_explicit[yr] += 1
-    library_adds_trend = [
-        {
-            "year": yr,
-            "explicitPct": round(adds_yearly_explicit.get(yr, 0) / max(adds_yearly_total[yr], 1) * 100, 1),
-            "explicitAdds": adds_yearly_explicit.get(yr, 0),
-            "totalAdds": adds_yearly_total[yr],
-        }
-        for yr in sorted(adds_yearly_total)
+    # "Forgotten Saves": library tracks not played in last 12 months
+    last_date = df["ts"].max()
+    twelve_months_ago = last_date - pd.DateOffset(months=12)
+    recent_music = rows(
+        is_music & (df["ts"] >= twelve_months_ago).to_numpy(),
+        "spotify_track_uri", "master_metadata_track_name", "master_metadata_album_artist_name",
+    )
+    recent_uris = set(recent_music["spotify_track_uri"].dropna().unique())
+    recent_title_artist = set(
+        zip(
+            recent_music["master_metadata_track_name"].astype(object).fillna("").str.strip().str.lower(),
+            recent_music["master_metadata_album_artist_name"].astype(object).fillna("").str.strip().str.lower(),
+        )
+    )
+
+    forgotten_count = sum(
+        1
+        for row in library_rows
+        if not (
+            (row["uri"] in recent_uris)
+            or (row["key"] != ("", "") and row["key"] in recent_title_artist)
+        )
+    )
+    forgotten_pct = round(forgotten_count / max(library_size, 1) * 100, 1)
+
+    # Library artist concentration
+    lib_artist_counts: dict[str, int] = defaultdict(int)
+    for t in library_tracks:
+        artist = t.get("artist", "Unknown")
+        if artist:
+            lib_artist_counts[artist] += 1
+    top_lib_artists = sorted(lib_artist_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+    library_artist_concentration = [
+        {"name": a, "count": c} for a, c in top_lib_artists
+    ]
+
+    # Library album concentration (album + artist to avoid ambiguous titles)
+    lib_album_counts: dict[tuple[str, str], int] = defaultdict(int)
+    for t in library_tracks:
+        album = t.get("album", "Unknown")
+        artist = t.get("artist", "Unknown")
+        if album:
+            lib_album_counts[(album, artist)] += 1
+    top_lib_albums = sorted(lib_album_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+    library_album_concentration = [
+        {"name": album, "artist": artist, "count": count}
+        for (album, artist), count in top_lib_albums
     ]
 
-    stats["explicitContent"] = {
-        "library": {
-            "total": lib_total,
-            "explicit": lib_explicit,
-            "clean": lib_clean,
-            "explicitPct": lib_explicit_pct,
+    added_collection_raw = load_single_json("AddedToCollection.json")
+    removed_collection_raw = load_single_json("RemovedFromCollection.json")
+
+    added_collection_events = prepare_collection_events(added_collection_raw, "add")
+    removed_collection_events = prepare_collection_events(removed_collection_raw, "remove")
+    collection_events_all_sets = pd.concat([added_collection_events, removed_collection_events], ignore_index=True)
+
+    collection_only_events = collection_events_all_sets[
+        collection_events_all_sets["set"].str.lower() == "collection"
+    ] if len(collection_events_all_sets) > 0 else pd.DataFrame(columns=["ts", "month", "set", "uriKind", "eventType", "isUserOnly"])
+
+    supports_user_only = (
+        ("message_client_platform" in added_collection_raw.columns and added_collection_raw["message_client_platform"].notna().any())
+        or ("message_client_platform" in removed_collection_raw.columns and removed_collection_raw["message_client_platform"].notna().any())
+    )
+
+    collection_all_metrics = compute_collection_interaction_metrics(collection_only_events)
+    collection_user_metrics = (
+        compute_collection_interaction_metrics(collection_only_events[collection_only_events["isUserOnly"]])
+        if supports_user_only else empty_collection_interaction_metrics()
+    )
+
+    stats["libraryHealth"] = {
+        "librarySize": library_size,
+        "utilizationRate": utilization_rate,
+        "utilizedCount": utilized_count,
+        "neverPlayedExamples": never_played_examples,
+        "unsavedFavorites": unsaved_favorites,
+        "forgottenSaves": forgotten_count,
+        "forgottenSavesPct": forgotten_pct,
+        "artistConcentration": library_artist_concentration,
+        "albumConcentration": library_album_concentration,
+        "collectionInteractions": {
+            "supportsUserOnly": bool(supports_user_only),
+            "all": collection_all_metrics,
+            "userOnly": collection_user_metrics,
         },
-        "libraryAddsTrend": library_adds_trend,
-        "topExplicitArtists": top_explicit_artists,
     }
-    print(f"  Library: {lib_explicit_pct}% explicit ({lib_explicit}/{lib_total}) | "
-          f"{len(top_explicit_artists)} top explicit artists")
-else:
-    stats["explicitContent"] = {
-        "library": {"total": 0, "explicit": 0, "clean": 0, "explicitPct": 0},
-        "libraryAddsTrend": [],
-        "topExplicitArtists": [],
-    }
-    print("  saved_tracks.json not found – skipping explicit analysis")
+    print(
+        f"  Library: {library_size} tracks, {utilization_rate}% utilized, {forgotten_count} forgotten | "
+        f"collection interactions: +{collection_all_metrics['totalAdds']} / -{collection_all_metrics['totalRemoves']}"
+    )
+
+
+# ---------------------------------------------------------------------------
+# 3d½. Explicit Content Analysis (saved_tracks.json x streaming)
+# ---------------------------------------------------------------------------
+SAVED_TRACKS_PATH = os.path.join("..", "saved_tracks.json")
+
+
+@section("explicitContent", inputs=[("parent", "saved_tracks.json")])
+def compute_explicit_content(ctx: AnalysisContext) -> None:
+    """Explicit share of saved tracks and streamed hours (needs ../saved_tracks.json)."""
+    stats = ctx.stats
+    print("Computing explicit content …")
+
+    if os.path.exists(SAVED_TRACKS_PATH):
+        with open(SAVED_TRACKS_PATH, "r") as fh:
+            saved_tracks_data = json.load(fh)
+        saved_items = saved_tracks_data.get("tracks", [])
+
+        # URI → explicit flag + artist
+        uri_is_explicit: dict[str, bool] = {}
+        uri_primary_artist: dict[str, str] = {}
+        for item in saved_items:
+            tr = item.get("track", {})
+            uri = tr.get("uri")
+            if uri:
+                uri_is_explicit[uri] = bool(tr.get("explicit", False))
+                artists = tr.get("artists", [])
+                if artists:
+                    uri_primary_artist[uri] = artists[0].get("name", "Unknown")
+
+        # ---- Library split ----
+        lib_total = len(uri_is_explicit)
+        lib_explicit = sum(1 for v in uri_is_explicit.values() if v)
+        lib_clean = lib_total - lib_explicit
+        lib_explicit_pct = round(lib_explicit / max(lib_total, 1) * 100, 1)
+
+        # ---- Top explicit artists (by library save count) ----
+        artist_exp_saves: dict[str, int] = defaultdict(int)
+        for uri, is_exp in uri_is_explicit.items():
+            if is_exp and uri in uri_primary_artist:
+                artist_exp_saves[uri_primary_artist[uri]] += 1
+        top_explicit_artists = [
+            {"name": a, "saves": c}
+            for a, c in sorted(artist_exp_saves.items(), key=lambda x: x[1], reverse=True)[:10]
+        ]
+
+        # ---- Library adds explicit trend ----
+        adds_yearly_total: dict[int, int] = defaultdict(int)
+        adds_yearly_explicit: dict[int, int] = defaultdict(int)
+        for item in saved_items:
+            added = item.get("added_at", "")[:4]
+            if added and added.isdigit():
+                yr = int(added)
+                adds_yearly_total[yr] += 1
+                if item["track"].get("explicit", False):
+                    adds_yearly_explicit[yr] += 1
+        library_adds_trend = [
+            {
+                "year": yr,
+                "explicitPct": round(adds_yearly_explicit.get(yr, 0) / max(adds_yearly_total[yr], 1) * 100, 1),
+                "explicitAdds": adds_yearly_explicit.get(yr, 0),
+                "totalAdds": adds_yearly_total[yr],
+            }
+            for yr in sorted(adds_yearly_total)
+        ]
+
+        stats["explicitContent"] = {
+            "library": {
+                "total": lib_total,
+                "explicit": lib_explicit,
+                "clean": lib_clean,
+                "explicitPct": lib_explicit_pct,
+            },
+            "libraryAddsTrend": library_adds_trend,
+            "topExplicitArtists": top_explicit_artists,
+        }
+        print(f"  Library: {lib_explicit_pct}% explicit ({lib_explicit}/{lib_total}) | "
+              f"{len(top_explicit_artists)} top explicit artists")
+    else:
+        stats["explicitContent"] = {
+            "library": {"total": 0, "explicit": 0, "clean": 0, "explicitPct": 0},
+            "libraryAddsTrend": [],
+            "topExplicitArtists": [],
+        }
+        print("  saved_tracks.json not found – skipping explicit analysis")
+
 
 # ---------------------------------------------------------------------------
 # 3e. Playlist x Streaming Overlap (cross-dataset)
 # ---------------------------------------------------------------------------
-print("Computing playlist-stream overlap …")
-
-# Build a map: playlist_name -> set of track URIs
-playlist_uri_map: dict[str, set] = {}
-for name, items in all_playlists:
-    uris_in_pl = set()
-    for item in items:
-        tr = item.get("track")
-        if tr and tr.get("trackUri"):
-            uris_in_pl.add(tr["trackUri"])
-    playlist_uri_map[name] = uris_in_pl
-
-# All playlist URIs combined
-all_playlist_uris = set()
-for uri_set in playlist_uri_map.values():
-    all_playlist_uris.update(uri_set)
-
-# Total streaming hours from playlist tracks
-playlist_stream_hours = float(
-    music_with_uri[music_with_uri["spotify_track_uri"].isin(all_playlist_uris)]["hours"].sum()
-)
-total_stream_hours = float(music_with_uri["hours"].sum())
-playlist_loyalty_score = round(playlist_stream_hours / max(total_stream_hours, 1) * 100, 1)
+@section("playlistStreamOverlap", needs=["playlists", "library", "music_with_uri"])
+def compute_playlist_stream_overlap(ctx: AnalysisContext) -> None:
+    """How much streamed time lands on playlisted and saved tracks."""
+    stats = ctx.stats
+    all_playlists = ctx.dataset("playlists")
+    library = ctx.dataset("library")
+    library_uris, library_size = library["uris"], library["size"]
+    music_with_uri = ctx.dataset("music_with_uri")
+    print("Computing playlist-stream overlap …")
+
+    # Build a map: playlist_name -> set of track URIs
+    playlist_uri_map: dict[str, set] = {}
+    for name, items in all_playlists:
+        uris_in_pl = set()
+        for item in items:
+            tr = item.get("track")
+            if tr and tr.get("trackUri"):
+                uris_in_pl.add(tr["trackUri"])
+        playlist_uri_map[name] = uris_in_pl
+
+    # All playlist URIs combined
+    all_playlist_uris = set()
+    for uri_set in playlist_uri_map.values():
+        all_playlist_uris.update(uri_set)
+
+    # Total streaming hours from playlist tracks
+    playlist_stream_hours = float(
+        music_with_uri[music_with_uri["spotify_track_uri"].isin(all_playlist_uris)]["hours"].sum()
+    )
+    total_stream_hours = float(music_with_uri["hours"].sum())
+    playlist_loyalty_score = round(playlist_stream_hours / max(total_stream_hours, 1) * 100, 1)
 
-# Library (Liked Songs) streaming overlap
-library_stream_hours = float(
-    music_with_uri[music_with_uri["spotify_track_uri"].isin(library_uris)]["hours"].sum()
-)
-library_streamed_count = int(
-    music_with_uri[music_with_uri["spotify_track_uri"].isin(library_uris)]["spotify_track_uri"].nunique()
-)
-library_loyalty_score = round(library_stream_hours / max(total_stream_hours, 1) * 100, 1)
+    # Library (Liked Songs) streaming overlap
+    library_stream_hours = float(
+        music_with_uri[music_with_uri["spotify_track_uri"].isin(library_uris)]["hours"].sum()
+    )
+    library_streamed_count = int(
+        music_with_uri[music_with_uri["spotify_track_uri"].isin(library_uris)]["spotify_track_uri"].nunique()
+    )
+    library_loyalty_score = round(library_stream_hours / max(total_stream_hours, 1) * 100, 1)
 
-# Combined: playlists + library
-combined_uris = all_playlist_uris | library_uris
-combined_stream_hours = float(
-    music_with_uri[music_with_uri["spotify_track_uri"].isin(combined_uris)]["hours"].sum()
-)
-combined_loyalty_score = round(combined_stream_hours / max(total_stream_hours, 1) * 100, 1)
-
-# Most-played playlists (by streaming hours)
-playlist_hours_list = []
-for name, uri_set in playlist_uri_map.items():
-    if len(uri_set) == 0:
-        continue
-    hrs = float(music_with_uri[music_with_uri["spotify_track_uri"].isin(uri_set)]["hours"].sum())
-    streamed_count = int(music_with_uri[music_with_uri["spotify_track_uri"].isin(uri_set)]["spotify_track_uri"].nunique())
+    # Combined: playlists + library
+    combined_uris = all_playlist_uris | library_uris
+    combined_stream_hours = float(
+        music_with_uri[music_with_uri["spotify_track_uri"].isin(combined_uris)]["hours"].sum()
+    )
+    combined_loyalty_score = round(combined_stream_hours / max(total_stream_hours, 1) * 100, 1)
+
+    # Most-played playlists (by streaming hours)
+    playlist_hours_list = []
+    for name, uri_set in playlist_uri_map.items():
+        if len(uri_set) == 0:
+            continue
+        hrs = float(music_with_uri[music_with_uri["spotify_track_uri"].isin(uri_set)]["hours"].sum())
+        streamed_count = int(music_with_uri[music_with_uri["spotify_track_uri"].isin(uri_set)]["spotify_track_uri"].nunique())
+        playlist_hours_list.append({
+            "name": name,
+            "hours": round(hrs, 1),
+            "totalTracks": len(uri_set),
+            "streamedTracks": streamed_count,
+        })
+    playlist_hours_list.sort(key=lambda x: x["hours"], reverse=True)
+
+    # Insert Liked Songs library into the ranked list
     playlist_hours_list.append({
-        "name": name,
-        "hours": round(hrs, 1),
-        "totalTracks": len(uri_set),
-        "streamedTracks": streamed_count,
+        "name": "Liked Songs",
+        "hours": round(library_stream_hours, 1),
+        "totalTracks": library_size,
+        "streamedTracks": library_streamed_count,
     })
-playlist_hours_list.sort(key=lambda x: x["hours"], reverse=True)
-
-# Insert Liked Songs library into the ranked list
-playlist_hours_list.append({
-    "name": "Liked Songs",
-    "hours": round(library_stream_hours, 1),
-    "totalTracks": library_size,
-    "streamedTracks": library_streamed_count,
-})
-playlist_hours_list.sort(key=lambda x: x["hours"], reverse=True)
-
-# Dead playlists: < 10% of tracks ever streamed
-dead_playlists = []
-for entry in playlist_hours_list:
-    if entry["totalTracks"] >= 5:
-        stream_rate = entry["streamedTracks"] / entry["totalTracks"]
-        if stream_rate < 0.10:
-            dead_playlists.append({
-                "name": entry["name"],
-                "totalTracks": entry["totalTracks"],
-                "streamedTracks": entry["streamedTracks"],
-            })
+    playlist_hours_list.sort(key=lambda x: x["hours"], reverse=True)
+
+    # Dead playlists: < 10% of tracks ever streamed
+    dead_playlists = []
+    for entry in playlist_hours_list:
+        if entry["totalTracks"] >= 5:
+            stream_rate = entry["streamedTracks"] / entry["totalTracks"]
+            if stream_rate < 0.10:
+                dead_playlists.append({
+                    "name": entry["name"],
+                    "totalTracks": entry["totalTracks"],
+                    "streamedTracks": entry["streamedTracks"],
+                })
+
+    # Discover Weekly Hit Rate
+    dw_name = None
+    for name in playlist_uri_map:
+        if "discover weekly" in name.lower():
+            dw_name = name
+            break
+
+    dw_hit_rate = None
+    if dw_name:
+        dw_uris = playlist_uri_map[dw_name]
+        # Count how many DW tracks were played 3+ times in streaming history
+        dw_play_counts = (
+            music_with_uri[music_with_uri["spotify_track_uri"].isin(dw_uris)]
+            .groupby("spotify_track_uri", observed=True).size()
+        )
+        dw_hits = int((dw_play_counts >= 3).sum())
+        dw_total = len(dw_uris)
+        dw_hit_rate = {
+            "playlistName": dw_name,
+            "totalTracks": dw_total,
+            "hitTracks": dw_hits,
+            "hitRate": round(dw_hits / max(dw_total, 1) * 100, 1),
+        }
 
-# Discover Weekly Hit Rate
-dw_name = None
-for name in playlist_uri_map:
-    if "discover weekly" in name.lower():
-        dw_name = name
-        break
-
-dw_hit_rate = None
-if dw_name:
-    dw_uris = playlist_uri_map[dw_name]
-    # Count how many DW tracks were played 3+ times in streaming history
-    dw_play_counts = (
-        music_with_uri[music_with_uri["spotify_track_uri"].isin(dw_uris)]
-        .groupby("spotify_track_uri").size()
-    )
-    dw_hits = int((dw_play_counts >= 3).sum())
-    dw_total = len(dw_uris)
-    dw_hit_rate = {
-        "playlistName": dw_name,
-        "totalTracks": dw_total,
-        "hitTracks": dw_hits,
-        "hitRate": round(dw_hits / max(dw_total, 1) * 100, 1),
+    stats["playlistStreamOverlap"] = {
+        "loyaltyScore": playlist_loyalty_score,
+        "playlistHours": playlist_stream_hours,
+        "libraryLoyaltyScore": library_loyalty_score,
+        "libraryStreamHours": round(library_stream_hours, 1),
+        "libraryTotalTracks": library_size,
+        "libraryStreamedTracks": library_streamed_count,
+        "combinedLoyaltyScore": combined_loyalty_score,
+        "combinedStreamHours": round(combined_stream_hours, 1),
+        "mostPlayedPlaylists": playlist_hours_list[:15],
+        "deadPlaylists": dead_playlists[:10],
+        "discoverWeeklyHitRate": dw_hit_rate,
     }
+    print(f"  Playlist loyalty: {playlist_loyalty_score}%, Library loyalty: {library_loyalty_score}%, Combined: {combined_loyalty_score}%, DW hit rate: {dw_hit_rate}")
 
-stats["playlistStreamOverlap"] = {
-    "loyaltyScore": playlist_loyalty_score,
-    "playlistHours": playlist_stream_hours,
-    "libraryLoyaltyScore": library_loyalty_score,
-    "libraryStreamHours": round(library_stream_hours, 1),
-    "libraryTotalTracks": library_size,
-    "libraryStreamedTracks": library_streamed_count,
-    "combinedLoyaltyScore": combined_loyalty_score,
-    "combinedStreamHours": round(combined_stream_hours, 1),
-    "mostPlayedPlaylists": playlist_hours_list[:15],
-    "deadPlaylists": dead_playlists[:10],
-    "discoverWeeklyHitRate": dw_hit_rate,
-}
-print(f"  Playlist loyalty: {playlist_loyalty_score}%, Library loyalty: {library_loyalty_score}%, Combined: {combined_loyalty_score}%, DW hit rate: {dw_hit_rate}")
 
 # ---------------------------------------------------------------------------
 # 3f. Search-to-Listen Pipeline (cross-dataset)
 # ---------------------------------------------------------------------------
-print("Computing search-to-listen pipeline …")
-
-if len(search_df) > 0 and "meaningful" in dir() and len(meaningful) > 0:
-    # Extract artist names from search queries (best effort: match against
-    # known streaming artists)
-    known_artists = set(
-        df["master_metadata_album_artist_name"].dropna().str.lower().unique()
-    )
-
-    # For each meaningful search, try to match query to an artist
-    search_artist_matches = []
-    for _, row in meaningful.iterrows():
-        q = row["query"].lower().strip()
-        if q in known_artists:
-            search_artist_matches.append({
-                "artist": q,
-                "search_ts": row["ts"],
-            })
-
-    # "Search to Obsession": artists searched for → total hours listened after search
-    if search_artist_matches:
-        search_match_df = pd.DataFrame(search_artist_matches)
-        # Get first search date per artist
-        first_search = search_match_df.groupby("artist")["search_ts"].min().reset_index()
-        first_search.columns = ["artist_lower", "first_search_ts"]
-
-        # Join with streaming data to get post-search hours
-        music_lower = music_with_uri.copy()
-        music_lower["artist_lower"] = music_lower["master_metadata_album_artist_name"].str.lower()
-
-        search_obsession = []
-        for _, sr in first_search.iterrows():
-            artist_l = sr["artist_lower"]
-            search_ts = sr["first_search_ts"]
-            post_search = music_lower[
-                (music_lower["artist_lower"] == artist_l) &
-                (music_lower["ts"] >= search_ts)
-            ]
-            hours_after = float(post_search["hours"].sum())
-            # Get display name (proper case) from streaming data
-            display_names = music_lower[music_lower["artist_lower"] == artist_l]["master_metadata_album_artist_name"].dropna()
-            display_name = display_names.iloc[0] if len(display_names) > 0 else artist_l
-            search_obsession.append({
-                "name": display_name,
-                "hours": round(hours_after, 1),
-                "firstSearched": str(search_ts.date()),
-            })
-        search_obsession.sort(key=lambda x: x["hours"], reverse=True)
+@section("searchListenPipeline", needs=["streams", "searches", "music_with_uri"])
+def compute_search_listen_pipeline(ctx: AnalysisContext) -> None:
+    """Searches that turned into repeated listening."""
+    df = ctx.df
+    stats = ctx.stats
+    meaningful = ctx.dataset("searches")
+    music_with_uri = ctx.dataset("music_with_uri")
+    print("Computing search-to-listen pipeline …")
+
+    if len(meaningful) > 0:
+        # Extract artist names from search queries (best effort: match against
+        # known streaming artists)
+        known_artists = set(
+            df["master_metadata_album_artist_name"].dropna().str.lower().unique()
+        )
 
-        # "Impulse Listener": searches followed by a stream within 5 minutes
-        impulse_count = 0
+        # For each meaningful search, try to match query to an artist
+        search_artist_matches = []
         for _, row in meaningful.iterrows():
             q = row["query"].lower().strip()
-            search_ts = row["ts"]
-            five_min_later = search_ts + pd.Timedelta(minutes=5)
-            # Check if there's a stream of the same artist within 5 min
-            nearby_streams = music_lower[
-                (music_lower["artist_lower"] == q) &
-                (music_lower["ts"] >= search_ts) &
-                (music_lower["ts"] <= five_min_later)
-            ]
-            if len(nearby_streams) > 0:
-                impulse_count += 1
-
-        impulse_pct = round(impulse_count / max(len(meaningful), 1) * 100, 1)
-
-        # Average search-to-first-listen gap (for matched artists)
-        gaps = []
-        for _, sr in first_search.iterrows():
-            artist_l = sr["artist_lower"]
-            search_ts = sr["first_search_ts"]
-            first_listen_after = music_lower[
-                (music_lower["artist_lower"] == artist_l) &
-                (music_lower["ts"] >= search_ts)
-            ]["ts"].min()
-            if pd.notna(first_listen_after):
-                gap_minutes = (first_listen_after - search_ts).total_seconds() / 60
-                if gap_minutes >= 0:
-                    gaps.append(gap_minutes)
-        avg_gap_minutes = round(np.mean(gaps), 1) if gaps else 0
-
-        stats["searchListenPipeline"] = {
-            "searchToObsession": search_obsession[:10],
-            "impulsePct": impulse_pct,
-            "impulseCount": impulse_count,
-            "avgGapMinutes": avg_gap_minutes,
-        }
-        print(f"  {len(search_obsession)} artist matches, {impulse_pct}% impulse, avg gap {avg_gap_minutes} min")
+            if q in known_artists:
+                search_artist_matches.append({
+                    "artist": q,
+                    "search_ts": row["ts"],
+                })
+
+        # "Search to Obsession": artists searched for → total hours listened after search
+        if search_artist_matches:
+            search_match_df = pd.DataFrame(search_artist_matches)
+            # Get first search date per artist
+            first_search = search_match_df.groupby("artist")["search_ts"].min().reset_index()
+            first_search.columns = ["artist_lower", "first_search_ts"]
+
+            # Join with streaming data to get post-search hours
+            music_lower = music_with_uri
+            artist_lower = music_lower["master_metadata_album_artist_name"].str.lower()
+
+            search_obsession = []
+            for _, sr in first_search.iterrows():
+                artist_l = sr["artist_lower"]
+                search_ts = sr["first_search_ts"]
+                post_search = music_lower[
+                    (artist_lower == artist_l) &
+                    (music_lower["ts"] >= search_ts)
+                ]
+                hours_after = float(post_search["hours"].sum())
+                # Get display name (proper case) from streaming data
+                display_names = music_lower[artist_lower == artist_l]["master_metadata_album_artist_name"].dropna()
+                display_name = display_names.iloc[0] if len(display_names) > 0 else artist_l
+                search_obsession.append({
+                    "name": display_name,
+                    "hours": round(hours_after, 1),
+                    "firstSearched": str(search_ts.date()),
+                })
+            search_obsession.sort(key=lambda x: x["hours"], reverse=True)
+
+            # "Impulse Listener": searches followed by a stream within 5 minutes
+            impulse_count = 0
+            for _, row in meaningful.iterrows():
+                q = row["query"].lower().strip()
+                search_ts = row["ts"]
+                five_min_later = search_ts + pd.Timedelta(minutes=5)
+                # Check if there's a stream of the same artist within 5 min
+                nearby_streams = music_lower[
+                    (artist_lower == q) &
+                    (music_lower["ts"] >= search_ts) &
+                    (music_lower["ts"] <= five_min_later)
+                ]
+                if len(nearby_streams) > 0:
+                    impulse_count += 1
+
+            impulse_pct = round(impulse_count / max(len(meaningful), 1) * 100, 1)
+
+            # Average search-to-first-listen gap (for matched artists)
+            gaps = []
+            for _, sr in first_search.iterrows():
+                artist_l = sr["artist_lower"]
+                search_ts = sr["first_search_ts"]
+                first_listen_after = music_lower[
+                    (artist_lower == artist_l) &
+                    (music_lower["ts"] >= search_ts)
+                ]["ts"].min()
+                if pd.notna(first_listen_after):
+                    gap_minutes = (first_listen_after - search_ts).total_seconds() / 60
+                    if gap_minutes >= 0:
+                        gaps.append(gap_minutes)
+            avg_gap_minutes = round(np.mean(gaps), 1) if gaps else 0
+
+            stats["searchListenPipeline"] = {
+                "searchToObsession": search_obsession[:10],
+                "impulsePct": impulse_pct,
+                "impulseCount": impulse_count,
+                "avgGapMinutes": avg_gap_minutes,
+            }
+            print(f"  {len(search_obsession)} artist matches, {impulse_pct}% impulse, avg gap {avg_gap_minutes} min")
+        else:
+            stats["searchListenPipeline"] = {
+                "searchToObsession": [], "impulsePct": 0, "impulseCount": 0, "avgGapMinutes": 0,
+            }
     else:
         stats["searchListenPipeline"] = {
             "searchToObsession": [], "impulsePct": 0, "impulseCount": 0, "avgGapMinutes": 0,
         }
-else:
-    stats["searchListenPipeline"] = {
-        "searchToObsession": [], "impulsePct": 0, "impulseCount": 0, "avgGapMinutes": 0,
-    }
+
 
 # ===========================================================================
 # 4. Spotify Technical Log Information metrics
 # ===========================================================================
-TECHLOG_DIR = "../Spotify Technical Log Information/"
-
-# Helper: load and concatenate numbered JSON files
-def load_numbered_json(prefix: str, directory: str = TECHLOG_DIR) -> pd.DataFrame:
-    """Load files like AddedToPlaylist_0.json, AddedToPlaylist_1.json, …"""
-    pattern = os.path.join(directory, f"{prefix}_*.json")
-    files = sorted(glob.glob(pattern))
-    if not files:
-        # Try single file (no number suffix)
-        single = os.path.join(directory, f"{prefix}.json")
-        if os.path.exists(single):
-            files = [single]
-    frames = []
-    for fp in files:
-        with open(fp, "r") as fh:
-            data = json.load(fh)
-        if isinstance(data, list) and len(data) > 0:
-            frames.append(pd.DataFrame(data))
-    if frames:
-        return pd.concat(frames, ignore_index=True)
-    return pd.DataFrame()
-
-def load_single_json(filename: str, directory: str = TECHLOG_DIR) -> pd.DataFrame:
-    """Load a single JSON array file."""
-    fp = os.path.join(directory, filename)
-    if not os.path.exists(fp):
-        return pd.DataFrame()
-    with open(fp, "r") as fh:
-        data = json.load(fh)
-    if isinstance(data, list) and len(data) > 0:
-        return pd.DataFrame(data)
-    return pd.DataFrame()
+def weighted_percentile(values: np.ndarray, counts: np.ndarray, q: float) -> float:
+    """np.percentile(..., q) (linear interpolation) of `values` repeated `counts` times.
+
+    `values` must be sorted ascending.
+    """
+    total = int(counts.sum())
+    rank = q / 100 * (total - 1)
+    lo, hi = int(np.floor(rank)), int(np.ceil(rank))
+    cum = np.cumsum(counts)
+    v_lo = values[np.searchsorted(cum, lo, side="right")]
+    v_hi = values[np.searchsorted(cum, hi, side="right")]
+    return float(v_lo + (v_hi - v_lo) * (rank - lo))
 
 DOW_NAMES_FULL = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 # ---------------------------------------------------------------------------
 # 4a. Playlist Curation Behavior
 # ---------------------------------------------------------------------------
-print("Computing playlist curation behavior …")
+def compute_curation_stats(added_tracks, removed_tracks, stream_plays):
+    """Compute all playlist curation metrics for a given set of adds/removes.
 
-def compute_curation_stats(added_tracks, removed_tracks, streaming_df):
-    """Compute all playlist curation metrics for a given set of adds/removes."""
+    `stream_plays` holds the streams that have a track URI (see `rows("uri", ...)`).
+    """
     total_adds = len(added_tracks)
     total_removes = len(removed_tracks)
 
     # Date range for velocity
-    all_dates = pd.concat([added_tracks["ts"], removed_tracks["ts"]]) if total_adds + total_removes > 0 else pd.Series(dtype="datetime64[ns, US/Eastern]")
+    all_dates = pd.concat([added_tracks["ts"], removed_tracks["ts"]]) if total_adds + total_removes > 0 else pd.Series(dtype=pd.DatetimeTZDtype(tz=LOCAL_TZ))
     if len(all_dates) > 0:
         date_range_weeks = max((all_dates.max() - all_dates.min()).days / 7, 1)
     else:
@@ -1415,10 +3005,12 @@ def compute_curation_stats(added_tracks, removed_tracks, streaming_df):
     if (total_adds > 0 and total_removes > 0
             and "message_item_uri" in added_tracks.columns
             and "message_item_uri" in removed_tracks.columns):
-        add_lookup = added_tracks[["message_item_uri", "message_playlist_uri", "ts"]].copy()
-        add_lookup.columns = ["track_uri", "playlist_uri", "add_ts"]
-        rem_lookup = removed_tracks[["message_item_uri", "message_playlist_uri", "ts"]].copy()
-        rem_lookup.columns = ["track_uri", "playlist_uri", "rem_ts"]
+        add_lookup = added_tracks[["message_item_uri", "message_playlist_uri", "ts"]].set_axis(
+            ["track_uri", "playlist_uri", "add_ts"], axis=1
+        )
+        rem_lookup = removed_tracks[["message_item_uri", "message_playlist_uri", "ts"]].set_axis(
+            ["track_uri", "playlist_uri", "rem_ts"], axis=1
+        )
 
         regret_merged = pd.merge(add_lookup, rem_lookup, on=["track_uri", "playlist_uri"])
         regret_merged["gap_days"] = (regret_merged["rem_ts"] - regret_merged["add_ts"]).dt.total_seconds() / 86400
@@ -1434,8 +3026,8 @@ def compute_curation_stats(added_tracks, removed_tracks, streaming_df):
     impulse_bins = {"< 1 hour": 0, "< 1 day": 0, "< 1 week": 0, "< 1 month": 0, "1+ months": 0}
     if total_adds > 0 and "message_item_uri" in added_tracks.columns:
         stream_first = (
-            streaming_df[streaming_df["spotify_track_uri"].notna()]
-            .groupby("spotify_track_uri")["ts"]
+            stream_plays
+            .groupby("spotify_track_uri", observed=True)["ts"]
             .min()
             .reset_index()
         )
@@ -1472,11 +3064,9 @@ def compute_curation_stats(added_tracks, removed_tracks, streaming_df):
         add_records = added_tracks[["message_item_uri", "ts"]].rename(
             columns={"message_item_uri": "track_uri", "ts": "add_ts"}
         )
-        stream_events = streaming_df[streaming_df["spotify_track_uri"].notna()][["spotify_track_uri", "ts"]].copy()
-        stream_events.columns = ["track_uri", "stream_ts"]
-
         add_latest = add_records.groupby("track_uri")["add_ts"].max().reset_index()
-        stream_latest = stream_events.groupby("track_uri")["stream_ts"].max().reset_index()
+        stream_latest = stream_plays.groupby("spotify_track_uri", observed=True)["ts"].max().reset_index()
+        stream_latest.columns = ["track_uri", "stream_ts"]
 
         abandon_check = pd.merge(add_latest, stream_latest, on="track_uri", how="left")
         abandon_check["abandoned"] = (
@@ -1488,7 +3078,7 @@ def compute_curation_stats(added_tracks, removed_tracks, streaming_df):
         abandoned_pct = round(abandoned_count / max(total_unique_adds, 1) * 100, 1)
 
         abandoned_uris = set(abandon_check[abandon_check["abandoned"]]["track_uri"].head(50))
-        named_tracks = streaming_df[streaming_df["spotify_track_uri"].isin(abandoned_uris)].drop_duplicates("spotify_track_uri")[
+        named_tracks = stream_plays[stream_plays["spotify_track_uri"].isin(abandoned_uris)].drop_duplicates("spotify_track_uri")[
             ["spotify_track_uri", "master_metadata_track_name", "master_metadata_album_artist_name"]
         ]
         for _, row in named_tracks.head(10).iterrows():
@@ -1512,520 +3102,1432 @@ def compute_curation_stats(added_tracks, removed_tracks, streaming_df):
         "abandonedExamples": abandoned_tracks_list,
     }
 
-
 EMPTY_CURATION = {
     "totalAdds": 0, "totalRemoves": 0, "addsPerWeek": 0, "removesPerWeek": 0,
     "churnOverTime": [], "curationHeatmap": [], "regretCount": 0, "regretPct": 0,
     "impulseAddTiming": [], "abandonedCount": 0, "abandonedPct": 0, "abandonedExamples": [],
 }
 
-added_df = load_numbered_json("AddedToPlaylist")
-removed_df = load_numbered_json("RemovedFromPlaylist")
-
-if len(added_df) > 0 and len(removed_df) > 0:
-    # Parse timestamps
-    added_df["ts"] = pd.to_datetime(added_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    removed_df["ts"] = pd.to_datetime(removed_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-
-    added_df["date"] = added_df["ts"].dt.date
-    removed_df["date"] = removed_df["ts"].dt.date
-    added_df["week"] = added_df["ts"].dt.to_period("W").astype(str)
-    removed_df["week"] = removed_df["ts"].dt.to_period("W").astype(str)
-    added_df["hour_of_day"] = added_df["ts"].dt.hour
-    added_df["day_of_week"] = added_df["ts"].dt.dayofweek
-    removed_df["hour_of_day"] = removed_df["ts"].dt.hour
-    removed_df["day_of_week"] = removed_df["ts"].dt.dayofweek
-
-    # Filter to track items only
-    added_tracks = added_df[added_df.get("message_item_uri_kind", pd.Series(dtype=str)).eq("track")].copy()
-    removed_tracks = removed_df[removed_df.get("message_item_uri_kind", pd.Series(dtype=str)).eq("track")].copy()
-
-    # Compute stats for ALL activity
-    all_stats = compute_curation_stats(added_tracks, removed_tracks, df)
-    print(f"  ALL: {all_stats['totalAdds']:,} adds, {all_stats['totalRemoves']:,} removes, {all_stats['regretCount']} regrets, {all_stats['abandonedCount']} abandoned")
-
-    # Compute stats for USER-ONLY activity (message_client_platform is not null)
-    user_added = added_tracks[added_tracks["message_client_platform"].notna()].copy() if "message_client_platform" in added_tracks.columns else added_tracks.iloc[0:0].copy()
-    user_removed = removed_tracks[removed_tracks["message_client_platform"].notna()].copy() if "message_client_platform" in removed_tracks.columns else removed_tracks.iloc[0:0].copy()
-    user_stats = compute_curation_stats(user_added, user_removed, df)
-    print(f"  USER: {user_stats['totalAdds']:,} adds, {user_stats['totalRemoves']:,} removes, {user_stats['regretCount']} regrets, {user_stats['abandonedCount']} abandoned")
-
-    stats["playlistCuration"] = {
-        "all": all_stats,
-        "userOnly": user_stats,
-    }
-else:
-    stats["playlistCuration"] = {
-        "all": EMPTY_CURATION,
-        "userOnly": EMPTY_CURATION,
-    }
+
+@section("playlistCuration", needs=["playlist_edits", "row_subsets"])
+def compute_playlist_curation(ctx: AnalysisContext) -> None:
+    """Playlist add/remove behaviour from the technical logs."""
+    stats = ctx.stats
+    rows = ctx.rows
+    print("Computing playlist curation behavior …")
+
+    edits = ctx.dataset("playlist_edits")
+    added_df, removed_df = edits["added"], edits["removed"]
+
+    if len(added_df) > 0 and len(removed_df) > 0:
+        # Filter to track items only
+        added_tracks = added_df[added_df.get("message_item_uri_kind", pd.Series(dtype=str)).eq("track")]
+        removed_tracks = removed_df[removed_df.get("message_item_uri_kind", pd.Series(dtype=str)).eq("track")]
+
+        # Streams with a track URI, shared by both scopes
+        stream_plays = rows(
+            "uri", "spotify_track_uri", "ts", "master_metadata_track_name", "master_metadata_album_artist_name"
+        )
+
+        # Compute stats for ALL activity
+        all_stats = compute_curation_stats(added_tracks, removed_tracks, stream_plays)
+        print(f"  ALL: {all_stats['totalAdds']:,} adds, {all_stats['totalRemoves']:,} removes, {all_stats['regretCount']} regrets, {all_stats['abandonedCount']} abandoned")
+
+        # Compute stats for USER-ONLY activity (message_client_platform is not null)
+        user_added = added_tracks[added_tracks["message_client_platform"].notna()] if "message_client_platform" in added_tracks.columns else added_tracks.iloc[0:0]
+        user_removed = removed_tracks[removed_tracks["message_client_platform"].notna()] if "message_client_platform" in removed_tracks.columns else removed_tracks.iloc[0:0]
+        user_stats = compute_curation_stats(user_added, user_removed, stream_plays)
+        print(f"  USER: {user_stats['totalAdds']:,} adds, {user_stats['totalRemoves']:,} removes, {user_stats['regretCount']} regrets, {user_stats['abandonedCount']} abandoned")
+
+        stats["playlistCuration"] = {
+            "all": all_stats,
+            "userOnly": user_stats,
+        }
+    else:
+        stats["playlistCuration"] = {
+            "all": EMPTY_CURATION,
+            "userOnly": EMPTY_CURATION,
+        }
+
 
 # ---------------------------------------------------------------------------
 # 4b. Playback Quality & Reliability
 # ---------------------------------------------------------------------------
-print("Computing playback quality metrics …")
-
-errors_df = load_single_json("PlaybackError_Hourly.json")
-stutter_df = load_single_json("Stutter_Hourly.json")
-download_df = load_single_json("Download_Hourly.json")
-
-# Audio Quality Profile (bitrate distribution from downloads)
-bitrate_distribution = []
-if len(download_df) > 0 and "message_bitrate" in download_df.columns:
-    bitrate_counts = download_df["message_bitrate"].value_counts().reset_index()
-    bitrate_counts.columns = ["bitrate", "count"]
-    bitrate_distribution = [
-        {"bitrate": f"{int(r['bitrate'] / 1000)}kbps", "count": int(r["count"])}
-        for _, r in bitrate_counts.iterrows()
-        if pd.notna(r["bitrate"]) and r["bitrate"] > 0
-    ]
+@section(
+    "playbackQuality",
+    inputs=[("techlog", "PlaybackError*.json"), ("techlog", "Stutter*.json"), ("techlog", "Download_Hourly*.json")],
+    needs=["streams"],
+)
+def compute_playback_quality(ctx: AnalysisContext) -> None:
+    """Playback errors, stutters and download bitrates."""
+    df = ctx.df
+    stats = ctx.stats
+    print("Computing playback quality metrics …")
+
+    errors_df = load_single_json("PlaybackError_Hourly.json")
+    stutter_df = load_single_json("Stutter_Hourly.json")
+    download_df = load_single_json("Download_Hourly.json")
+
+    # Audio Quality Profile (bitrate distribution from downloads)
+    bitrate_distribution = []
+    if len(download_df) > 0 and "message_bitrate" in download_df.columns:
+        bitrate_counts = download_df["message_bitrate"].value_counts().reset_index()
+        bitrate_counts.columns = ["bitrate", "count"]
+        bitrate_distribution = [
+            {"bitrate": f"{int(r['bitrate'] / 1000)}kbps", "count": int(r["count"])}
+            for _, r in bitrate_counts.iterrows()
+            if pd.notna(r["bitrate"]) and r["bitrate"] > 0
+        ]
 
-# Playback Error Rate Over Time
-error_over_time = []
-total_errors = 0
-fatal_errors = 0
-if len(errors_df) > 0:
-    errors_df["ts"] = pd.to_datetime(errors_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    errors_df["week"] = errors_df["ts"].dt.to_period("W").astype(str)
-    total_errors = len(errors_df)
-    fatal_errors = int(errors_df["message_fatal"].sum()) if "message_fatal" in errors_df.columns else 0
-
-    weekly_errors = errors_df.groupby("week").agg(
-        total=("message_fatal", "count"),
-        fatal=("message_fatal", "sum"),
-    ).reset_index()
-    weekly_errors = weekly_errors.sort_values("week")
-    error_over_time = [
-        {"week": r["week"], "total": int(r["total"]), "fatal": int(r["fatal"])}
-        for _, r in weekly_errors.iterrows()
-    ]
+    # Playback Error Rate Over Time
+    error_over_time = []
+    total_errors = 0
+    fatal_errors = 0
+    if len(errors_df) > 0:
+        errors_df["ts"] = pd.to_datetime(errors_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        errors_df["week"] = errors_df["ts"].dt.to_period("W").astype(str)
+        total_errors = len(errors_df)
+        fatal_errors = int(errors_df["message_fatal"].sum()) if "message_fatal" in errors_df.columns else 0
+
+        weekly_errors = errors_df.groupby("week").agg(
+            total=("message_fatal", "count"),
+            fatal=("message_fatal", "sum"),
+        ).reset_index()
+        weekly_errors = weekly_errors.sort_values("week")
+        error_over_time = [
+            {"week": r["week"], "total": int(r["total"]), "fatal": int(r["fatal"])}
+            for _, r in weekly_errors.iterrows()
+        ]
 
-# Stutter Timeline
-stutter_timeline = []
-total_stutters = 0
-if len(stutter_df) > 0:
-    stutter_df["ts"] = pd.to_datetime(stutter_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    stutter_df["week"] = stutter_df["ts"].dt.to_period("W").astype(str)
-    total_stutters = len(stutter_df)
-    weekly_stutters = stutter_df.groupby("week").size().reset_index(name="count")
-    weekly_stutters = weekly_stutters.sort_values("week")
-    stutter_timeline = [
-        {"week": r["week"], "count": int(r["count"])}
-        for _, r in weekly_stutters.iterrows()
-    ]
+    # Stutter Timeline
+    stutter_timeline = []
+    total_stutters = 0
+    if len(stutter_df) > 0:
+        stutter_df["ts"] = pd.to_datetime(stutter_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        stutter_df["week"] = stutter_df["ts"].dt.to_period("W").astype(str)
+        total_stutters = len(stutter_df)
+        weekly_stutters = stutter_df.groupby("week").size().reset_index(name="count")
+        weekly_stutters = weekly_stutters.sort_values("week")
+        stutter_timeline = [
+            {"week": r["week"], "count": int(r["count"])}
+            for _, r in weekly_stutters.iterrows()
+        ]
 
-# Error Tolerance (cross-ref: after playback error, did user retry or skip?)
-error_tolerance_retry = 0
-error_tolerance_skip = 0
-if len(errors_df) > 0 and "message_track_id" in errors_df.columns:
-    for _, err_row in errors_df.iterrows():
-        err_track = err_row.get("message_track_id")
-        err_ts = err_row["ts"]
-        if not err_track or pd.isna(err_ts):
-            continue
-        # Look for next stream within 10 minutes in extended history
-        window_end = err_ts + pd.Timedelta(minutes=10)
-        next_streams = df[(df["ts"] >= err_ts) & (df["ts"] <= window_end)].head(3)
-        if len(next_streams) > 0:
-            # Check if any of the next streams is the same track (retry)
-            next_uris = set(next_streams["spotify_track_uri"].dropna())
-            if err_track in next_uris:
-                error_tolerance_retry += 1
+    # Error Tolerance (cross-ref: after playback error, did user retry or skip?)
+    error_tolerance_retry = 0
+    error_tolerance_skip = 0
+    if len(errors_df) > 0 and "message_track_id" in errors_df.columns:
+        for _, err_row in errors_df.iterrows():
+            err_track = err_row.get("message_track_id")
+            err_ts = err_row["ts"]
+            if not err_track or pd.isna(err_ts):
+                continue
+            # Look for next stream within 10 minutes in extended history
+            window_end = err_ts + pd.Timedelta(minutes=10)
+            next_streams = df[(df["ts"] >= err_ts) & (df["ts"] <= window_end)].head(3)
+            if len(next_streams) > 0:
+                # Check if any of the next streams is the same track (retry)
+                next_uris = set(next_streams["spotify_track_uri"].dropna())
+                if err_track in next_uris:
+                    error_tolerance_retry += 1
+                else:
+                    error_tolerance_skip += 1
             else:
                 error_tolerance_skip += 1
-        else:
-            error_tolerance_skip += 1
-error_tolerance_total = error_tolerance_retry + error_tolerance_skip
-error_tolerance_retry_pct = round(
-    error_tolerance_retry / max(error_tolerance_total, 1) * 100, 1
-)
+    error_tolerance_total = error_tolerance_retry + error_tolerance_skip
+    error_tolerance_retry_pct = round(
+        error_tolerance_retry / max(error_tolerance_total, 1) * 100, 1
+    )
 
-# Download vs Stream: use offline field from extended streaming history (already computed)
-# We'll provide download counts over time from the download log
-download_over_time = []
-if len(download_df) > 0:
-    download_df["ts"] = pd.to_datetime(download_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    download_df["week"] = download_df["ts"].dt.to_period("W").astype(str)
-    dl_weekly = download_df.groupby("week").size().reset_index(name="downloads")
-    dl_weekly = dl_weekly.sort_values("week")
-    download_over_time = [
-        {"week": r["week"], "downloads": int(r["downloads"])}
-        for _, r in dl_weekly.iterrows()
-    ]
+    # Download vs Stream: use offline field from extended streaming history (already computed)
+    # We'll provide download counts over time from the download log
+    download_over_time = []
+    if len(download_df) > 0:
+        download_df["ts"] = pd.to_datetime(download_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        download_df["week"] = download_df["ts"].dt.to_period("W").astype(str)
+        dl_weekly = download_df.groupby("week").size().reset_index(name="downloads")
+        dl_weekly = dl_weekly.sort_values("week")
+        download_over_time = [
+            {"week": r["week"], "downloads": int(r["downloads"])}
+            for _, r in dl_weekly.iterrows()
+        ]
+
+    stats["playbackQuality"] = {
+        "bitrateDistribution": bitrate_distribution,
+        "totalErrors": total_errors,
+        "fatalErrors": fatal_errors,
+        "errorOverTime": error_over_time,
+        "totalStutters": total_stutters,
+        "stutterTimeline": stutter_timeline,
+        "errorToleranceRetryPct": error_tolerance_retry_pct,
+        "errorToleranceRetries": error_tolerance_retry,
+        "errorToleranceSkips": error_tolerance_skip,
+        "downloadOverTime": download_over_time,
+    }
+    print(f"  {total_errors} errors ({fatal_errors} fatal), {total_stutters} stutters, retry rate {error_tolerance_retry_pct}%")
 
-stats["playbackQuality"] = {
-    "bitrateDistribution": bitrate_distribution,
-    "totalErrors": total_errors,
-    "fatalErrors": fatal_errors,
-    "errorOverTime": error_over_time,
-    "totalStutters": total_stutters,
-    "stutterTimeline": stutter_timeline,
-    "errorToleranceRetryPct": error_tolerance_retry_pct,
-    "errorToleranceRetries": error_tolerance_retry,
-    "errorToleranceSkips": error_tolerance_skip,
-    "downloadOverTime": download_over_time,
-}
-print(f"  {total_errors} errors ({fatal_errors} fatal), {total_stutters} stutters, retry rate {error_tolerance_retry_pct}%")
 
 # ---------------------------------------------------------------------------
 # 4c. Social Listening & Sharing
 # ---------------------------------------------------------------------------
-print("Computing social & sharing metrics …")
-
-social_created_df = load_single_json("SocialConnectSessionCreated.json")
-social_ended_df = load_single_json("SocialConnectSessionEnded.json")
-share_df = load_single_json("Share.json")
-
-# Social session stats
-social_sessions = []
-total_social_sessions = 0
-avg_session_minutes = 0
-longest_session_minutes = 0
-total_social_hours = 0
-
-if len(social_created_df) > 0 and len(social_ended_df) > 0:
-    social_created_df["ts"] = pd.to_datetime(social_created_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    social_ended_df["ts"] = pd.to_datetime(social_ended_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-
-    # Match sessions by session_id
-    if "message_session_id" in social_created_df.columns and "message_session_id" in social_ended_df.columns:
-        created_by_id = social_created_df.groupby("message_session_id")["ts"].min().reset_index()
-        created_by_id.columns = ["session_id", "start_ts"]
-        ended_by_id = social_ended_df.groupby("message_session_id")["ts"].max().reset_index()
-        ended_by_id.columns = ["session_id", "end_ts"]
-
-        sessions_merged = pd.merge(created_by_id, ended_by_id, on="session_id", how="inner")
-        sessions_merged["duration_minutes"] = (
-            (sessions_merged["end_ts"] - sessions_merged["start_ts"]).dt.total_seconds() / 60
+SOCIAL_TOP_ARTISTS = 10
+
+
+def interval_union(starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Merge [start, end) intervals into sorted, disjoint ones with a single sweep."""
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    if len(starts) == 0:
+        return starts, ends
+    reach = np.maximum.accumulate(ends)
+    # A new interval begins where the start lies past everything seen so far
+    opens = np.ones(len(starts), dtype=bool)
+    opens[1:] = starts[1:] > reach[:-1]
+    first = np.flatnonzero(opens)
+    last = np.append(first[1:], len(starts)) - 1
+    return starts[first], reach[last]
+
+
+def overlap_with_union(starts: np.ndarray, ends: np.ndarray, union_starts: np.ndarray, union_ends: np.ndarray) -> np.ndarray:
+    """Length of each [start, end) covered by the disjoint, sorted union intervals.
+
+    covered(t), the union's length before t, is a prefix sum plus one clipped
+    interval found by binary search, so each query is covered(end) -
+    covered(start): O((n + m) log m) for n queries against m intervals.
+    """
+    if len(union_starts) == 0:
+        return np.zeros(len(starts), dtype=np.int64)
+    lengths = union_ends - union_starts
+    before = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    def covered(t: np.ndarray) -> np.ndarray:
+        k = np.searchsorted(union_starts, t, side="right") - 1
+        inside = np.clip(t - union_starts[np.maximum(k, 0)], 0, lengths[np.maximum(k, 0)])
+        return np.where(k >= 0, before[np.maximum(k, 0)] + inside, 0)
+
+    return covered(ends) - covered(starts)
+
+
+def inside_union(t: np.ndarray, union_starts: np.ndarray, union_ends: np.ndarray) -> np.ndarray:
+    """Whether each time falls inside one of the disjoint, sorted union intervals."""
+    if len(union_starts) == 0:
+        return np.zeros(len(t), dtype=bool)
+    k = np.searchsorted(union_starts, t, side="right") - 1
+    return (k >= 0) & (t < union_ends[np.maximum(k, 0)])
+
+
+def social_listening_overlap(df: pd.DataFrame, session_starts: np.ndarray, session_ends: np.ndarray) -> dict:
+    """Hours, plays, skip rate and top artists of streams inside social sessions versus solo ones.
+
+    Hours count the part of each stream that overlaps a session. Plays, skips
+    and the social/solo split of a play go by its midpoint.
+    """
+    union_starts, union_ends = interval_union(session_starts, session_ends)
+    end_ns = ts_ns(df)
+    ms = df["ms_played"].to_numpy().astype(np.int64)
+    start_ns = end_ns - ms * 1_000_000
+    social_ms = overlap_with_union(start_ns, end_ns, union_starts, union_ends) / 1_000_000
+    midpoint_social = inside_union(start_ns + ms * 500_000, union_starts, union_ends)
+
+    skipped = df["skipped"]
+    skip_known = skipped.notna().to_numpy()
+    is_skip = skipped.fillna(False).to_numpy(dtype=bool)
+    is_music = (df["content_type"] == "music").to_numpy()
+    artist = df["master_metadata_album_artist_name"]
+
+    def summary(hours_ms: np.ndarray, plays: np.ndarray) -> dict:
+        top = (
+            pd.Series(hours_ms[is_music] / 3_600_000, index=artist[is_music].to_numpy())
+            .groupby(level=0, sort=True).sum()
         )
-        # Filter valid sessions (positive duration, < 24 hours)
-        valid_sessions = sessions_merged[
-            (sessions_merged["duration_minutes"] > 0) &
-            (sessions_merged["duration_minutes"] < 1440)
-        ]
-        total_social_sessions = len(valid_sessions)
-        if total_social_sessions > 0:
-            avg_session_minutes = round(float(valid_sessions["duration_minutes"].mean()), 1)
-            longest_session_minutes = round(float(valid_sessions["duration_minutes"].max()), 1)
-            total_social_hours = round(float(valid_sessions["duration_minutes"].sum() / 60), 1)
-            social_sessions = [
-                {
-                    "start": str(r["start_ts"]),
-                    "end": str(r["end_ts"]),
-                    "durationMinutes": round(r["duration_minutes"], 1),
-                }
-                for _, r in valid_sessions.sort_values("start_ts").iterrows()
+        top = top[top > 0].sort_values(ascending=False, kind="stable").head(SOCIAL_TOP_ARTISTS)
+        known = int((skip_known & plays).sum())
+        return {
+            "hours": round(float(hours_ms.sum()) / 3_600_000, 1),
+            "plays": int(plays.sum()),
+            "skipRate": rate_pct(int((is_skip & skip_known & plays).sum()), known) if known else 0,
+            "topArtists": [{"name": str(name), "hours": round(float(h), 2)} for name, h in top.items()],
+        }
+
+    social = summary(social_ms, midpoint_social)
+    solo = summary(ms - social_ms, ~midpoint_social)
+    total = social["hours"] + solo["hours"]
+    return {
+        "socialPct": round(social["hours"] / total * 100, 1) if total else 0,
+        "social": social,
+        "solo": solo,
+    }
+
+
+@section(
+    "socialSharing",
+    inputs=[("techlog", "SocialConnectSession*.json"), ("techlog", "Share.json")],
+    needs=["streams"],
+)
+def compute_social_sharing(ctx: AnalysisContext) -> None:
+    """Social listening sessions and shares."""
+    df = ctx.df
+    stats = ctx.stats
+    print("Computing social & sharing metrics …")
+
+    social_created_df = load_single_json("SocialConnectSessionCreated.json")
+    social_ended_df = load_single_json("SocialConnectSessionEnded.json")
+    share_df = load_single_json("Share.json")
+
+    # Social session stats
+    social_sessions = []
+    total_social_sessions = 0
+    avg_session_minutes = 0
+    longest_session_minutes = 0
+    total_social_hours = 0
+    session_bounds = (np.array([], dtype=np.int64), np.array([], dtype=np.int64))
+
+    if len(social_created_df) > 0 and len(social_ended_df) > 0:
+        social_created_df["ts"] = pd.to_datetime(social_created_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        social_ended_df["ts"] = pd.to_datetime(social_ended_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+
+        # Match sessions by session_id
+        if "message_session_id" in social_created_df.columns and "message_session_id" in social_ended_df.columns:
+            created_by_id = social_created_df.groupby("message_session_id")["ts"].min().reset_index()
+            created_by_id.columns = ["session_id", "start_ts"]
+            ended_by_id = social_ended_df.groupby("message_session_id")["ts"].max().reset_index()
+            ended_by_id.columns = ["session_id", "end_ts"]
+
+            sessions_merged = pd.merge(created_by_id, ended_by_id, on="session_id", how="inner")
+            sessions_merged["duration_minutes"] = (
+                (sessions_merged["end_ts"] - sessions_merged["start_ts"]).dt.total_seconds() / 60
+            )
+            # Filter valid sessions (positive duration, < 24 hours)
+            valid_sessions = sessions_merged[
+                (sessions_merged["duration_minutes"] > 0) &
+                (sessions_merged["duration_minutes"] < 1440)
+            ]
+            total_social_sessions = len(valid_sessions)
+            if total_social_sessions > 0:
+                avg_session_minutes = round(float(valid_sessions["duration_minutes"].mean()), 1)
+                longest_session_minutes = round(float(valid_sessions["duration_minutes"].max()), 1)
+                total_social_hours = round(float(valid_sessions["duration_minutes"].sum() / 60), 1)
+                session_bounds = (utc_ns(valid_sessions["start_ts"]), utc_ns(valid_sessions["end_ts"]))
+                social_sessions = [
+                    {
+                        "start": str(r["start_ts"]),
+                        "end": str(r["end_ts"]),
+                        "durationMinutes": round(r["duration_minutes"], 1),
+                    }
+                    for _, r in valid_sessions.sort_values("start_ts").iterrows()
+                ]
+
+    # Share analysis
+    share_destinations = []
+    share_worthy_threshold = []
+    share_over_time = []
+    share_kind_breakdown = []
+    total_shares = 0
+
+    if len(share_df) > 0:
+        share_df["ts"] = pd.to_datetime(share_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        total_shares = len(share_df)
+
+        # Share destinations
+        if "message_destination_id" in share_df.columns:
+            dest_counts = share_df["message_destination_id"].value_counts().reset_index()
+            dest_counts.columns = ["destination", "count"]
+            share_destinations = [
+                {"destination": str(r["destination"]), "count": int(r["count"])}
+                for _, r in dest_counts.iterrows()
             ]
 
-# Share analysis
-share_destinations = []
-share_worthy_threshold = []
-share_over_time = []
-total_shares = 0
-
-if len(share_df) > 0:
-    share_df["ts"] = pd.to_datetime(share_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    total_shares = len(share_df)
-
-    # Share destinations
-    if "message_destination_id" in share_df.columns:
-        dest_counts = share_df["message_destination_id"].value_counts().reset_index()
-        dest_counts.columns = ["destination", "count"]
-        share_destinations = [
-            {"destination": str(r["destination"]), "count": int(r["count"])}
-            for _, r in dest_counts.iterrows()
+        # Share activity over time (monthly)
+        share_df["month"] = share_df["ts"].dt.to_period("M").astype(str)
+        share_monthly = share_df.groupby("month").size().reset_index(name="count")
+        share_monthly = share_monthly.sort_values("month")
+        share_over_time = [
+            {"month": r["month"], "count": int(r["count"])}
+            for _, r in share_monthly.iterrows()
         ]
 
-    # Share activity over time (monthly)
-    share_df["month"] = share_df["ts"].dt.to_period("M").astype(str)
-    share_monthly = share_df.groupby("month").size().reset_index(name="count")
-    share_monthly = share_monthly.sort_values("month")
-    share_over_time = [
-        {"month": r["month"], "count": int(r["count"])}
-        for _, r in share_monthly.iterrows()
-    ]
+        if "message_entity_uri" in share_df.columns:
+            # What gets shared (tracks, albums, playlists, …)
+            share_kinds = uri_kind(share_df["message_entity_uri"])
+            share_kind_breakdown = [
+                {"kind": str(k), "count": int(c)}
+                for k, c in share_kinds.value_counts().items()
+                if c > 0
+            ]
 
-    # Share-Worthy Threshold (how many times did you listen before sharing?)
-    if "message_entity_uri" in share_df.columns:
-        for _, share_row in share_df.iterrows():
-            entity_uri = share_row.get("message_entity_uri", "")
-            share_ts = share_row["ts"]
-            if not entity_uri or "track" not in str(entity_uri):
-                continue
-            # Count prior streams of this track
-            prior_plays = len(df[
-                (df["spotify_track_uri"] == entity_uri) &
-                (df["ts"] < share_ts)
-            ])
-            # Get track name
-            track_info = df[df["spotify_track_uri"] == entity_uri].head(1)
-            track_name = "Unknown"
-            artist_name = "Unknown"
-            if len(track_info) > 0:
-                track_name = track_info.iloc[0].get("master_metadata_track_name", "Unknown") or "Unknown"
-                artist_name = track_info.iloc[0].get("master_metadata_album_artist_name", "Unknown") or "Unknown"
-            share_worthy_threshold.append({
-                "name": track_name,
-                "artist": artist_name,
-                "priorPlays": prior_plays,
-            })
+            # Share-Worthy Threshold (how many times did you listen before sharing?)
+            for _, share_row in share_df[(share_kinds == "track").to_numpy()].iterrows():
+                entity_uri = share_row["message_entity_uri"]
+                share_ts = share_row["ts"]
+                # Count prior streams of this track
+                prior_plays = len(df[
+                    (df["spotify_track_uri"] == entity_uri) &
+                    (df["ts"] < share_ts)
+                ])
+                # Get track name
+                track_info = df[df["spotify_track_uri"] == entity_uri].head(1)
+                track_name = "Unknown"
+                artist_name = "Unknown"
+                if len(track_info) > 0:
+                    track_name = track_info.iloc[0].get("master_metadata_track_name", "Unknown") or "Unknown"
+                    artist_name = track_info.iloc[0].get("master_metadata_album_artist_name", "Unknown") or "Unknown"
+                share_worthy_threshold.append({
+                    "name": track_name,
+                    "artist": artist_name,
+                    "priorPlays": prior_plays,
+                })
+
+    # What was played during social sessions versus alone
+    listening_overlap = social_listening_overlap(df, *session_bounds)
+
+    stats["socialSharing"] = {
+        "totalSocialSessions": total_social_sessions,
+        "avgSessionMinutes": avg_session_minutes,
+        "longestSessionMinutes": longest_session_minutes,
+        "totalSocialHours": total_social_hours,
+        "sessions": social_sessions,
+        "listeningOverlap": listening_overlap,
+        "totalShares": total_shares,
+        "shareDestinations": share_destinations,
+        "shareOverTime": share_over_time,
+        "shareWorthyThreshold": share_worthy_threshold,
+        "shareKindBreakdown": share_kind_breakdown,
+    }
+    print(f"  {total_social_sessions} social sessions ({listening_overlap['social']['hours']:,} h played during them), "
+          f"{total_shares} shares")
 
-stats["socialSharing"] = {
-    "totalSocialSessions": total_social_sessions,
-    "avgSessionMinutes": avg_session_minutes,
-    "longestSessionMinutes": longest_session_minutes,
-    "totalSocialHours": total_social_hours,
-    "sessions": social_sessions,
-    "totalShares": total_shares,
-    "shareDestinations": share_destinations,
-    "shareOverTime": share_over_time,
-    "shareWorthyThreshold": share_worthy_threshold,
-}
-print(f"  {total_social_sessions} social sessions, {total_shares} shares")
 
 # ---------------------------------------------------------------------------
 # 4d. Device & App Evolution
 # ---------------------------------------------------------------------------
-print("Computing device & app evolution …")
-
-# Collect context fields from multiple technical log files
-device_sources = []
-for src_name in ["RawCoreStream_Hourly", "Download_Hourly", "PlaybackError_Hourly", "Stutter_Hourly"]:
-    src_df = load_single_json(f"{src_name}.json")
-    if len(src_df) > 0:
-        needed_cols = ["timestamp_utc", "context_application_version", "context_device_model",
-                       "context_device_type", "context_os_name", "context_os_version"]
-        available = [c for c in needed_cols if c in src_df.columns]
-        if "timestamp_utc" in available:
-            device_sources.append(src_df[available])
-
-if device_sources:
-    device_df = pd.concat(device_sources, ignore_index=True)
-    device_df["ts"] = pd.to_datetime(device_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    device_df["date"] = device_df["ts"].dt.date
-
-    # App Version Timeline
-    app_version_timeline = []
-    if "context_application_version" in device_df.columns:
-        version_events = device_df[device_df["context_application_version"].notna()].copy()
-        version_by_date = version_events.sort_values("ts").drop_duplicates("context_application_version", keep="first")
-        app_version_timeline = [
-            {"date": str(r["date"]), "version": r["context_application_version"]}
-            for _, r in version_by_date.iterrows()
-        ]
+@section(
+    "deviceEvolution",
+    inputs=[
+        ("techlog", "RawCoreStream_Hourly*.json"),
+        ("techlog", "PlaybackError*.json"),
+        ("techlog", "Stutter*.json"),
+        ("techlog", "Download_Hourly*.json"),
+    ],
+)
+def compute_device_evolution(ctx: AnalysisContext) -> None:
+    """Devices, OS and app versions over time."""
+    stats = ctx.stats
+    print("Computing device & app evolution …")
+
+    # Collect context fields from multiple technical log files
+    device_sources = []
+    for src_name in ["RawCoreStream_Hourly", "Download_Hourly", "PlaybackError_Hourly", "Stutter_Hourly"]:
+        src_df = load_single_json(f"{src_name}.json")
+        if len(src_df) > 0:
+            needed_cols = ["timestamp_utc", "context_application_version", "context_device_model",
+                           "context_device_type", "context_os_name", "context_os_version"]
+            available = [c for c in needed_cols if c in src_df.columns]
+            if "timestamp_utc" in available:
+                device_sources.append(src_df[available])
+
+    if device_sources:
+        device_df = pd.concat(device_sources, ignore_index=True)
+        device_df["ts"] = pd.to_datetime(device_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        device_df["date"] = device_df["ts"].dt.date
+
+        # App Version Timeline
+        app_version_timeline = []
+        if "context_application_version" in device_df.columns:
+            version_events = device_df[device_df["context_application_version"].notna()].copy()
+            version_by_date = version_events.sort_values("ts").drop_duplicates("context_application_version", keep="first")
+            app_version_timeline = [
+                {"date": str(r["date"]), "version": r["context_application_version"]}
+                for _, r in version_by_date.iterrows()
+            ]
 
-    # OS Version History
-    os_version_timeline = []
-    if "context_os_version" in device_df.columns and "context_os_name" in device_df.columns:
-        os_events = device_df[device_df["context_os_version"].notna()].copy()
-        os_events["os_label"] = os_events["context_os_name"].fillna("") + " " + os_events["context_os_version"].fillna("")
-        os_by_date = os_events.sort_values("ts").drop_duplicates("os_label", keep="first")
-        os_version_timeline = [
-            {"date": str(r["date"]), "os": r["os_label"].strip()}
-            for _, r in os_by_date.iterrows()
-        ]
+        # OS Version History
+        os_version_timeline = []
+        if "context_os_version" in device_df.columns and "context_os_name" in device_df.columns:
+            os_events = device_df[device_df["context_os_version"].notna()].copy()
+            os_events["os_label"] = os_events["context_os_name"].fillna("") + " " + os_events["context_os_version"].fillna("")
+            os_by_date = os_events.sort_values("ts").drop_duplicates("os_label", keep="first")
+            os_version_timeline = [
+                {"date": str(r["date"]), "os": r["os_label"].strip()}
+                for _, r in os_by_date.iterrows()
+            ]
 
-    # Device Fingerprint (all devices seen with first/last dates)
-    device_fingerprint = []
-    if "context_device_model" in device_df.columns:
-        device_groups = device_df[device_df["context_device_model"].notna()].groupby("context_device_model")["ts"]
-        for model, ts_series in device_groups:
-            device_fingerprint.append({
-                "model": str(model),
-                "firstSeen": str(ts_series.min().date()),
-                "lastSeen": str(ts_series.max().date()),
-                "eventCount": len(ts_series),
-            })
-        device_fingerprint.sort(key=lambda x: x["eventCount"], reverse=True)
-
-    # Multi-Device Juggler Score (distinct devices per week)
-    multi_device_weekly = []
-    if "context_device_model" in device_df.columns:
-        device_df["week"] = device_df["ts"].dt.to_period("W").astype(str)
-        weekly_devices = device_df[device_df["context_device_model"].notna()].groupby("week")["context_device_model"].nunique().reset_index()
-        weekly_devices.columns = ["week", "deviceCount"]
-        weekly_devices = weekly_devices.sort_values("week")
-        multi_device_weekly = [
-            {"week": r["week"], "deviceCount": int(r["deviceCount"])}
-            for _, r in weekly_devices.iterrows()
-        ]
-    avg_devices_per_week = round(
-        np.mean([d["deviceCount"] for d in multi_device_weekly]), 1
-    ) if multi_device_weekly else 0
-
-    # Auth session patterns (hour-of-day from RawCoreStream as proxy for "when you open Spotify")
-    auth_hour_dist = []
-    raw_stream_df = load_single_json("RawCoreStream_Hourly.json")
-    if len(raw_stream_df) > 0:
-        raw_stream_df["ts"] = pd.to_datetime(raw_stream_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-        raw_stream_df["hour_of_day"] = raw_stream_df["ts"].dt.hour
-        session_hod = raw_stream_df.groupby("hour_of_day").size()
-        auth_hour_dist = [
-            {"hour": int(h), "count": int(session_hod.get(h, 0))} for h in range(24)
-        ]
+        # Device Fingerprint (all devices seen with first/last dates)
+        device_fingerprint = []
+        if "context_device_model" in device_df.columns:
+            device_groups = device_df[device_df["context_device_model"].notna()].groupby("context_device_model")["ts"]
+            for model, ts_series in device_groups:
+                device_fingerprint.append({
+                    "model": str(model),
+                    "firstSeen": str(ts_series.min().date()),
+                    "lastSeen": str(ts_series.max().date()),
+                    "eventCount": len(ts_series),
+                })
+            device_fingerprint.sort(key=lambda x: x["eventCount"], reverse=True)
+
+        # Multi-Device Juggler Score (distinct devices per week)
+        multi_device_weekly = []
+        if "context_device_model" in device_df.columns:
+            device_df["week"] = device_df["ts"].dt.to_period("W").astype(str)
+            weekly_devices = device_df[device_df["context_device_model"].notna()].groupby("week")["context_device_model"].nunique().reset_index()
+            weekly_devices.columns = ["week", "deviceCount"]
+            weekly_devices = weekly_devices.sort_values("week")
+            multi_device_weekly = [
+                {"week": r["week"], "deviceCount": int(r["deviceCount"])}
+                for _, r in weekly_devices.iterrows()
+            ]
+        avg_devices_per_week = round(
+            np.mean([d["deviceCount"] for d in multi_device_weekly]), 1
+        ) if multi_device_weekly else 0
+
+        # Auth session patterns (hour-of-day from RawCoreStream as proxy for "when you open Spotify")
+        auth_hour_dist = []
+        raw_stream_df = load_single_json("RawCoreStream_Hourly.json")
+        if len(raw_stream_df) > 0:
+            raw_stream_df["ts"] = pd.to_datetime(raw_stream_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+            raw_stream_df["hour_of_day"] = raw_stream_df["ts"].dt.hour
+            session_hod = raw_stream_df.groupby("hour_of_day").size()
+            auth_hour_dist = [
+                {"hour": int(h), "count": int(session_hod.get(h, 0))} for h in range(24)
+            ]
+
+        stats["deviceEvolution"] = {
+            "appVersionTimeline": app_version_timeline,
+            "osVersionTimeline": os_version_timeline,
+            "deviceFingerprint": device_fingerprint,
+            "multiDeviceWeekly": multi_device_weekly,
+            "avgDevicesPerWeek": avg_devices_per_week,
+            "sessionHourOfDay": auth_hour_dist,
+        }
+        print(f"  {len(app_version_timeline)} app versions, {len(device_fingerprint)} devices")
+    else:
+        stats["deviceEvolution"] = {
+            "appVersionTimeline": [], "osVersionTimeline": [],
+            "deviceFingerprint": [], "multiDeviceWeekly": [],
+            "avgDevicesPerWeek": 0, "sessionHourOfDay": [],
+        }
 
-    stats["deviceEvolution"] = {
-        "appVersionTimeline": app_version_timeline,
-        "osVersionTimeline": os_version_timeline,
-        "deviceFingerprint": device_fingerprint,
-        "multiDeviceWeekly": multi_device_weekly,
-        "avgDevicesPerWeek": avg_devices_per_week,
-        "sessionHourOfDay": auth_hour_dist,
-    }
-    print(f"  {len(app_version_timeline)} app versions, {len(device_fingerprint)} devices")
-else:
-    stats["deviceEvolution"] = {
-        "appVersionTimeline": [], "osVersionTimeline": [],
-        "deviceFingerprint": [], "multiDeviceWeekly": [],
-        "avgDevicesPerWeek": 0, "sessionHourOfDay": [],
-    }
 
 # ---------------------------------------------------------------------------
 # 4e. API & Latency Experience
 # ---------------------------------------------------------------------------
-print("Computing API & latency metrics …")
-
-bassline_df = load_numbered_json("BasslineRequests")
-auth_api_df = load_single_json("AuthHTTPReqWebapi.json")
-
-# Latency stats from BasslineRequests
-api_median_latency = 0
-latency_over_time = []
-feature_fingerprint = []
-if len(bassline_df) > 0 and "message_ms_latency" in bassline_df.columns:
-    bassline_df["ts"] = pd.to_datetime(bassline_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    bassline_df["date"] = bassline_df["ts"].dt.date
-    bassline_df["week"] = bassline_df["ts"].dt.to_period("W").astype(str)
-
-    valid_latency = bassline_df[bassline_df["message_ms_latency"] >= 0]["message_ms_latency"]
-    api_median_latency = round(float(valid_latency.median()), 1) if len(valid_latency) > 0 else 0
-
-    # Latency over time (weekly avg + P95)
-    weekly_latency = bassline_df[bassline_df["message_ms_latency"] >= 0].groupby("week")["message_ms_latency"].agg(
-        avg="mean", p95=lambda x: np.percentile(x, 95)
-    ).reset_index()
-    weekly_latency = weekly_latency.sort_values("week")
-    latency_over_time = [
-        {"week": r["week"], "avg": round(r["avg"], 1), "p95": round(r["p95"], 1)}
-        for _, r in weekly_latency.iterrows()
-    ]
+# Latency stats from BasslineRequests. These files can be many gigabytes, so
+# each one is streamed in chunks and folded into mergeable partial
+# aggregates; the requests themselves are never all held in memory.
+BASSLINE_CHUNK_RECORDS = 100_000
+
+def empty_bassline_partial() -> dict:
+    return {
+        "hasLatency": False,
+        # (week, latency ms) -> count; exact, so medians/percentiles match the raw values
+        "latencyCounts": pd.Series(dtype="int64"),
+        "operationCounts": {},
+    }
+
+def merge_bassline_partials(a: dict, b: dict) -> dict:
+    operations = dict(a["operationCounts"])
+    for op, count in b["operationCounts"].items():
+        operations[op] = operations.get(op, 0) + count
+    return {
+        "hasLatency": a["hasLatency"] or b["hasLatency"],
+        "latencyCounts": (
+            a["latencyCounts"].add(b["latencyCounts"], fill_value=0).astype("int64")
+            if len(a["latencyCounts"]) > 0 and len(b["latencyCounts"]) > 0
+            else b["latencyCounts"] if len(b["latencyCounts"]) > 0 else a["latencyCounts"]
+        ),
+        "operationCounts": operations,
+    }
 
-    # Feature usage fingerprint (top operation names)
-    if "message_operation_name" in bassline_df.columns:
-        op_counts = bassline_df["message_operation_name"].value_counts().head(20).reset_index()
-        op_counts.columns = ["operation", "count"]
+def fold_bassline_chunk(records: list) -> dict:
+    partial = empty_bassline_partial()
+    chunk = pd.DataFrame(records, columns=["timestamp_utc", "message_ms_latency", "message_operation_name"])
+    partial["hasLatency"] = any("message_ms_latency" in r for r in records)
+    if partial["hasLatency"]:
+        latency = pd.to_numeric(chunk["message_ms_latency"], errors="coerce")
+        ts = pd.to_datetime(chunk["timestamp_utc"], format="ISO8601", utc=True, errors="coerce")
+        valid = (latency >= 0) & ts.notna()
+        week = ts[valid].dt.tz_convert(LOCAL_TZ).dt.to_period("W").astype(str)
+        partial["latencyCounts"] = (
+            latency[valid].groupby([week, latency[valid]]).size().rename_axis(["week", "latency"])
+        )
+    partial["operationCounts"] = chunk["message_operation_name"].value_counts(sort=False).to_dict()
+    return partial
+
+def fold_bassline_file(fp: str) -> dict:
+    partial = empty_bassline_partial()
+    for records in iter_json_array(fp, BASSLINE_CHUNK_RECORDS):
+        if preview_sampler is not None:
+            records = preview_sampler.thin(records)
+        if records and isinstance(records[0], dict):
+            partial = merge_bassline_partials(partial, fold_bassline_chunk(records))
+    return partial
+
+
+@section("apiLatency", inputs=[("techlog", "BasslineRequests*.json"), ("techlog", "AuthHTTPReqWebapi*.json")])
+def compute_api_latency(ctx: AnalysisContext) -> None:
+    """Client request latency and Web API endpoint usage."""
+    stats = ctx.stats
+    print("Computing API & latency metrics …")
+
+    auth_api_df = load_single_json("AuthHTTPReqWebapi.json")
+
+    bassline = empty_bassline_partial()
+    for fp in numbered_json_files("BasslineRequests"):
+        bassline = merge_bassline_partials(bassline, fold_bassline_file(fp))
+
+    api_median_latency = 0
+    latency_over_time = []
+    feature_fingerprint = []
+    if bassline["hasLatency"]:
+        latency_counts = bassline["latencyCounts"]
+        if len(latency_counts) > 0:
+            overall = latency_counts.groupby(level=1).sum().sort_index()
+            api_median_latency = round(weighted_percentile(overall.index.to_numpy(), overall.to_numpy(), 50), 1)
+
+            # Latency over time (weekly avg + P95)
+            for week, week_counts in latency_counts.groupby(level=0, sort=True):
+                week_counts = week_counts.droplevel(0).sort_index()
+                values, counts = week_counts.index.to_numpy(dtype=float), week_counts.to_numpy()
+                latency_over_time.append({
+                    "week": week,
+                    "avg": round(float((values * counts).sum() / counts.sum()), 1),
+                    "p95": round(weighted_percentile(values, counts, 95), 1),
+                })
+
+        # Feature usage fingerprint (top operation names)
+        top_ops = sorted(bassline["operationCounts"].items(), key=lambda x: x[1], reverse=True)[:20]
         feature_fingerprint = [
-            {"operation": r["operation"], "count": int(r["count"])}
-            for _, r in op_counts.iterrows()
+            {"operation": op, "count": int(count)} for op, count in top_ops
         ]
 
-# API endpoint breakdown from AuthHTTPReqWebapi
-endpoint_breakdown = []
-api_error_over_time = []
-if len(auth_api_df) > 0:
-    auth_api_df["ts"] = pd.to_datetime(auth_api_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    auth_api_df["week"] = auth_api_df["ts"].dt.to_period("W").astype(str)
-
-    if "message_uri" in auth_api_df.columns:
-        # Group endpoints by first two path segments
-        def categorize_endpoint(uri: str) -> str:
-            parts = str(uri).strip("/").split("/")
-            if len(parts) >= 3:
-                return "/" + "/".join(parts[:3])
-            return "/" + "/".join(parts)
-
-        auth_api_df["endpoint_category"] = auth_api_df["message_uri"].apply(categorize_endpoint)
-        cat_counts = auth_api_df["endpoint_category"].value_counts().head(15).reset_index()
-        cat_counts.columns = ["endpoint", "count"]
-        endpoint_breakdown = [
-            {"endpoint": r["endpoint"], "count": int(r["count"])}
-            for _, r in cat_counts.iterrows()
-        ]
+    # API endpoint breakdown from AuthHTTPReqWebapi
+    endpoint_breakdown = []
+    api_error_over_time = []
+    if len(auth_api_df) > 0:
+        auth_api_df["ts"] = pd.to_datetime(auth_api_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        auth_api_df["week"] = auth_api_df["ts"].dt.to_period("W").astype(str)
+
+        if "message_uri" in auth_api_df.columns:
+            auth_api_df["endpoint_category"] = endpoint_category(auth_api_df["message_uri"]).astype(str)
+            cat_counts = auth_api_df["endpoint_category"].value_counts().head(15).reset_index()
+            cat_counts.columns = ["endpoint", "count"]
+            endpoint_breakdown = [
+                {"endpoint": r["endpoint"], "count": int(r["count"])}
+                for _, r in cat_counts.iterrows()
+            ]
 
-    # Error rate over time
-    if "message_status_code" in auth_api_df.columns:
-        auth_api_df["is_error"] = auth_api_df["message_status_code"].astype(str).str.startswith(("4", "5"))
-        weekly_api = auth_api_df.groupby("week").agg(
-            total=("is_error", "count"),
-            errors=("is_error", "sum"),
-        ).reset_index()
-        weekly_api["errorRate"] = (weekly_api["errors"] / weekly_api["total"] * 100).round(1)
-        weekly_api = weekly_api.sort_values("week")
-        api_error_over_time = [
-            {"week": r["week"], "errorRate": float(r["errorRate"]), "total": int(r["total"])}
-            for _, r in weekly_api.iterrows()
-        ]
+        # Error rate over time
+        if "message_status_code" in auth_api_df.columns:
+            auth_api_df["is_error"] = auth_api_df["message_status_code"].astype(str).str.startswith(("4", "5"))
+            weekly_api = auth_api_df.groupby("week").agg(
+                total=("is_error", "count"),
+                errors=("is_error", "sum"),
+            ).reset_index()
+            weekly_api["errorRate"] = (weekly_api["errors"] / weekly_api["total"] * 100).round(1)
+            weekly_api = weekly_api.sort_values("week")
+            api_error_over_time = [
+                {"week": r["week"], "errorRate": float(r["errorRate"]), "total": int(r["total"])}
+                for _, r in weekly_api.iterrows()
+            ]
+
+    stats["apiLatency"] = {
+        "medianLatency": api_median_latency,
+        "latencyOverTime": latency_over_time,
+        "featureFingerprint": feature_fingerprint,
+        "endpointBreakdown": endpoint_breakdown,
+        "errorOverTime": api_error_over_time,
+    }
+    print(f"  Median latency: {api_median_latency}ms, {len(feature_fingerprint)} operations, {len(endpoint_breakdown)} endpoints")
 
-stats["apiLatency"] = {
-    "medianLatency": api_median_latency,
-    "latencyOverTime": latency_over_time,
-    "featureFingerprint": feature_fingerprint,
-    "endpointBreakdown": endpoint_breakdown,
-    "errorOverTime": api_error_over_time,
-}
-print(f"  Median latency: {api_median_latency}ms, {len(feature_fingerprint)} operations, {len(endpoint_breakdown)} endpoints")
 
 # ---------------------------------------------------------------------------
 # 4f. Push Notification Engagement
 # ---------------------------------------------------------------------------
-print("Computing push notification metrics …")
-
-notif_received_df = load_single_json("PushNotificationsReceivedV1.json")
-notif_interaction_df = load_single_json("PushNotificationInteractionV1.json")
-
-total_received = 0
-total_interacted = 0
-engagement_rate = 0
-notification_types = []
-notification_driven_listening = 0
-
-if len(notif_received_df) > 0:
-    notif_received_df["ts"] = pd.to_datetime(notif_received_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    total_received = len(notif_received_df)
-
-    # Campaign breakdown
-    if "message_campaign_id" in notif_received_df.columns:
-        campaign_counts = notif_received_df["message_campaign_id"].value_counts().head(10).reset_index()
-        campaign_counts.columns = ["campaignId", "count"]
-        notification_types = [
-            {"campaignId": str(r["campaignId"]), "count": int(r["count"])}
-            for _, r in campaign_counts.iterrows()
-        ]
+@section("pushNotifications", inputs=[("techlog", "PushNotification*.json")], needs=["streams"])
+def compute_push_notifications(ctx: AnalysisContext) -> None:
+    """Push notifications received, opened and followed by listening."""
+    df = ctx.df
+    stats = ctx.stats
+    print("Computing push notification metrics …")
+
+    notif_received_df = load_single_json("PushNotificationsReceivedV1.json")
+    notif_interaction_df = load_single_json("PushNotificationInteractionV1.json")
+
+    total_received = 0
+    total_interacted = 0
+    engagement_rate = 0
+    notification_types = []
+    notification_driven_listening = 0
+
+    if len(notif_received_df) > 0:
+        notif_received_df["ts"] = pd.to_datetime(notif_received_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        total_received = len(notif_received_df)
+
+        # Campaign breakdown
+        if "message_campaign_id" in notif_received_df.columns:
+            campaign_counts = notif_received_df["message_campaign_id"].value_counts().head(10).reset_index()
+            campaign_counts.columns = ["campaignId", "count"]
+            notification_types = [
+                {"campaignId": str(r["campaignId"]), "count": int(r["count"])}
+                for _, r in campaign_counts.iterrows()
+            ]
+
+    if len(notif_interaction_df) > 0:
+        notif_interaction_df["ts"] = pd.to_datetime(notif_interaction_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert(LOCAL_TZ)
+        total_interacted = len(notif_interaction_df)
+
+    engagement_rate = round(total_interacted / max(total_received, 1) * 100, 1)
+
+    # Notification-Driven Listening: notification followed by stream within 30 min
+    if len(notif_received_df) > 0:
+        for _, notif_row in notif_received_df.iterrows():
+            notif_ts = notif_row["ts"]
+            window_end = notif_ts + pd.Timedelta(minutes=30)
+            has_stream = len(df[(df["ts"] >= notif_ts) & (df["ts"] <= window_end)]) > 0
+            if has_stream:
+                notification_driven_listening += 1
+
+    notification_driven_pct = round(notification_driven_listening / max(total_received, 1) * 100, 1)
+
+    stats["pushNotifications"] = {
+        "totalReceived": total_received,
+        "totalInteracted": total_interacted,
+        "engagementRate": engagement_rate,
+        "notificationTypes": notification_types,
+        "notificationDrivenListening": notification_driven_listening,
+        "notificationDrivenPct": notification_driven_pct,
+    }
+    print(f"  {total_received} received, {total_interacted} interacted ({engagement_rate}%), {notification_driven_listening} drove listening")
 
-if len(notif_interaction_df) > 0:
-    notif_interaction_df["ts"] = pd.to_datetime(notif_interaction_df["timestamp_utc"], format="ISO8601", utc=True).dt.tz_convert("US/Eastern")
-    total_interacted = len(notif_interaction_df)
-
-engagement_rate = round(total_interacted / max(total_received, 1) * 100, 1)
-
-# Notification-Driven Listening: notification followed by stream within 30 min
-if len(notif_received_df) > 0:
-    for _, notif_row in notif_received_df.iterrows():
-        notif_ts = notif_row["ts"]
-        window_end = notif_ts + pd.Timedelta(minutes=30)
-        has_stream = len(df[(df["ts"] >= notif_ts) & (df["ts"] <= window_end)]) > 0
-        if has_stream:
-            notification_driven_listening += 1
-
-notification_driven_pct = round(notification_driven_listening / max(total_received, 1) * 100, 1)
-
-stats["pushNotifications"] = {
-    "totalReceived": total_received,
-    "totalInteracted": total_interacted,
-    "engagementRate": engagement_rate,
-    "notificationTypes": notification_types,
-    "notificationDrivenListening": notification_driven_listening,
-    "notificationDrivenPct": notification_driven_pct,
-}
-print(f"  {total_received} received, {total_interacted} interacted ({engagement_rate}%), {notification_driven_listening} drove listening")
 
 # ---------------------------------------------------------------------------
 # 5. Write output
 # ---------------------------------------------------------------------------
-os.makedirs("public", exist_ok=True)
-output_path = os.path.join("public", "stats.json")
-with open(output_path, "w") as f:
-    json.dump(stats, f)
+OUTPUT_PATH = os.path.join("public", "stats.json")
+
+
+def print_frame_cache_stats() -> None:
+    print(
+        f"Frame cache: {frame_cache_stats['hits']} hits, {frame_cache_stats['misses']} misses, "
+        f"{frame_cache_stats['evictions']} evictions"
+    )
+    for key, hits in sorted(frame_cache_stats["hitsByKey"].items(), key=lambda x: x[1], reverse=True):
+        print(f"  {os.path.basename(key)}: {hits} hits")
+
+
+# Long time series also get LTTB-downsampled copies, written next to the full
+# series as <key>Downsampled: {"<budget>": points}, for every budget the
+# series exceeds. Paths are dotted ("*" matches any key) and name each
+# series' x field (a date, or a "start/end" week) and the y field that
+# picks the points; kept points carry all their fields.
+SERIES_POINT_BUDGETS = (500, 200)
+DOWNSAMPLED_SERIES = {
+    "dailyListening": ("date", "hours"),
+    "searchBehavior.overTime": ("week", "count"),
+    "libraryHealth.collectionInteractions.*.weeklyTrend": ("week", "adds"),
+    "playlistCuration.*.churnOverTime": ("week", "adds"),
+    "playbackQuality.errorOverTime": ("week", "total"),
+    "playbackQuality.stutterTimeline": ("week", "count"),
+    "playbackQuality.downloadOverTime": ("week", "downloads"),
+    "deviceEvolution.multiDeviceWeekly": ("week", "deviceCount"),
+    "apiLatency.latencyOverTime": ("week", "p95"),
+    "apiLatency.errorOverTime": ("week", "total"),
+}
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, budget: int) -> np.ndarray:
+    """Positions of the `budget` points Largest-Triangle-Three-Buckets keeps of (x, y).
+
+    The first and last points are always kept; the rest are split into
+    budget - 2 buckets and each keeps the point spanning the largest
+    triangle with the previously kept point and the next bucket's mean.
+    Bucket means and areas are vectorized; only the walk over buckets,
+    bounded by the budget, is a Python loop.
+    """
+    n = len(x)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+    edges = 1 + np.arange(budget - 1, dtype=np.int64) * (n - 2) // (budget - 2)
+    sizes = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1])[1:] / sizes[1:], x[-1])
+    next_y = np.append(np.add.reduceat(y[:n - 1], edges[:-1])[1:] / sizes[1:], y[-1])
+
+    keep = np.empty(budget, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def find_series(node, parts: list[str]):
+    """Yield (container, key) for every list `parts` selects under `node`."""
+    if not isinstance(node, dict) or not parts:
+        return
+    head, rest = parts[0], parts[1:]
+    for key in (list(node) if head == "*" else [head] if head in node else []):
+        if not rest and isinstance(node[key], list):
+            yield node, key
+        else:
+            yield from find_series(node[key], rest)
+
+
+def add_downsampled_series(stats: dict) -> None:
+    """(Re)build the <key>Downsampled copies of every series in DOWNSAMPLED_SERIES."""
+    for path, (x_field, y_field) in DOWNSAMPLED_SERIES.items():
+        for container, key in find_series(stats, path.split(".")):
+            points = container[key]
+            container.pop(f"{key}Downsampled", None)
+            budgets = [b for b in SERIES_POINT_BUDGETS if len(points) > b]
+            if not budgets:
+                continue
+            x = np.array([p[x_field][:10] for p in points], dtype="datetime64[D]").astype(np.int64).astype(float)
+            y = np.array([p[y_field] or 0 for p in points], dtype=float)
+            container[f"{key}Downsampled"] = {
+                str(b): [points[i] for i in lttb_indices(x, y, b)] for b in budgets
+            }
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Write `data` via a temp file and rename, so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files readable by the owner only
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_stats(stats: dict, output_path: str = OUTPUT_PATH) -> None:
+    add_downsampled_series(stats)
+    write_json_atomic(output_path, stats)
+    file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+    print(f"Wrote {output_path} ({file_size_mb:.1f} MB)")
+
+# Preview mode: additive metrics, as dotted paths into stats (lists are
+# walked through, "*" matches any key), are scaled back up by 1 / fraction.
+# "hours" and "count" values also get a confidence interval; "scaled" ones
+# (net changes, per-week rates) are only scaled. Everything else (rates,
+# averages, distinct counts, streaks, metrics joining two sampled logs) is
+# reported as computed on the sample.
+PREVIEW_DEFAULT_ROWS = 50_000
+PREVIEW_SEED = 0
+PREVIEW_Z = 1.96  # 95% intervals
+PREVIEW_SCALED = {
+    "overview.totalHours": "hours",
+    "overview.totalPlays": "count",
+    "dailyListening.hours": "hours",
+    "monthlyListening.hours": "hours",
+    "yearlyListening.hours": "hours",
+    "hourOfDay.hours": "hours",
+    "dayOfWeek.hours": "hours",
+    "heatmap.hours": "hours",
+    "topArtists.hours": "hours",
+    "topTracks.hours": "hours",
+    "topAlbums.hours": "hours",
+    "topPodcasts.hours": "hours",
+    "artistsOverTime.artists.*": "hours",
+    "rollingTop.artists.*.top.hours": "scaled",
+    "rollingTop.tracks.*.top.hours": "scaled",
+    "skipByArtist.plays": "count",
+    "reasonBreakdown.*.count": "count",
+    "platformBreakdown.hours": "hours",
+    "countryBreakdown.hours": "hours",
+    "offlineVsOnline.*": "hours",
+    "contentTypeSplit.music": "hours",
+    "contentTypeSplit.podcast": "hours",
+    "contentTypeSplit.audiobook": "hours",
+    "contentTypeSplit.other": "hours",
+    "libraryHealth.unsavedFavorites.hours": "hours",
+    "libraryHealth.collectionInteractions.*.totalAdds": "count",
+    "libraryHealth.collectionInteractions.*.totalRemoves": "count",
+    "libraryHealth.collectionInteractions.*.netChange": "scaled",
+    "libraryHealth.collectionInteractions.*.weeklyTrend.adds": "count",
+    "libraryHealth.collectionInteractions.*.weeklyTrend.removes": "count",
+    "libraryHealth.collectionInteractions.*.weeklyTrend.net": "scaled",
+    "libraryHealth.collectionInteractions.*.kindBreakdown.adds": "count",
+    "libraryHealth.collectionInteractions.*.kindBreakdown.removes": "count",
+    "libraryHealth.collectionInteractions.*.kindBreakdown.net": "scaled",
+    "playlistInsights.growthOverTimeAll.tracks": "count",
+    "playlistInsights.growthOverTimeUserOnly.tracks": "count",
+    "playlistStreamOverlap.playlistHours": "hours",
+    "playlistStreamOverlap.libraryStreamHours": "hours",
+    "playlistStreamOverlap.combinedStreamHours": "hours",
+    "playlistStreamOverlap.mostPlayedPlaylists.hours": "hours",
+    "searchListenPipeline.searchToObsession.hours": "hours",
+    "playlistCuration.*.totalAdds": "count",
+    "playlistCuration.*.totalRemoves": "count",
+    "playlistCuration.*.addsPerWeek": "scaled",
+    "playlistCuration.*.removesPerWeek": "scaled",
+    "playlistCuration.*.churnOverTime.adds": "count",
+    "playlistCuration.*.churnOverTime.removes": "count",
+    "playlistCuration.*.curationHeatmap.count": "count",
+    "playbackQuality.bitrateDistribution.count": "count",
+    "playbackQuality.totalErrors": "count",
+    "playbackQuality.fatalErrors": "count",
+    "playbackQuality.errorOverTime.total": "count",
+    "playbackQuality.errorOverTime.fatal": "count",
+    "playbackQuality.totalStutters": "count",
+    "playbackQuality.stutterTimeline.count": "count",
+    "playbackQuality.errorToleranceRetries": "count",
+    "playbackQuality.errorToleranceSkips": "count",
+    "playbackQuality.downloadOverTime.downloads": "count",
+    "socialSharing.totalShares": "count",
+    "socialSharing.shareDestinations.count": "count",
+    "socialSharing.shareOverTime.count": "count",
+    "socialSharing.shareKindBreakdown.count": "count",
+    "deviceEvolution.deviceFingerprint.eventCount": "count",
+    "deviceEvolution.sessionHourOfDay.count": "count",
+    "apiLatency.featureFingerprint.count": "count",
+    "apiLatency.endpointBreakdown.count": "count",
+    "apiLatency.errorOverTime.total": "count",
+    "pushNotifications.totalReceived": "count",
+    "pushNotifications.totalInteracted": "count",
+    "pushNotifications.notificationTypes.count": "count",
+}
+
+
+def find_metric_values(node, parts: list[str], path: str):
+    """Yield (container, key, path) for every number `parts` selects under `node`."""
+    if isinstance(node, list):
+        for i, item in enumerate(node):
+            if not parts and isinstance(item, (int, float)) and not isinstance(item, bool):
+                yield node, i, f"{path}[{i}]"
+            elif parts:
+                yield from find_metric_values(item, parts, f"{path}[{i}]")
+        return
+    if not isinstance(node, dict) or not parts:
+        return
+    head, rest = parts[0], parts[1:]
+    for key in (list(node) if head == "*" else [head] if head in node else []):
+        value, child = node[key], f"{path}.{key}" if path else key
+        if not rest and isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield node, key, child
+        else:
+            yield from find_metric_values(value, rest, child)
+
+
+def annotate_preview(stats: dict, sampler: PreviewSampler, hours: pd.Series) -> None:
+    """Scale additive metrics up to the full history and record their confidence intervals.
+
+    With inclusion probability p, a total estimated as x / p from a sample
+    sum x has variance about (1 - p) / p^2 * sum(y^2) over the sampled rows.
+    For counts y is 0 or 1, so sum(y^2) = x. For hours, sum(y^2) is taken as
+    x times the sample's overall sum(hours^2) / sum(hours), i.e. assuming
+    play lengths are distributed alike in every group. Treating the
+    stratified sample as simple random makes the intervals slightly wide.
+    """
+    p = sampler.fraction
+    hours = hours.to_numpy(dtype=float)
+    hours_ratio = float((hours ** 2).sum() / hours.sum()) if hours.sum() > 0 else 0.0
+    intervals = {}
+    for selector, kind in PREVIEW_SCALED.items():
+        for container, key, path in find_metric_values(stats, selector.split("."), ""):
+            value = container[key]
+            estimate = value / p
+            container[key] = int(round(estimate)) if isinstance(value, int) else round(estimate, 2)
+            if kind == "scaled" or value < 0:
+                continue
+            spread = PREVIEW_Z * np.sqrt((1 - p) * value * (hours_ratio if kind == "hours" else 1.0)) / p
+            intervals[path] = [round(max(estimate - spread, 0.0), 2), round(estimate + spread, 2)]
+
+    stats["preview"] = {
+        "strategy": sampler.strategy,
+        "seed": sampler.seed,
+        "sampledRows": sampler.sampled_rows,
+        "totalRows": sampler.history_rows,
+        "fraction": round(p, 6),
+        "confidence": 0.95,
+        "intervals": intervals,
+    }
+    print(f"Preview: scaled {len(intervals):,} metrics by {1 / p:,.1f}x (95% intervals in stats.preview)")
+
+
+# ---------------------------------------------------------------------------
+# 6. Running sections / watch mode
+# ---------------------------------------------------------------------------
+WATCH_INTERVAL_SECONDS = 2.0
+
+
+STAGE_CACHE_DIR = ".stage_cache"
+STAGE_CACHE_MAX_AGE_DAYS = 30
+STAGE_CACHE_MAX_MB = 256
+
+
+def referenced_names(obj) -> set[str]:
+    """Global names used by a function's code (including nested functions and lambdas) or a class's methods."""
+    if inspect.isclass(obj):
+        return set().union(*(referenced_names(v) for v in vars(obj).values() if inspect.isfunction(v)))
+    names, codes = set(), [obj.__code__]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(c for c in code.co_consts if inspect.iscode(c))
+    return names
+
+
+def code_fingerprint(func) -> str:
+    """Hash of `func`'s source and of every module-level function, class and constant it uses, transitively.
+
+    Names are looked up in the module each function or class was defined
+    in, so plugin code is followed as well as whatever it imports from here.
+    """
+    modules = {__name__, *plugin_modules}
+    sources, todo = {}, []
+
+    def own(obj) -> bool:
+        return (inspect.isfunction(obj) or inspect.isclass(obj)) and obj.__module__ in modules
+
+    def label(module: str, name: str) -> str:
+        return name if module == __name__ else f"{module}.{name}"
+
+    def follow(obj) -> None:
+        key = label(obj.__module__, obj.__name__)
+        if key not in sources:
+            sources[key] = inspect.getsource(obj)
+            namespace = vars(sys.modules[obj.__module__])
+            todo.extend((namespace, n) for n in referenced_names(obj) if n in namespace)
+
+    def encode(value):
+        # Constants such as LISTENING_BACKENDS hold functions: hash those by name and follow them
+        if own(value):
+            follow(value)
+            return value.__name__
+        if isinstance(value, (set, frozenset)):
+            return sorted(value, key=repr)
+        raise TypeError(f"cannot fingerprint {type(value).__name__}")
+
+    follow(func)
+    while todo:
+        namespace, name = todo.pop()
+        obj = namespace[name]
+        if obj is SECTIONS or obj is DATASETS:
+            continue  # reached through ctx.dataset / the decorators; entries are keyed on their own
+        if own(obj):
+            follow(obj)
+        elif name.isupper() and (key := label(namespace["__name__"], name)) not in sources:
+            try:
+                sources[key] = json.dumps(obj, sort_keys=True, default=encode)
+            except (TypeError, ValueError):
+                pass
+    return hashlib.sha256(json.dumps(sorted(sources.items())).encode()).hexdigest()
+
+
+class StageCache:
+    """Section outputs on disk, addressed by a hash of everything they depend on.
+
+    A section's key covers its code (see code_fingerprint), run parameters,
+    the contents of its input files and the keys of the datasets it needs,
+    which in turn cover their own code, inputs and needs, so any upstream
+    change invalidates everything downstream. A hit builds no dataset.
+    Entries live at <directory>/<section>/<key>.json; a hit refreshes the
+    file's mtime, which eviction uses as last-use time. File digests are
+    memoized by (size, mtime) so unchanged inputs are not re-read.
+    """
+
+    def __init__(self, directory: str = STAGE_CACHE_DIR):
+        self.directory = directory
+        self.digest_path = os.path.join(directory, "file_digests.json")
+        try:
+            with open(self.digest_path, "r") as fh:
+                self.digests = json.load(fh)
+        except (OSError, ValueError):
+            self.digests = {}
+
+    def file_digest(self, fp: str) -> str:
+        st = os.stat(fp)
+        memo = self.digests.get(fp)
+        if memo is not None and memo[:2] == [st.st_size, st.st_mtime_ns]:
+            return memo[2]
+        h = hashlib.sha256()
+        with open(fp, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+        self.digests[fp] = [st.st_size, st.st_mtime_ns, h.hexdigest()]
+        return h.hexdigest()
+
+    def stage_keys(self, ctx: AnalysisContext) -> dict[str, str]:
+        section_patterns, dataset_patterns = input_patterns(SECTIONS), input_patterns(DATASETS)
+        dataset_keys = {}
+
+        def digests(patterns: list[str]) -> list[list[str]]:
+            files = sorted({fp for pattern in patterns for fp in glob.glob(pattern)})
+            return [[os.path.basename(fp), self.file_digest(fp)] for fp in files]
+
+        def dataset_key(name: str) -> str:
+            if name not in dataset_keys:
+                spec = DATASETS[name]
+                manifest = {
+                    "dataset": name,
+                    "code": code_fingerprint(spec["build"]),
+                    "inputs": digests(dataset_patterns[name]),
+                    "needs": [dataset_key(dep) for dep in spec["needs"]],
+                }
+                dataset_keys[name] = hashlib.sha256(json.dumps(manifest).encode()).hexdigest()
+            return dataset_keys[name]
+
+        keys = {}
+        for name, spec in SECTIONS.items():
+            manifest = {
+                "section": name,
+                "code": code_fingerprint(spec["run"]),
+                # Library versions too: e.g. tie order in value_counts differs between pandas releases
+                "params": {"backend": ctx.backend, "pandas": pd.__version__, "numpy": np.__version__,
+                           "polars": pl.__version__ if pl is not None else None},
+                "inputs": digests(section_patterns[name]),
+                "needs": [dataset_key(dep) for dep in spec["needs"]],
+            }
+            keys[name] = hashlib.sha256(json.dumps(manifest).encode()).hexdigest()
+        write_json_atomic(self.digest_path, self.digests)
+        return keys
+
+    def entry_path(self, name: str, key: str) -> str:
+        return os.path.join(self.directory, name, f"{key}.json")
+
+    def load(self, name: str, key: str) -> dict | None:
+        path = self.entry_path(name, key)
+        try:
+            with open(path, "r") as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return entry["stats"]
+
+    def store(self, name: str, key: str, stats: dict) -> None:
+        write_json_atomic(self.entry_path(name, key), {"section": name, "created": time.time(), "stats": stats})
+
+    def entries(self) -> list[dict]:
+        found = []
+        for fp in glob.glob(os.path.join(self.directory, "*", "*.json")):
+            st = os.stat(fp)
+            found.append({
+                "path": fp,
+                "section": os.path.basename(os.path.dirname(fp)),
+                "key": os.path.basename(fp)[:-len(".json")],
+                "bytes": st.st_size,
+                "lastUsed": st.st_mtime,
+            })
+        return sorted(found, key=lambda e: e["lastUsed"])
+
+    def purge(self, sections=None) -> int:
+        """Delete all entries, or only those of `sections`; return how many were removed."""
+        doomed = [e for e in self.entries() if not sections or e["section"] in sections]
+        for entry in doomed:
+            os.remove(entry["path"])
+        return len(doomed)
+
+    def evict(self, max_age_days: float = STAGE_CACHE_MAX_AGE_DAYS, max_mb: float = STAGE_CACHE_MAX_MB) -> int:
+        """Drop entries unused for `max_age_days`, then least recently used ones until under `max_mb`."""
+        entries = self.entries()
+        cutoff = time.time() - max_age_days * 86400
+        doomed = [e for e in entries if e["lastUsed"] < cutoff]
+        kept = [e for e in entries if e["lastUsed"] >= cutoff]
+        total = sum(e["bytes"] for e in kept)
+        while kept and total > max_mb * 1024 * 1024:
+            total -= kept[0]["bytes"]
+            doomed.append(kept.pop(0))
+        for entry in doomed:
+            os.remove(entry["path"])
+        return len(doomed)
+
+
+def print_stage_cache(cache: StageCache) -> None:
+    entries = cache.entries()
+    now = time.time()
+    for e in entries:
+        print(f"  {e['section']:<24} {e['key'][:12]}  {e['bytes'] / 1024:8,.1f} KB  "
+              f"used {(now - e['lastUsed']) / 86400:,.1f} days ago")
+    total_mb = sum(e["bytes"] for e in entries) / (1024 * 1024)
+    print(f"{len(entries)} entries, {total_mb:,.2f} MB in {cache.directory}")
+
+
+def run_sections(ctx: AnalysisContext, names=None, cache: StageCache | None = None) -> None:
+    """Run the registered sections (all of them, or only `names`) in registration order.
+
+    With a stage cache, sections whose key has an entry are restored from it.
+    The others build the datasets they need on first use; the context keeps
+    them, so each is built once however many sections need it.
+    """
+    ctx.cache = cache
+    keys = cache.stage_keys(ctx) if cache is not None else {}
+    built_before = set(ctx.datasets)
+    for name, spec in SECTIONS.items():
+        if names is not None and name not in names:
+            continue
+        if cache is not None and (entry := cache.load(name, keys[name])) is not None:
+            print(f"Using cached {name}")
+            ctx.stats.update(entry)
+            continue
+        # Give the section a fresh dict so exactly what it writes can be cached
+        stats, ctx.stats = ctx.stats, {}
+        try:
+            with ctx.scope(f"section {name}", spec["needs"]):
+                spec["run"](ctx)
+        finally:
+            written, ctx.stats = ctx.stats, stats
+        stats.update(written)
+        if cache is not None:
+            cache.store(name, keys[name], written)
+
+    built = [name for name in ctx.datasets if name not in built_before]
+    if built:
+        print(f"Built {len(built)} datasets: " + ", ".join(f"{name} {ctx.build_seconds[name]:.2f}s" for name in built))
+
+
+# Extra sections and datasets live in plugin files: every *.py file in
+# PLUGIN_DIR (if it exists) and each --plugin path is imported before the
+# run and registers with @section / @dataset from this module, e.g.
+#
+#     from preprocess import AnalysisContext, section
+#
+#     @section("nightOwl", needs=["streams", "row_subsets"])
+#     def compute_night_owl(ctx: AnalysisContext) -> None:
+#         music = ctx.rows("music", "hour_of_day", "hours")
+#         ctx.stats["nightOwl"] = {"hours": round(float(music[music["hour_of_day"] < 5]["hours"].sum()), 1)}
+PLUGIN_DIR = "plugins"
+plugin_modules: set[str] = set()
+
+
+def load_plugins(paths=None) -> list[str]:
+    """Import plugin files (directories: every *.py file in them); return the sections they added.
+
+    Without `paths`, loads PLUGIN_DIR when it exists.
+    """
+    if paths is None:
+        paths = [PLUGIN_DIR] if os.path.isdir(PLUGIN_DIR) else []
+    # Plugins import this module as `preprocess`; when it runs as a script that
+    # name must resolve to this instance, or they would register elsewhere
+    sys.modules.setdefault("preprocess", sys.modules[__name__])
+    before = set(SECTIONS)
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, "*.py"))) if os.path.isdir(path) else [path]
+        for fp in files:
+            module_name = f"preprocess_plugin_{os.path.splitext(os.path.basename(fp))[0]}"
+            if module_name in plugin_modules:
+                continue
+            spec = importlib.util.spec_from_file_location(module_name, fp)
+            if spec is None:
+                raise ValueError(f"{fp}: not a Python file")
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[module_name] = module
+            spec.loader.exec_module(module)
+            plugin_modules.add(module_name)
+    return [name for name in SECTIONS if name not in before]
+
+
+def use_export_root(root: str) -> None:
+    """Point every section at the export folders under `root` (".." unless changed)."""
+    global HISTORY_DIR, ACCOUNT_DIR, TECHLOG_DIR, SAVED_TRACKS_PATH
+    HISTORY_DIR = os.path.join(root, "Spotify Extended Streaming History", "")
+    ACCOUNT_DIR = os.path.join(root, "Spotify Account Data", "")
+    TECHLOG_DIR = os.path.join(root, "Spotify Technical Log Information", "")
+    SAVED_TRACKS_PATH = os.path.join(root, "saved_tracks.json")
+
+
+def use_preview(rows: int | None, strategy: str = "stratified", seed: int = PREVIEW_SEED) -> None:
+    """Sample about `rows` streams (and the same fraction of tech-log records) in later runs; None for a full run."""
+    global preview_sampler
+    preview_sampler = PreviewSampler(rows, strategy, seed) if rows is not None else None
+
+
+def use_session_idle_minutes(minutes: float) -> None:
+    """Set the gap that ends a listening session; stage cache keys pick up the new value."""
+    global SESSION_IDLE_MINUTES
+    SESSION_IDLE_MINUTES = minutes
+
+
+def use_country_timezones(overrides: dict[str, str] | None = None, by_country: bool = True) -> None:
+    """Set per-country zone overrides (e.g. {"CA": "America/Vancouver"}), or put every play in LOCAL_TZ."""
+    global COUNTRY_TZ_OVERRIDES, TZ_BY_COUNTRY
+    COUNTRY_TZ_OVERRIDES = {country.upper(): zone for country, zone in (overrides or {}).items()}
+    TZ_BY_COUNTRY = by_country
+
+
+def export_dirs() -> dict[str, str]:
+    """Directories that section `inputs` are relative to."""
+    return {
+        "history": HISTORY_DIR,
+        "account": ACCOUNT_DIR,
+        "techlog": TECHLOG_DIR,
+        "parent": os.path.dirname(SAVED_TRACKS_PATH),
+    }
+
+
+def input_patterns(registry=SECTIONS) -> dict[str, list[str]]:
+    """Absolute glob patterns of the files each section (or dataset, given DATASETS) reads."""
+    dirs = export_dirs()
+    return {
+        name: [os.path.abspath(os.path.join(dirs[root], pattern)) for root, pattern in spec["inputs"]]
+        for name, spec in registry.items()
+    }
+
+
+def snapshot_inputs() -> dict[str, tuple[int, int]]:
+    """(mtime, size) of every file some section or dataset reads, keyed by absolute path."""
+    snapshot = {}
+    for registry in (SECTIONS, DATASETS):
+        for patterns in input_patterns(registry).values():
+            for pattern in patterns:
+                for fp in glob.glob(pattern):
+                    try:
+                        st = os.stat(fp)
+                    except FileNotFoundError:
+                        continue  # deleted between glob and stat
+                    snapshot[fp] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+def reading_any(registry, paths) -> set[str]:
+    """Names in `registry` with an input pattern matching any of `paths`."""
+    return {
+        name for name, patterns in input_patterns(registry).items()
+        if any(fnmatch.fnmatch(fp, pattern) for fp in paths for pattern in patterns)
+    }
+
 
-file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
-print(f"Wrote {output_path} ({file_size_mb:.1f} MB)")
+def datasets_for_changes(paths) -> set[str]:
+    """Datasets that read any of `paths`, plus every dataset built from them."""
+    return datasets_downstream(reading_any(DATASETS, paths))
+
+
+def sections_for_changes(paths) -> list[str]:
+    """Sections that read any of `paths` themselves or need a dataset that does."""
+    stale = datasets_for_changes(paths)
+    affected = reading_any(SECTIONS, paths)
+    return [
+        name for name, spec in SECTIONS.items()
+        if name in affected or stale & datasets_upstream(spec["needs"])
+    ]
+
+
+def watch(ctx: AnalysisContext, interval: float = WATCH_INTERVAL_SECONDS, cache: StageCache | None = None) -> None:
+    """Poll the export folders and recompute only the sections whose inputs (or datasets) changed."""
+    print(f"Watching for export changes every {interval:g}s (Ctrl+C to stop) …")
+    previous = snapshot_inputs()
+    while True:
+        time.sleep(interval)
+        current = snapshot_inputs()
+        if current == previous:
+            continue
+        # Let a copy in progress finish: wait until two polls agree
+        while True:
+            time.sleep(interval)
+            latest = snapshot_inputs()
+            if latest == current:
+                break
+            current = latest
+
+        changed = sorted(fp for fp in previous.keys() | current.keys() if previous.get(fp) != current.get(fp))
+        previous = current
+        print(f"Changed: {', '.join(os.path.basename(fp) for fp in changed)}")
+        invalidate_frames(changed)
+        ctx.invalidate(datasets_for_changes(changed))
+        names = sections_for_changes(changed)
+        if not names:
+            continue
+        print(f"Recomputing {', '.join(names)} …")
+        try:
+            run_sections(ctx, names, cache)
+        except Exception:
+            traceback.print_exc()
+            print("  Keeping the previous stats.json until the next change")
+            continue
+        write_stats(ctx.stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--export-root", default="..",
+                        help="folder holding the Spotify export folders and saved_tracks.json")
+    parser.add_argument("--backend", choices=sorted(LISTENING_BACKENDS), default="pandas",
+                        help="engine for the core listening stats (polars needs `pip install polars`)")
+    parser.add_argument("--preview", nargs="?", type=int, const=PREVIEW_DEFAULT_ROWS, metavar="ROWS",
+                        help=f"build every section from a sample of about ROWS streams "
+                             f"(default {PREVIEW_DEFAULT_ROWS:,}), with additive metrics scaled up")
+    parser.add_argument("--preview-strategy", choices=["stratified", "uniform"], default="stratified",
+                        help="sample each history file in proportion (stratified) or all rows at once (uniform)")
+    parser.add_argument("--session-idle-minutes", type=float, default=SESSION_IDLE_MINUTES,
+                        help="idle gap that ends a listening session")
+    parser.add_argument("--country-tz", action="append", default=[], metavar="CC=ZONE",
+                        help="time zone for plays from a country, e.g. CA=America/Vancouver (repeatable)")
+    parser.add_argument("--single-tz", action="store_true",
+                        help=f"put every play in {LOCAL_TZ} instead of its country's time zone")
+    parser.add_argument("--plugin", action="append", metavar="PATH",
+                        help=f"plugin file or folder of plugin files to load instead of {PLUGIN_DIR}/ (repeatable)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompute every section without reading or writing the stage cache")
+    parser.add_argument("--cache-info", action="store_true", help="list stage cache entries and exit")
+    parser.add_argument("--cache-purge", nargs="*", metavar="SECTION",
+                        help="delete stage cache entries (all, or only these sections) and exit")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and recompute the sections whose export files change")
+    parser.add_argument("--interval", type=float, default=WATCH_INTERVAL_SECONDS,
+                        help="seconds between polls in --watch mode")
+    args = parser.parse_args()
+
+    if args.backend == "polars" and pl is None:
+        parser.error("--backend polars needs the polars package (pip install polars)")
+    if args.session_idle_minutes <= 0:
+        parser.error("--session-idle-minutes must be positive")
+    tz_overrides = {}
+    for spec in args.country_tz:
+        country, _, zone = spec.partition("=")
+        try:
+            zoneinfo.ZoneInfo(zone)
+            valid = bool(country.strip())
+        except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+            valid = False
+        if not valid:
+            parser.error(f"--country-tz {spec!r}: expected CC=ZONE with an IANA time zone")
+        tz_overrides[country.strip()] = zone
+
+    if args.preview is not None:
+        if args.preview <= 0:
+            parser.error("--preview needs a positive number of rows")
+        if args.watch:
+            parser.error("--preview cannot be combined with --watch")
+
+    # Sampled results must never be served as the real thing, so previews bypass the stage cache
+    cache = None if args.no_cache or args.preview is not None else StageCache()
+    if args.cache_info or args.cache_purge is not None:
+        cache = cache or StageCache()
+        if args.cache_purge is not None:
+            print(f"Purged {cache.purge(args.cache_purge)} stage cache entries")
+        if args.cache_info:
+            print_stage_cache(cache)
+        return
+
+    use_export_root(args.export_root)
+    use_preview(args.preview, args.preview_strategy)
+    use_session_idle_minutes(args.session_idle_minutes)
+    use_country_timezones(tz_overrides, by_country=not args.single_tz)
+    plugin_sections = load_plugins(args.plugin)
+    if plugin_sections:
+        print(f"Plugin sections: {', '.join(plugin_sections)}")
+    ctx = AnalysisContext(backend=args.backend)
+    run_sections(ctx, cache=cache)
+    if preview_sampler is not None:
+        annotate_preview(ctx.stats, preview_sampler, ctx.df["hours"])
+    print_frame_cache_stats()
+    write_stats(ctx.stats)
+    if cache is not None:
+        evicted = cache.evict()
+        if evicted:
+            print(f"Evicted {evicted} stage cache entries")
+    if args.watch:
+        try:
+            watch(ctx, args.interval, cache)
+        except KeyboardInterrupt:
+            print("Stopped watching")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Local JSON query API for date-range filtered listening stats.
+
+Loads the streaming history once (through preprocess.py), pre-aggregates it
+into a cube of local day x hour x content type x artist cells, and answers
+queries for any date range from that cube without touching the raw rows.
+Responses have the same shape as the matching stats.json entries.
+
+Run from the history_analysis_web/ directory:
+    python query_server.py
+    curl 'http://127.0.0.1:8765/api/topArtists?start=2023-01-01&end=2023-12-31&limit=10'
+
+GET /api lists the available queries. Every query takes optional `start` and
+`end` (inclusive local dates, YYYY-MM-DD); the top-N queries also take `limit`.
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import preprocess
+
+QUERY_CACHE_SIZE = 256
+DEFAULT_LIMIT = 20
+
+
+class ListeningCube:
+    """Hours, plays and skip/shuffle counts per (local day, hour, content type, artist) cell.
+
+    Cells are sorted by day, so a date range is a contiguous slice found by
+    binary search; every query is then a bincount over that slice.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        artist = df["master_metadata_album_artist_name"]
+        if not isinstance(artist.dtype, pd.CategoricalDtype):
+            artist = artist.astype("category")
+        # Category order is sorted by name, so code order breaks ties like groupby + nlargest
+        self.artists = np.asarray(artist.cat.categories, dtype=object)
+        is_music = (df["content_type"] == "music").to_numpy()
+        skipped = df["skipped"]
+        shuffle = df["shuffle"]
+
+        keys = pd.DataFrame({
+            "day": df["day_num"].to_numpy(),
+            "hour": df["hour_of_day"].to_numpy(),
+            "content": pd.Categorical(df["content_type"], categories=preprocess.CONTENT_TYPES).codes,
+            "artist": np.where(is_music, artist.cat.codes.to_numpy(), -1),
+            "hours": df["hours"].to_numpy(),
+            "skipKnown": skipped.notna().to_numpy(),
+            "skipped": skipped.fillna(False).to_numpy(dtype=bool),
+            "shuffleKnown": shuffle.notna().to_numpy(),
+            "shuffled": shuffle.fillna(False).to_numpy(dtype=bool),
+        })
+        cells = keys.groupby(["day", "hour", "content", "artist"], sort=True).agg(
+            hours=("hours", "sum"),
+            plays=("hours", "size"),
+            skipKnown=("skipKnown", "sum"),
+            skipped=("skipped", "sum"),
+            shuffleKnown=("shuffleKnown", "sum"),
+            shuffled=("shuffled", "sum"),
+        )
+        index = cells.index
+        self.day = index.get_level_values("day").to_numpy(dtype=np.int64)
+        self.hour = index.get_level_values("hour").to_numpy(dtype=np.int8)
+        self.content = index.get_level_values("content").to_numpy(dtype=np.int8)
+        self.artist = index.get_level_values("artist").to_numpy(dtype=np.int32)
+        self.month = self.day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        self.hours = cells["hours"].to_numpy(dtype=np.float64)
+        self.plays = cells["plays"].to_numpy(dtype=np.int64)
+        self.skip_known = cells["skipKnown"].to_numpy(dtype=np.int64)
+        self.skipped = cells["skipped"].to_numpy(dtype=np.int64)
+        self.shuffle_known = cells["shuffleKnown"].to_numpy(dtype=np.int64)
+        self.shuffled = cells["shuffled"].to_numpy(dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def nbytes(self) -> int:
+        return sum(arr.nbytes for arr in vars(self).values() if isinstance(arr, np.ndarray))
+
+    def span(self, start: int | None, end: int | None) -> slice:
+        """Cells whose day number lies in [start, end] (either bound may be open)."""
+        lo = 0 if start is None else int(np.searchsorted(self.day, start, side="left"))
+        hi = len(self.day) if end is None else int(np.searchsorted(self.day, end, side="right"))
+        return slice(lo, hi)
+
+
+def month_label(month: int) -> str:
+    return str(np.datetime64(int(month), "M"))
+
+
+def day_label(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+def monthly_rate(cube: ListeningCube, cells: slice, known: np.ndarray, hits: np.ndarray) -> list[tuple[str, float]]:
+    """Percentage of `hits` among `known` per month, for months with any cells."""
+    months, codes = np.unique(cube.month[cells], return_inverse=True)
+    total = np.bincount(codes, weights=known[cells], minlength=len(months))
+    count = np.bincount(codes, weights=hits[cells], minlength=len(months))
+    rate = np.divide(count * 100, total, out=np.zeros(len(months)), where=total > 0)
+    return [(month_label(m), round(float(r), 1)) for m, r in zip(months, rate)]
+
+
+def query_top_artists(cube: ListeningCube, cells: slice, limit: int) -> list:
+    music = cube.artist[cells] >= 0
+    hours = np.bincount(cube.artist[cells][music], weights=cube.hours[cells][music], minlength=len(cube.artists))
+    played = np.bincount(cube.artist[cells][music], minlength=len(cube.artists)) > 0
+    candidates = np.flatnonzero(played)
+    # Stable sort: equal hours keep name order, like nlargest(keep="first")
+    top = candidates[np.argsort(-hours[candidates], kind="stable")[:limit]]
+    return [{"name": cube.artists[a], "hours": round(float(hours[a]), 1)} for a in top]
+
+
+def query_hour_of_day(cube: ListeningCube, cells: slice, limit: int) -> list:
+    hod = np.bincount(cube.hour[cells], weights=cube.hours[cells], minlength=24)
+    return [{"hour": h, "hours": round(float(hod[h]), 1)} for h in range(24)]
+
+
+def query_day_of_week(cube: ListeningCube, cells: slice, limit: int) -> list:
+    dow = np.bincount((cube.day[cells] + 3) % 7, weights=cube.hours[cells], minlength=7)
+    return [{"day": preprocess.DOW_NAMES[d], "hours": round(float(dow[d]), 1)} for d in range(7)]
+
+
+def query_heatmap(cube: ListeningCube, cells: slice, limit: int) -> list:
+    # 1970-01-01 was a Thursday, so (day + 3) % 7 is 0 for Monday
+    slot = ((cube.day[cells] + 3) % 7) * 24 + cube.hour[cells]
+    grid = np.bincount(slot, weights=cube.hours[cells], minlength=7 * 24)
+    return [
+        {"day": preprocess.DOW_NAMES[d], "dayIndex": d, "hour": h, "hours": round(float(grid[d * 24 + h]), 2)}
+        for d in range(7)
+        for h in range(24)
+    ]
+
+
+def query_daily_listening(cube: ListeningCube, cells: slice, limit: int) -> list:
+    days, codes = np.unique(cube.day[cells], return_inverse=True)
+    hours = np.bincount(codes, weights=cube.hours[cells], minlength=len(days))
+    return [{"date": day_label(d), "hours": round(float(h), 2)} for d, h in zip(days, hours)]
+
+
+def query_monthly_listening(cube: ListeningCube, cells: slice, limit: int) -> list:
+    months, codes = np.unique(cube.month[cells], return_inverse=True)
+    hours = np.bincount(codes, weights=cube.hours[cells], minlength=len(months))
+    return [{"month": month_label(m), "hours": round(float(h), 1)} for m, h in zip(months, hours)]
+
+
+def query_content_type_split(cube: ListeningCube, cells: slice, limit: int) -> list:
+    n_types = len(preprocess.CONTENT_TYPES)
+    months, codes = np.unique(cube.month[cells], return_inverse=True)
+    grid = np.bincount(
+        codes * n_types + cube.content[cells], weights=cube.hours[cells], minlength=len(months) * n_types
+    ).reshape(len(months), n_types)
+    return [
+        {"month": month_label(m), **{ct: round(float(grid[i, c]), 2) for c, ct in enumerate(preprocess.CONTENT_TYPES)}}
+        for i, m in enumerate(months)
+    ]
+
+
+def query_skip_rate_over_time(cube: ListeningCube, cells: slice, limit: int) -> list:
+    return [
+        {"month": m, "skipRate": rate}
+        for m, rate in monthly_rate(cube, cells, cube.skip_known, cube.skipped)
+    ]
+
+
+def query_shuffle_over_time(cube: ListeningCube, cells: slice, limit: int) -> list:
+    return [
+        {"month": m, "shuffleRate": rate}
+        for m, rate in monthly_rate(cube, cells, cube.shuffle_known, cube.shuffled)
+    ]
+
+
+def query_totals(cube: ListeningCube, cells: slice, limit: int) -> dict:
+    plays = int(cube.plays[cells].sum())
+    hours = float(cube.hours[cells].sum())
+    return {
+        "totalHours": round(hours, 1),
+        "totalPlays": plays,
+        "uniqueArtists": int(len(np.unique(cube.artist[cells][cube.artist[cells] >= 0]))),
+        "listeningDays": int(len(np.unique(cube.day[cells]))),
+        "avgListenMinutes": round(hours * 60 / plays, 2) if plays else 0,
+    }
+
+
+QUERIES = {
+    "totals": query_totals,
+    "topArtists": query_top_artists,
+    "hourOfDay": query_hour_of_day,
+    "dayOfWeek": query_day_of_week,
+    "heatmap": query_heatmap,
+    "dailyListening": query_daily_listening,
+    "monthlyListening": query_monthly_listening,
+    "contentTypeSplit": query_content_type_split,
+    "skipRateOverTime": query_skip_rate_over_time,
+    "shuffleOverTime": query_shuffle_over_time,
+}
+
+
+def parse_day(value: str | None) -> int | None:
+    """Day number (days since 1970-01-01) of a YYYY-MM-DD date, or None when absent."""
+    if not value:
+        return None
+    try:
+        return int(np.datetime64(value, "D").astype(np.int64))
+    except ValueError:
+        raise ValueError(f"invalid date {value!r}, expected YYYY-MM-DD") from None
+
+
+class QueryService:
+    """Runs queries against one cube and keeps the most recent responses in an LRU cache."""
+
+    def __init__(self, cube: ListeningCube, cache_size: int = QUERY_CACHE_SIZE):
+        self.cube = cube
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.Lock()
+
+    def answer(self, name: str, params: dict[str, str]) -> tuple[bytes, bool]:
+        """JSON body for query `name` and whether it came from the cache.
+
+        Raises KeyError for an unknown query and ValueError for bad parameters.
+        """
+        query = QUERIES[name]
+        start, end = parse_day(params.get("start")), parse_day(params.get("end"))
+        try:
+            limit = int(params.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            raise ValueError(f"invalid limit {params['limit']!r}") from None
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+
+        key = (name, start, end, limit)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.cache_stats["hits"] += 1
+                return self.cache[key], True
+
+        body = json.dumps(query(self.cube, self.cube.span(start, end), limit)).encode()
+        with self.lock:
+            self.cache_stats["misses"] += 1
+            self.cache[key] = body
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.cache_stats["evictions"] += 1
+        return body, False
+
+
+def make_handler(service: QueryService):
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            if parts == ["api"]:
+                self.send_json(200, json.dumps({"queries": sorted(QUERIES), "cache": service.cache_stats}).encode())
+                return
+            if len(parts) != 2 or parts[0] != "api":
+                self.send_json(404, json.dumps({"error": f"not found: {url.path}"}).encode())
+                return
+
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            started = time.perf_counter()
+            try:
+                body, cached = service.answer(parts[1], params)
+            except KeyError:
+                self.send_json(404, json.dumps({"error": f"unknown query {parts[1]!r}"}).encode())
+                return
+            except ValueError as e:
+                self.send_json(400, json.dumps({"error": str(e)}).encode())
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.send_json(200, body, {"X-Cache": "hit" if cached else "miss", "X-Query-Ms": f"{elapsed_ms:.2f}"})
+
+        def send_json(self, status: int, body: bytes, headers: dict | None = None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            # The dashboard dev server runs on another port
+            self.send_header("Access-Control-Allow-Origin", "*")
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return QueryHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history-dir", default=preprocess.HISTORY_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=QUERY_CACHE_SIZE,
+                        help="number of query responses kept in the LRU cache")
+    args = parser.parse_args()
+
+    preprocess.HISTORY_DIR = args.history_dir
+    df = preprocess.AnalysisContext().dataset("streams")
+
+    started = time.perf_counter()
+    cube = ListeningCube(df)
+    print(
+        f"Built cube: {len(cube):,} cells from {len(df):,} rows "
+        f"({cube.nbytes() / 1e6:,.1f} MB) in {time.perf_counter() - started:.2f}s"
+    )
+    del df  # queries only need the cube
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(QueryService(cube, args.cache_size)))
+    print(f"Serving on http://{args.host}:{args.port}/api (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped")
+
+
+if __name__ == "__main__":
+    main()
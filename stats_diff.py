@@ -0,0 +1,346 @@
+"""
+Compare two stats outputs section by section and report what changed.
+
+Either side may be a stats.json or a stage cache entry
+(.stage_cache/<section>/<key>.json), whose stats are compared. Lists of
+records are aligned by their key fields (date, week, month, name, …) with a
+hash join, so a new month or a new #1 artist shows up as one change instead of
+a cascade of shifted positions.
+
+Run from the history_analysis_web/ directory:
+    python stats_diff.py old/stats.json public/stats.json
+    python stats_diff.py old/stats.json public/stats.json --section topArtists --section skipRateOverTime
+    python stats_diff.py --stage listening           # two newest cached results of a section
+    python stats_diff.py a.json b.json --json report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import preprocess
+
+DEFAULT_TOLERANCE = 1e-9
+DEFAULT_TOP = 5
+
+# Fields that identify a record in a list, in key order. Lists of named
+# records (top artists, tracks, runs, …) are keyed by name (and artist) and
+# treated as rankings instead.
+KEY_FIELDS = (
+    "date", "week", "month", "year", "day", "dayIndex", "hour", "bucket", "bin", "bitrate",
+    "from", "to", "query", "platform", "country", "reason", "kind", "destination", "model",
+    "operation", "endpoint", "campaignId", "label", "metric", "version", "os", "start",
+)
+
+
+def load_stats(path: str) -> dict:
+    """A stats.json, or the stats of a stage cache entry."""
+    with open(path, "r") as fh:
+        data = json.load(fh)
+    if isinstance(data, dict) and {"section", "created", "stats"} <= data.keys():
+        return data["stats"]
+    return data
+
+
+def newest_stage_entries(section: str, directory: str = preprocess.STAGE_CACHE_DIR) -> list[str]:
+    """Paths of a section's stage cache entries, oldest first by creation time."""
+    cache = preprocess.StageCache(directory)
+    entries = [e for e in cache.entries() if e["section"] == section]
+
+    def created(entry: dict) -> float:
+        with open(entry["path"], "r") as fh:
+            return json.load(fh).get("created", 0)
+
+    return [e["path"] for e in sorted(entries, key=created)]
+
+
+def record_keys(fields: set[str]) -> tuple[list[str], bool]:
+    """Key fields of a list of records and whether it is a ranking."""
+    if "name" in fields:
+        return ["name"] + (["artist"] if "artist" in fields else []), True
+    return [f for f in KEY_FIELDS if f in fields], False
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def key_label(record: dict, keys: list[str]):
+    values = [record[k] for k in keys]
+    return values[0] if len(values) == 1 else values
+
+
+def key_text(record: dict, keys: list[str]) -> str:
+    return " / ".join(str(record[k]) for k in keys)
+
+
+def occurrence_keys(records: list[dict], keys: list[str]) -> list[str]:
+    """One hashable key per record; repeats of a key (e.g. two playlists with one name) pair up in order."""
+    seen: dict[str, int] = {}
+    out = []
+    for record in records:
+        key = "\x1f".join(repr(record[k]) for k in keys)
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        out.append(key if n == 0 else f"{key}\x1e{n}")
+    return out
+
+
+class StatsDiff:
+    """Walks two stats trees and collects change records."""
+
+    def __init__(self, tolerance: float = DEFAULT_TOLERANCE, top: int = DEFAULT_TOP):
+        self.tolerance = tolerance
+        self.top = top
+        self.changes: list[dict] = []
+
+    def same_number(self, a, b) -> bool:
+        return abs(a - b) <= self.tolerance or (a != a and b != b)  # NaN equals NaN here
+
+    def compare(self, old, new, path: str) -> None:
+        if old == new:
+            return
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old.keys() | new.keys():
+                child = f"{path}.{key}" if path else key
+                if key not in new:
+                    self.changes.append({"path": child, "kind": "removed"})
+                elif key not in old:
+                    self.changes.append({"path": child, "kind": "added"})
+                else:
+                    self.compare(old[key], new[key], child)
+        elif isinstance(old, list) and isinstance(new, list):
+            self.compare_list(old, new, path)
+        elif is_number(old) and is_number(new):
+            if not self.same_number(old, new):
+                self.changes.append({"path": path, "kind": "value", "old": old, "new": new,
+                                     "delta": round(new - old, 6)})
+        elif type(old) is type(new) or old is None or new is None:
+            self.changes.append({"path": path, "kind": "value", "old": old, "new": new})
+        else:
+            self.changes.append({"path": path, "kind": "type", "old": type(old).__name__, "new": type(new).__name__})
+
+    def compare_list(self, old: list, new: list, path: str) -> None:
+        if not old or not new:
+            self.changes.append({"path": path, "kind": "length", "old": len(old), "new": len(new)})
+            return
+        if all(isinstance(x, dict) for x in old) and all(isinstance(x, dict) for x in new):
+            fields = set().union(*old, *new)
+            keys, ranked = record_keys(fields)
+            if keys and all(k in r for r in old + new for k in keys):
+                self.compare_records(old, new, path, keys, ranked)
+                return
+        if all(is_number(x) for x in old + new):
+            self.compare_array(old, new, path)
+            return
+        # Unkeyed lists: by position
+        for i, (a, b) in enumerate(zip(old, new)):
+            self.compare(a, b, f"{path}[{i}]")
+        if len(old) != len(new):
+            self.changes.append({"path": path, "kind": "length", "old": len(old), "new": len(new)})
+
+    def compare_array(self, old: list, new: list, path: str) -> None:
+        a, b = np.asarray(old, dtype=float), np.asarray(new, dtype=float)
+        n = min(len(a), len(b))
+        delta = b[:n] - a[:n]
+        changed = ~((np.abs(delta) <= self.tolerance) | (np.isnan(a[:n]) & np.isnan(b[:n])))
+        if changed.any() or len(a) != len(b):
+            self.changes.append({
+                "path": path, "kind": "array", "oldLength": len(a), "newLength": len(b),
+                "changed": int(changed.sum()),
+                "maxAbsDelta": round(float(np.nanmax(np.abs(delta[changed]))), 6) if changed.any() else 0,
+            })
+
+    def compare_records(self, old: list, new: list, path: str, keys: list[str], ranked: bool) -> None:
+        """Align two lists of records on `keys` with one hash join and diff the matched rows."""
+        old_at = pd.Index(occurrence_keys(old, keys)).get_indexer(occurrence_keys(new, keys))
+        matched_new = np.flatnonzero(old_at >= 0)
+        matched_old = old_at[matched_new]
+        is_removed = np.ones(len(old), dtype=bool)
+        is_removed[matched_old] = False
+        added = np.flatnonzero(old_at < 0)
+        removed = np.flatnonzero(is_removed)
+
+        record = {"path": path, "kind": "ranking" if ranked else "series", "keyedBy": keys}
+        if len(added):
+            record["added"] = [key_label(new[i], keys) for i in added[:self.top]]
+            record["addedCount"] = len(added)
+        if len(removed):
+            record["removed"] = [key_label(old[i], keys) for i in removed[:self.top]]
+            record["removedCount"] = len(removed)
+
+        pairs = [(old[i], new[j]) for i, j in zip(matched_old, matched_new)]
+        changed_rows = np.zeros(len(pairs), dtype=bool)
+        largest, text_changes = [], []
+        fields = sorted(set().union(*old, *new) - set(keys))
+        for field in fields:
+            before = [a.get(field) for a, _ in pairs]
+            after = [b.get(field) for _, b in pairs]
+            if all(v is None or is_number(v) for v in before + after):
+                # Numeric fields: deltas for every matched row at once
+                x = np.array([np.nan if v is None else v for v in before], dtype=float)
+                y = np.array([np.nan if v is None else v for v in after], dtype=float)
+                delta = y - x
+                changed = ~((np.abs(delta) <= self.tolerance) | (np.isnan(x) & np.isnan(y)))
+                changed_rows |= changed
+                for i in np.flatnonzero(changed):
+                    size = abs(delta[i]) if not np.isnan(delta[i]) else np.inf
+                    largest.append((size, int(i), field, before[i], after[i]))
+            else:
+                # Text and nested fields: plain equality, recursing only into rows that differ
+                for i, (a, b) in enumerate(zip(before, after)):
+                    if a == b:
+                        continue
+                    changed_rows[i] = True
+                    if isinstance(a, (list, dict)) and isinstance(b, (list, dict)):
+                        self.compare(a, b, f"{path}[{key_text(pairs[i][1], keys)}].{field}")
+                    elif len(text_changes) < self.top:
+                        text_changes.append({"key": key_label(pairs[i][1], keys), "field": field, "old": a, "new": b})
+
+        if changed_rows.any():
+            record["changedRows"] = int(changed_rows.sum())
+        if largest:
+            largest.sort(key=lambda t: -t[0])
+            record["largestChanges"] = [
+                {"key": key_label(pairs[i][1], keys), "field": field, "old": a, "new": b,
+                 "delta": round(b - a, 6) if a is not None and b is not None else None}
+                for _, i, field, a, b in largest[:self.top]
+            ]
+        if text_changes:
+            record["textChanges"] = text_changes
+
+        if ranked:
+            moved = np.flatnonzero(matched_old != matched_new)
+            if len(moved):
+                moved = moved[np.argsort(-np.abs(matched_new[moved] - matched_old[moved]), kind="stable")]
+                record["rankMoves"] = [
+                    {"key": key_label(new[matched_new[m]], keys), "oldRank": int(matched_old[m]) + 1,
+                     "newRank": int(matched_new[m]) + 1}
+                    for m in moved[:self.top]
+                ]
+                record["movedCount"] = len(moved)
+
+        if len(record) > 3:
+            self.changes.append(record)
+
+
+def diff_stats(old: dict, new: dict, sections=None, tolerance: float = DEFAULT_TOLERANCE,
+               top: int = DEFAULT_TOP) -> dict:
+    """Change report between two stats outputs, per top-level section.
+
+    `sections` limits the report to those keys. Each change record has a
+    `path` and a `kind`: value, type, added, removed, length, array, or series /
+    ranking for keyed lists of records, which carry the added and removed
+    keys, the largest numeric changes and (rankings) the biggest rank moves,
+    each capped at `top` examples.
+    """
+    names = sorted((old.keys() | new.keys()) if sections is None else set(sections) & (old.keys() | new.keys()))
+    report = {"added": [], "removed": [], "unchanged": [], "changed": {}}
+    for name in names:
+        if name not in old:
+            report["added"].append(name)
+        elif name not in new:
+            report["removed"].append(name)
+        else:
+            walker = StatsDiff(tolerance, top)
+            walker.compare(old[name], new[name], name)
+            if walker.changes:
+                report["changed"][name] = sorted(walker.changes, key=lambda c: c["path"])
+            else:
+                report["unchanged"].append(name)
+    return report
+
+
+def format_change(change: dict) -> str:
+    kind, path = change["kind"], change["path"]
+    if kind in ("added", "removed"):
+        return f"{'+' if kind == 'added' else '-'} {path}"
+    if kind == "value":
+        delta = f" ({change['delta']:+g})" if "delta" in change else ""
+        return f"~ {path}: {change['old']!r} -> {change['new']!r}{delta}"
+    if kind == "type":
+        return f"! {path}: {change['old']} -> {change['new']}"
+    if kind == "length":
+        return f"~ {path}: {change['old']} -> {change['new']} items"
+    if kind == "array":
+        return (f"~ {path}: {change['changed']} values changed (max |delta| {change['maxAbsDelta']:g}), "
+                f"{change['oldLength']} -> {change['newLength']} items")
+    lines = [f"~ {path} (by {', '.join(change['keyedBy'])})"]
+    if "addedCount" in change:
+        lines.append(f"    + {change['addedCount']} new: {', '.join(map(str, change['added']))}")
+    if "removedCount" in change:
+        lines.append(f"    - {change['removedCount']} gone: {', '.join(map(str, change['removed']))}")
+    if "changedRows" in change:
+        lines.append(f"    {change['changedRows']} rows changed")
+    for c in change.get("largestChanges", []):
+        delta = f" ({c['delta']:+g})" if c["delta"] is not None else ""
+        lines.append(f"      {c['key']} {c['field']}: {c['old']} -> {c['new']}{delta}")
+    for c in change.get("textChanges", []):
+        lines.append(f"      {c['key']} {c['field']}: {c['old']!r} -> {c['new']!r}")
+    if "movedCount" in change:
+        moves = ", ".join(f"{m['key']} {m['oldRank']}->{m['newRank']}" for m in change["rankMoves"])
+        lines.append(f"    {change['movedCount']} moved: {moves}")
+    return "\n".join(lines)
+
+
+def print_report(report: dict) -> None:
+    for name in report["added"]:
+        print(f"+ section {name}")
+    for name in report["removed"]:
+        print(f"- section {name}")
+    for name, changes in report["changed"].items():
+        print(f"{name}: {len(changes)} changes")
+        for change in changes:
+            print("  " + format_change(change).replace("\n", "\n  "))
+    print(f"{len(report['changed'])} sections changed, {len(report['unchanged'])} unchanged, "
+          f"{len(report['added'])} added, {len(report['removed'])} removed")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("old", nargs="?", help="earlier stats.json or stage cache entry")
+    parser.add_argument("new", nargs="?", help="later stats.json or stage cache entry")
+    parser.add_argument("--stage", metavar="SECTION",
+                        help="compare the two newest stage cache entries of SECTION instead")
+    parser.add_argument("--section", action="append", metavar="KEY",
+                        help="only compare this top-level key (repeatable)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="numeric differences up to this are ignored")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="examples listed per change")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.stage:
+        if args.old or args.new:
+            parser.error("--stage takes no files")
+        paths = newest_stage_entries(args.stage)
+        if len(paths) < 2:
+            print(f"Need two stage cache entries for {args.stage}, found {len(paths)}")
+            return 2
+        old_path, new_path = paths[-2], paths[-1]
+    elif args.old and args.new:
+        old_path, new_path = args.old, args.new
+    else:
+        parser.error("give two stats files, or --stage SECTION")
+
+    started = time.perf_counter()
+    report = diff_stats(load_stats(old_path), load_stats(new_path), args.section, args.tolerance, args.top)
+    elapsed = time.perf_counter() - started
+
+    print(f"{old_path} -> {new_path}")
+    print_report(report)
+    print(f"Compared in {elapsed:.2f}s")
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        preprocess.write_json_atomic(args.json, report)
+        print(f"Wrote {args.json}")
+    return 1 if report["changed"] or report["added"] or report["removed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())